@@ -0,0 +1,118 @@
+"""
+    Replays audio tick by tick through the live preprocessing and compares the
+    cascade (src/model/cascade.py) with running the model on every tick.
+
+    Windows are taken every --hop seconds (the prediction loop's tick) from a WAV
+    file or from synthetic plucks with sustained notes. Each window goes through
+    server.audio_prep.PreprocessingEngine, then both through the model and
+    through the gate, so the report shows the fraction of ticks that reach stage
+    two, how often the cascade's class differs from the model's (the accuracy
+    impact when the model is taken as reference) and the per-tick inference cost
+    of both paths.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_cascade --gate models/cascade_gate.npz
+        python -m benchmarks.bench_cascade --gate models/cascade_gate.npz --wav session.wav --hop 0.05
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.bench_pipeline import MODEL_PATH, load_benchmark_model
+from server import audio_prep
+from src.data_utils.synthetic_audio import SAMPLE_RATE, random_pluck_sequence
+from src.model.cascade import DECISIONS, GATE_PATH, CascadeGate
+
+# --- Configuration ---
+DEFAULT_HOP_SEC = 0.05
+DEFAULT_DURATION_SEC = 60.0
+WINDOW_SIZE = 2 * SAMPLE_RATE
+NOTE_DURATION_SEC = 1.5 # Synthetic plucks ring long enough for several unchanged ticks
+# ---
+
+
+def load_audio(wav_path, duration, seed):
+    if wav_path:
+        import librosa
+        audio, _ = librosa.load(wav_path, sr=SAMPLE_RATE, mono=True)
+        return audio.astype(np.float32)
+    return random_pluck_sequence(duration, note_duration_sec=NOTE_DURATION_SEC, seed=seed)
+
+
+def replay(model, gate, audio, hop_sec=DEFAULT_HOP_SEC):
+    engine = audio_prep.PreprocessingEngine(WINDOW_SIZE, SAMPLE_RATE)
+    hop = int(hop_sec * SAMPLE_RATE)
+    full_pred, cascade_pred, decisions = [], [], []
+    model_ms, gate_ms = [], []
+    model.predict_on_batch(np.zeros((1,) + model.input_shape[1:], dtype=np.float32)) # Warm-up
+    last_output = None
+    for end in range(WINDOW_SIZE, len(audio) + 1, hop):
+        features = engine.process(audio[end - WINDOW_SIZE:end])
+        if features is None:
+            continue
+        start = time.perf_counter()
+        output = np.asarray(model.predict_on_batch(features[np.newaxis, :, :, np.newaxis]))
+        model_ms.append((time.perf_counter() - start) * 1000.0)
+        start = time.perf_counter()
+        decision = gate.decide(features)
+        gate_ms.append((time.perf_counter() - start) * 1000.0)
+        if decision == 'negative':
+            cascade_output = gate.negative_output()
+        elif decision == 'unchanged':
+            cascade_output = last_output
+        else:
+            cascade_output = last_output = output
+        full_pred.append(int(output.argmax()))
+        cascade_pred.append(int(cascade_output.argmax()))
+        decisions.append(decision)
+
+    full_pred, cascade_pred, decisions = np.array(full_pred), np.array(cascade_pred), np.array(decisions)
+    model_ms, gate_ms = np.array(model_ms), np.array(gate_ms)
+    stage2 = decisions == 'full'
+    notes = full_pred != gate.negative_label
+    return {
+        'ticks': int(len(decisions)),
+        'decisions': {name: float((decisions == name).mean()) for name in DECISIONS},
+        'stage2_fraction': float(stage2.mean()),
+        'agreement': float((full_pred == cascade_pred).mean()),
+        'agreement_on_notes': float((full_pred[notes] == cascade_pred[notes]).mean()) if notes.any() else None,
+        'full_ms_per_tick': float(model_ms.mean()),
+        'cascade_ms_per_tick': float((gate_ms + np.where(stage2, model_ms, 0.0)).mean()),
+        'gate_ms_per_tick': float(gate_ms.mean()),
+    }
+
+
+def print_report(report):
+    print(f"Ticks: {report['ticks']}")
+    print("Decisions: " + ", ".join(f"{name} {100 * share:.1f}%" for name, share in report['decisions'].items()))
+    print(f"Ticks reaching the model: {100 * report['stage2_fraction']:.1f}%")
+    notes = report['agreement_on_notes']
+    print(f"Cascade agrees with the model on {100 * report['agreement']:.1f}% of ticks"
+          + (f" ({100 * notes:.1f}% of the ticks the model classifies as a note)" if notes is not None else ""))
+    print(f"Inference per tick: model only {report['full_ms_per_tick']:.2f} ms, cascade "
+          f"{report['cascade_ms_per_tick']:.2f} ms (gate {1000 * report['gate_ms_per_tick']:.0f} us)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare cascade inference with running the model every tick.")
+    parser.add_argument("--model", default=MODEL_PATH, help="Stage-two model file.")
+    parser.add_argument("--gate", default=GATE_PATH, help="Gate file written by train.py.")
+    parser.add_argument("--wav", default=None, help="Audio to replay (default: synthetic plucks).")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SEC, help="Synthetic audio length.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hop", type=float, default=DEFAULT_HOP_SEC, help="Seconds between ticks.")
+    parser.add_argument("--change_threshold", type=float, default=None, help="Override the gate's threshold.")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path.")
+    args = parser.parse_args()
+
+    overrides = {} if args.change_threshold is None else {'change_threshold': args.change_threshold}
+    report = replay(load_benchmark_model(args.model), CascadeGate.load(args.gate, **overrides),
+                    load_audio(args.wav, args.duration, args.seed), args.hop)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
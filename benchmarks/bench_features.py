@@ -0,0 +1,77 @@
+"""
+    Compares the CQT and mel feature backends: per-window preprocessing cost and,
+    optionally, the test accuracy of the same CNN trained on each feature.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_features                      # per-window cost only
+        python -m benchmarks.bench_features --accuracy --epochs 10
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from benchmarks.bench_pipeline import time_call
+from server import audio_prep
+from src.data_utils.data_loader import FEATURE_OUTPUT_PATHS, _data_path, preprocess_and_save_wav_files
+from src.data_utils.synthetic_audio import SAMPLE_RATE, random_pluck_sequence
+
+
+def bench_window_cost(repeats):
+    window = random_pluck_sequence(2.0, sr=SAMPLE_RATE, seed=0)
+    results = {}
+    for feature in audio_prep.FEATURES:
+        stats = time_call(lambda: audio_prep.preprocess_buffer(window, SAMPLE_RATE, feature), repeats=repeats)
+        stats["output_shape"] = list(audio_prep.preprocess_buffer(window, SAMPLE_RATE, feature).shape)
+        results[feature] = stats
+    return results
+
+
+def ensure_preprocessed(feature):
+    """Runs the offline pipeline for a feature if its preprocessed directory does not exist yet."""
+    output_path = FEATURE_OUTPUT_PATHS[feature]
+    if not os.path.isdir(output_path):
+        print(f"Preprocessing {_data_path} with the '{feature}' backend into {output_path}...")
+        preprocess_and_save_wav_files(_data_path, output_path, feature=feature)
+    return output_path
+
+
+def bench_accuracy(feature, epochs, batch_size):
+    from src.model.model import build_model
+    from src.model.train import load_and_split
+
+    x_train, y_train, x_val, y_val, x_test, y_test = load_and_split(ensure_preprocessed(feature))
+    model = build_model(x_train[0].shape, len(np.unique(y_train)))
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    model.fit(x_train, y_train, validation_data=(x_val, y_val), batch_size=batch_size, epochs=epochs, verbose=2)
+    test_loss, test_accuracy = model.evaluate(x_test, y_test, verbose=0)
+    return {"test_loss": float(test_loss), "test_accuracy": float(test_accuracy), "epochs": epochs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the CQT and mel feature backends.")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed repetitions per backend (default: 20).")
+    parser.add_argument("--accuracy", action="store_true",
+                        help="Also train the CNN on each feature and compare test accuracy (needs data/raw).")
+    parser.add_argument("--epochs", type=int, default=10, help="Training epochs for --accuracy (default: 10).")
+    parser.add_argument("--batch_size", type=int, default=16, help="Training batch size for --accuracy.")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON output path.")
+    args = parser.parse_args()
+
+    report = {"window_cost": bench_window_cost(args.repeats)}
+    cqt_ms = report["window_cost"]["cqt"]["median_ms"]
+    for feature, stats in report["window_cost"].items():
+        print(f"{feature:<5} median {stats['median_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+              f"x{cqt_ms / stats['median_ms']:.1f} vs cqt  shape {stats['output_shape']}")
+
+    if args.accuracy:
+        report["accuracy"] = {feature: bench_accuracy(feature, args.epochs, args.batch_size)
+                              for feature in audio_prep.FEATURES}
+        for feature, stats in report["accuracy"].items():
+            print(f"{feature:<5} test accuracy {stats['test_accuracy']:.3f}  (loss {stats['test_loss']:.3f})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,104 @@
+"""
+    Startup time and resident memory of the headless CLI (server/audio_main.py)
+    against the Flask server (run.py).
+
+    The CLI is measured with its default NumPy inference backend and with Keras.
+    All run as subprocesses with the synthetic audio source and the same model.
+    Startup is the time from launching the process to its first prediction (the
+    CLI's 'ready' event, the server's /status prediction count); resident memory
+    is read from /proc/<pid>/status after the pipeline has run for --settle
+    seconds. Linux only.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_headless --model updated_model.h5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_servers import STARTUP_TIMEOUT_SEC, wait_until_predicting
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+DEFAULT_PORT = 5001
+DEFAULT_SETTLE_SEC = 5.0
+# ---
+
+
+def process_memory_mb(pid):
+    """(VmRSS, VmHWM) of a process in MB."""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0]) / 1024.0
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def measure(process, wait_ready, settle):
+    start = time.perf_counter()
+    try:
+        wait_ready(process)
+        startup = time.perf_counter() - start
+        time.sleep(settle)
+        rss, peak = process_memory_mb(process.pid)
+    finally:
+        stop_process(process)
+    return {'startup_sec': startup, 'rss_mb': rss, 'peak_rss_mb': peak}
+
+
+def bench_headless(model, settle, backend='numpy'):
+    command = [sys.executable, '-m', 'server.audio_main', '--model', model, '--source', 'synthetic:0', '--all',
+               '--backend', backend]
+    process = subprocess.Popen(command, cwd=ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+    def wait_ready(process):
+        for line in process.stdout: # Blocks until the CLI writes its first event
+            if json.loads(line).get('type') == 'ready':
+                return
+        raise RuntimeError(f"Headless CLI exited with code {process.wait()} during startup")
+
+    return measure(process, wait_ready, settle)
+
+
+def bench_flask(model, port, settle):
+    env = dict(os.environ, AUDIO_SOURCE='synthetic:0', MODEL_FILENAME=model, PORT=str(port))
+    process = subprocess.Popen([sys.executable, 'run.py'], cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    return measure(process, lambda process: wait_until_predicting(port, STARTUP_TIMEOUT_SEC, process), settle)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare startup time and memory of the headless CLI and run.py.")
+    parser.add_argument("--model", default="updated_model.h5", help="Model file in models/.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port for run.py.")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SEC,
+                        help="Seconds to run after the first prediction before reading memory.")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path.")
+    args = parser.parse_args()
+
+    results = {
+        'headless': bench_headless(args.model, args.settle),
+        'headless_keras': bench_headless(args.model, args.settle, backend='keras'),
+        'flask': bench_flask(args.model, args.port, args.settle),
+    }
+    print(f"{'entry point':<16}{'startup s':>11}{'RSS MB':>9}{'peak MB':>9}")
+    for name, stats in results.items():
+        print(f"{name:<16}{stats['startup_sec']:>11.2f}{stats['rss_mb']:>9.0f}{stats['peak_rss_mb']:>9.0f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,122 @@
+"""
+    Per-tick cost of multi-channel (hexaphonic) classification: one batched
+    tick over all channels against classifying each channel as its own mono
+    window, plus a single mono channel for reference.
+
+    Windows are cut from synthetic hexaphonic plucks (one string per channel).
+    For every window the tick runs like the live loop: PreprocessingEngine on
+    the (samples, channels) window, then one model.predict() on the
+    (channels, bins, frames, 1) batch. The per-channel baseline runs the mono
+    engine and one predict() per channel. The report gives milliseconds per
+    tick for both stages and how often the batched tick predicts the same class
+    per channel as the per-channel one (the shared HPSS mask is the only
+    approximation; --exact_hpss turns it off).
+
+    Usage (from the project root):
+        python -m benchmarks.bench_multichannel --model models/updated_model.h5
+        python -m benchmarks.bench_multichannel --channels 6 --feature mel --model models/updated_model_mel.h5
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.bench_pipeline import MODEL_PATH, load_benchmark_model
+from server import audio_prep
+from src.data_utils.synthetic_audio import SAMPLE_RATE, random_hexaphonic_sequence
+from src.model.prediction_handler import OUTPUT_TAB_ORDER
+
+# --- Configuration ---
+DEFAULT_CHANNELS = 6
+DEFAULT_TICKS = 20
+HOP_SEC = 0.25
+WINDOW_SIZE = 2 * SAMPLE_RATE
+# ---
+
+
+def time_tick(engine, model, window):
+    """(preprocess ms, inference ms, predicted class per channel) of one tick."""
+    start = time.perf_counter()
+    features = engine.process(window)
+    preprocess_ms = (time.perf_counter() - start) * 1000.0
+    batch = features[..., np.newaxis] if features.ndim == 3 else features[np.newaxis, :, :, np.newaxis]
+    start = time.perf_counter()
+    output = np.asarray(model.predict(batch, verbose=0))
+    return preprocess_ms, (time.perf_counter() - start) * 1000.0, output.argmax(axis=1)
+
+
+def run(model, channels=DEFAULT_CHANNELS, ticks=DEFAULT_TICKS, feature=audio_prep.DEFAULT_FEATURE,
+        exact_hpss=False, seed=0):
+    audio = random_hexaphonic_sequence(2.0 + ticks * HOP_SEC, OUTPUT_TAB_ORDER[:channels], seed=seed)
+    audio = np.clip(np.rint(audio * 32768.0), -32768, 32767).astype(np.int16) # As read from the capture ring
+    hop = int(HOP_SEC * SAMPLE_RATE)
+    windows = [audio[end - WINDOW_SIZE:end] for end in range(WINDOW_SIZE, len(audio) + 1, hop)][:ticks]
+
+    batched_engine = audio_prep.PreprocessingEngine(WINDOW_SIZE, SAMPLE_RATE, feature)
+    batched_engine.shared_hpss_mask = not exact_hpss
+    mono_engine = audio_prep.PreprocessingEngine(WINDOW_SIZE, SAMPLE_RATE, feature)
+    time_tick(batched_engine, model, windows[0]) # Warm-up (allocation, first predict)
+    time_tick(mono_engine, model, np.ascontiguousarray(windows[0][:, 0]))
+
+    results = {name: {'preprocess_ms': [], 'inference_ms': []} for name in ('batched', 'per_channel', 'mono')}
+    batched_classes, per_channel_classes = [], []
+    for window in windows:
+        preprocess_ms, inference_ms, classes = time_tick(batched_engine, model, window)
+        results['batched']['preprocess_ms'].append(preprocess_ms)
+        results['batched']['inference_ms'].append(inference_ms)
+        batched_classes.append(classes)
+
+        preprocess_ms = inference_ms = 0.0
+        classes = []
+        for channel in range(channels):
+            p_ms, i_ms, channel_classes = time_tick(mono_engine, model, np.ascontiguousarray(window[:, channel]))
+            preprocess_ms, inference_ms = preprocess_ms + p_ms, inference_ms + i_ms
+            classes.append(channel_classes[0])
+            if channel == 0:
+                results['mono']['preprocess_ms'].append(p_ms)
+                results['mono']['inference_ms'].append(i_ms)
+        results['per_channel']['preprocess_ms'].append(preprocess_ms)
+        results['per_channel']['inference_ms'].append(inference_ms)
+        per_channel_classes.append(classes)
+
+    report = {'channels': channels, 'ticks': len(windows), 'feature': feature, 'exact_hpss': exact_hpss}
+    for name, times in results.items():
+        report[name] = {key: float(np.mean(values)) for key, values in times.items()}
+        report[name]['total_ms'] = report[name]['preprocess_ms'] + report[name]['inference_ms']
+    report['agreement'] = float((np.array(batched_classes) == np.array(per_channel_classes)).mean())
+    return report
+
+
+def print_report(report):
+    print(f"{report['channels']} channels, {report['ticks']} ticks, feature '{report['feature']}'"
+          f"{' (exact per-channel HPSS)' if report['exact_hpss'] else ''}")
+    print(f"{'tick':<14}{'preprocess ms':>15}{'inference ms':>14}{'total ms':>10}{'x mono':>8}")
+    mono_total = report['mono']['total_ms']
+    for name in ('mono', 'per_channel', 'batched'):
+        stats = report[name]
+        print(f"{name:<14}{stats['preprocess_ms']:>15.1f}{stats['inference_ms']:>14.1f}{stats['total_ms']:>10.1f}"
+              f"{stats['total_ms'] / mono_total:>8.2f}")
+    print(f"Batched tick: {report['per_channel']['total_ms'] / report['batched']['total_ms']:.1f}x faster than "
+          f"per-channel ticks; same class as per-channel on {100 * report['agreement']:.1f}% of channel windows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched multi-channel ticks against per-channel mono ticks.")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model file.")
+    parser.add_argument("--channels", type=int, default=DEFAULT_CHANNELS, help="Input channels (at most 6).")
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS, help="Windows to time.")
+    parser.add_argument("--feature", choices=audio_prep.FEATURES, default=audio_prep.DEFAULT_FEATURE)
+    parser.add_argument("--exact_hpss", action="store_true", help="Per-channel HPSS instead of the shared mask.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path.")
+    args = parser.parse_args()
+
+    report = run(load_benchmark_model(args.model), args.channels, args.ticks, args.feature, args.exact_hpss,
+                 args.seed)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,266 @@
+"""
+    Micro-benchmarks for every stage of the real-time pipeline.
+
+    Drives the stages with synthetic plucked-string audio so it runs without a
+    microphone. Results are written as JSON and can be compared against a stored
+    baseline, flagging any stage whose median time regressed beyond a threshold.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_pipeline --output bench_results.json
+        python -m benchmarks.bench_pipeline --baseline bench_baseline.json --threshold 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.data_utils.synthetic_audio import SAMPLE_RATE, random_pluck_sequence
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+DEFAULT_REPEATS = 20
+DEFAULT_WARMUP = 2
+DEFAULT_THRESHOLD = 0.10 # 10% slower median than baseline counts as a regression
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+MODEL_PATH = ROOT_DIR + "/models/updated_model.h5"
+INPUT_SHAPE = (84, 87, 1)
+NUM_CLASSES = 7
+ALL_STAGES = ["buffer", "preprocess", "inference", "handler", "data_loader"]
+# ---
+
+
+def time_call(func, repeats=DEFAULT_REPEATS, warmup=DEFAULT_WARMUP):
+    """
+    Times repeated calls of func() and returns summary statistics in milliseconds.
+    """
+    for _ in range(warmup):
+        func()
+    timings = np.empty(repeats, dtype=np.float64)
+    for i in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings[i] = (time.perf_counter() - start) * 1000.0
+    return {
+        "n": repeats,
+        "mean_ms": float(np.mean(timings)),
+        "median_ms": float(np.median(timings)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "min_ms": float(np.min(timings)),
+        "max_ms": float(np.max(timings)),
+    }
+
+
+# --- Stage Benchmarks ---
+
+def bench_buffer(audio, repeats):
+    from server import audio_buffer
+
+    chunk_size = 2048 # Same as audio_stream.FRAMES_PER_BUFFER
+    chunks = [audio[i:i + chunk_size] for i in range(0, len(audio) - chunk_size, chunk_size)]
+    # Pre-fill so reads return a full window
+    for chunk in chunks:
+        audio_buffer.write_chunk(chunk)
+
+    position = [0]
+    def write_one():
+        audio_buffer.write_chunk(chunks[position[0] % len(chunks)])
+        position[0] += 1
+
+    return {
+        "buffer.write_chunk": time_call(write_one, repeats=repeats * 10),
+        "buffer.get_current_audio_window": time_call(audio_buffer.get_current_audio_window, repeats=repeats * 10),
+    }
+
+
+def bench_preprocess(audio, repeats):
+    import librosa
+    from server import audio_prep
+
+    window = audio[:2 * SAMPLE_RATE]
+    harmonic, _ = librosa.effects.hpss(window)
+    cqt_db = librosa.amplitude_to_db(librosa.cqt(harmonic, sr=SAMPLE_RATE), ref=np.max)
+
+    results = {
+        "preprocess.hpss": time_call(lambda: librosa.effects.hpss(window), repeats=repeats),
+        "preprocess.cqt": time_call(
+            lambda: librosa.amplitude_to_db(librosa.cqt(harmonic, sr=SAMPLE_RATE), ref=np.max), repeats=repeats),
+        "preprocess.normalize": time_call(lambda: audio_prep.normalize_cqt(cqt_db), repeats=repeats * 10),
+        "preprocess.preprocess_buffer": time_call(
+            lambda: audio_prep.preprocess_buffer(window, SAMPLE_RATE), repeats=repeats),
+    }
+    # Preallocated engine used by the prediction loop
+    for feature in audio_prep.FEATURES:
+        engine = audio_prep.PreprocessingEngine(len(window), SAMPLE_RATE, feature)
+        results[f"preprocess.engine[{feature}]"] = time_call(lambda: engine.process(window), repeats=repeats)
+    return results
+
+
+def load_benchmark_model(model_path=MODEL_PATH):
+    """Loads the trained model if present, otherwise builds an untrained one of the same shape."""
+    if model_path and os.path.exists(model_path):
+        from src.model.model_loader import load_trained_model
+        print(f"Using trained model: {model_path}")
+        return load_trained_model(model_path)
+    from src.model.model import build_model
+    print("Trained model not found, using an untrained model with the same architecture.")
+    return build_model(INPUT_SHAPE, NUM_CLASSES)
+
+
+def bench_inference(model_path, repeats):
+    model = load_benchmark_model(model_path)
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in BATCH_SIZES:
+        batch = rng.standard_normal((batch_size, *INPUT_SHAPE)).astype(np.float32)
+        stats = time_call(lambda: model.predict(batch, verbose=0), repeats=repeats)
+        stats["per_sample_ms"] = stats["median_ms"] / batch_size
+        results[f"inference.predict[batch={batch_size}]"] = stats
+    return results
+
+
+def bench_handler(repeats):
+    from src.model.prediction_handler import get_tab_output
+
+    rng = np.random.default_rng(0)
+    logits = rng.standard_normal((256, NUM_CLASSES))
+    softmax = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    position = [0]
+    def handle_one():
+        get_tab_output(softmax[position[0] % len(softmax)][np.newaxis, :])
+        position[0] += 1
+    return {"handler.get_tab_output": time_call(handle_one, repeats=repeats * 50)}
+
+
+def make_synthetic_dataset(root, files_per_dir=10, seed=0):
+    """
+    Writes a small tree of random (84, 87, 1) arrays laid out like data/preprocessed:
+    <label>/<label>-fpick|npick/*.npy plus a flat negatives/ directory.
+    """
+    rng = np.random.default_rng(seed)
+    labels = ["A0", "B0", "D0", "Eb0", "G0", "e0"]
+    dirs = [os.path.join(root, label, f"{label}-{pick}") for label in labels for pick in ("fpick", "npick")]
+    dirs.append(os.path.join(root, "negatives"))
+    for directory in dirs:
+        os.makedirs(directory, exist_ok=True)
+        for i in range(files_per_dir):
+            np.save(os.path.join(directory, f"{i:03d}.npy"), rng.standard_normal(INPUT_SHAPE).astype(np.float32))
+
+
+def bench_data_loader(data_dir, repeats):
+    from src.data_utils.data_loader import get_data_dir
+
+    if data_dir:
+        return {"data_loader.get_data_dir": time_call(lambda: get_data_dir(data_dir), repeats=repeats, warmup=1)}
+    with tempfile.TemporaryDirectory() as tmp:
+        make_synthetic_dataset(tmp)
+        path = tmp + "/"
+        return {"data_loader.get_data_dir": time_call(lambda: get_data_dir(path), repeats=repeats, warmup=1)}
+
+
+# --- Baseline Comparison ---
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares median timings against a baseline result file.
+
+    Returns:
+        list[dict]: One entry per benchmark present in both runs, with a 'regression' flag.
+    """
+    comparison = []
+    baseline_results = baseline.get("results", {})
+    for name, stats in results.items():
+        if name not in baseline_results:
+            continue
+        base_median = baseline_results[name]["median_ms"]
+        ratio = stats["median_ms"] / base_median if base_median > 0 else float("inf")
+        comparison.append({
+            "name": name,
+            "baseline_ms": base_median,
+            "current_ms": stats["median_ms"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + threshold,
+        })
+    return comparison
+
+
+def print_results(results):
+    print(f"\n{'benchmark':<45}{'median ms':>12}{'p95 ms':>12}{'min ms':>12}")
+    for name, stats in results.items():
+        print(f"{name:<45}{stats['median_ms']:>12.3f}{stats['p95_ms']:>12.3f}{stats['min_ms']:>12.3f}")
+
+
+def run_benchmarks(stages=ALL_STAGES, repeats=DEFAULT_REPEATS, model_path=MODEL_PATH, data_dir=None, seed=0):
+    audio = random_pluck_sequence(4.0, sr=SAMPLE_RATE, seed=seed)
+    results = {}
+    if "buffer" in stages:
+        results.update(bench_buffer(audio, repeats))
+    if "preprocess" in stages:
+        results.update(bench_preprocess(audio, repeats))
+    if "inference" in stages:
+        results.update(bench_inference(model_path, repeats))
+    if "handler" in stages:
+        results.update(bench_handler(repeats))
+    if "data_loader" in stages:
+        results.update(bench_data_loader(data_dir, repeats))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the real-time pipeline.")
+    parser.add_argument("--stages", nargs="+", choices=ALL_STAGES, default=ALL_STAGES,
+                        help="Stages to benchmark (default: all).")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS,
+                        help=f"Timed repetitions per benchmark (default: {DEFAULT_REPEATS}).")
+    parser.add_argument("--model", type=str, default=MODEL_PATH,
+                        help="Model file for the inference benchmark (untrained model if missing).")
+    parser.add_argument("--data_dir", type=str, default=None,
+                        help="Preprocessed data directory for get_data_dir (default: synthetic temp tree).")
+    parser.add_argument("--output", type=str, default="bench_results.json",
+                        help="Where to write the JSON results.")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Baseline JSON results to compare against.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Relative slowdown flagged as regression (default: {DEFAULT_THRESHOLD}).")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.stages, args.repeats, args.model, args.data_dir)
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "stages": args.stages,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare_to_baseline(results, baseline, args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "entries": comparison}
+        print(f"\nComparison against {args.baseline} (threshold +{args.threshold:.0%}):")
+        for entry in comparison:
+            flag = "REGRESSION" if entry["regression"] else "ok"
+            print(f"  {entry['name']:<45}{entry['baseline_ms']:>10.3f} -> {entry['current_ms']:>10.3f} ms"
+                  f"  x{entry['ratio']:.2f}  {flag}")
+        if any(entry["regression"] for entry in comparison):
+            exit_code = 1
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    sys.exit(exit_code)
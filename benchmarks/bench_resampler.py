@@ -0,0 +1,109 @@
+"""
+    Cost and accuracy of the streaming polyphase resampler
+    (src/data_utils/resampling.py) at common device rates.
+
+    For every --rates entry, synthetic plucks at that rate are fed chunk by chunk
+    (the device blocksize that matches a 2048-frame chunk at 22,050 Hz). The
+    report gives the mean and p99 cost per chunk, the cost as a fraction of the
+    chunk's duration, the mean cost of the first and last tenth of the stream
+    (equal if the cost is independent of stream length) and the largest
+    deviation from scipy.signal.resample_poly on the whole signal. With --wav,
+    load_audio() is also timed against librosa.load() on that file.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_resampler
+        python -m benchmarks.bench_resampler --rates 44100 48000 96000 --wav data/raw/G0/G0-npick/G0_nailpick-11.wav
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src.data_utils.resampling import StreamingResampler
+from src.data_utils.synthetic_audio import random_pluck_sequence
+
+# --- Configuration ---
+TARGET_SR = 22050
+MODEL_BLOCKSIZE = 2048
+DEFAULT_RATES = (44100, 48000)
+DEFAULT_DURATION_SEC = 60.0
+# ---
+
+
+def bench_rate(rate, duration, seed=0):
+    from scipy.signal import resample_poly
+
+    audio = random_pluck_sequence(duration, sr=rate, seed=seed)
+    resampler = StreamingResampler(rate, TARGET_SR)
+    blocksize = int(round(MODEL_BLOCKSIZE * rate / TARGET_SR))
+    chunk_us, outputs = [], []
+    for start in range(0, len(audio), blocksize):
+        begin = time.perf_counter()
+        outputs.append(resampler.process(audio[start:start + blocksize]))
+        chunk_us.append((time.perf_counter() - begin) * 1e6)
+    outputs.append(resampler.flush())
+    reference = resample_poly(audio.astype(np.float64), resampler.up, resampler.down)
+    chunk_us = np.array(chunk_us[1:]) # Skip the first call (warm-up)
+    tenth = max(1, len(chunk_us) // 10)
+    return {
+        'rate': rate,
+        'ratio': f"{resampler.up}/{resampler.down}",
+        'taps_per_output': resampler.taps,
+        'blocksize': blocksize,
+        'chunks': int(len(chunk_us)),
+        'mean_us': float(chunk_us.mean()),
+        'p99_us': float(np.percentile(chunk_us, 99)),
+        'realtime_fraction': float(chunk_us.mean() / 1e6 / (blocksize / rate)),
+        'first_tenth_us': float(chunk_us[:tenth].mean()),
+        'last_tenth_us': float(chunk_us[-tenth:].mean()),
+        'max_error': float(np.abs(np.concatenate(outputs) - reference).max()),
+    }
+
+
+def bench_load(wav_path, repeats=3):
+    import librosa
+    from src.data_utils.preprocessing import load_audio
+
+    results = {}
+    for name, load in (('load_audio', lambda: load_audio(wav_path, sr=TARGET_SR)),
+                       ('librosa.load', lambda: librosa.load(wav_path, sr=TARGET_SR))):
+        load() # Warm-up (imports, resampler backends)
+        begin = time.perf_counter()
+        for _ in range(repeats):
+            load()
+        results[name + '_ms'] = (time.perf_counter() - begin) / repeats * 1000.0
+    return results
+
+
+def print_report(report):
+    print(f"{'rate':>7}{'ratio':>9}{'taps':>6}{'block':>7}{'mean us':>9}{'p99 us':>8}{'% of rt':>9}"
+          f"{'first us':>10}{'last us':>9}{'max err':>10}")
+    for r in report['rates']:
+        print(f"{r['rate']:>7}{r['ratio']:>9}{r['taps_per_output']:>6}{r['blocksize']:>7}{r['mean_us']:>9.0f}"
+              f"{r['p99_us']:>8.0f}{100 * r['realtime_fraction']:>8.2f}%{r['first_tenth_us']:>10.0f}"
+              f"{r['last_tenth_us']:>9.0f}{r['max_error']:>10.1e}")
+    if 'load' in report:
+        load = report['load']
+        print(f"Loading {report['wav']}: load_audio {load['load_audio_ms']:.1f} ms, "
+              f"librosa.load {load['librosa.load_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the streaming polyphase resampler.")
+    parser.add_argument("--rates", type=int, nargs="+", default=list(DEFAULT_RATES), help="Device rates in Hz.")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SEC, help="Seconds of audio per rate.")
+    parser.add_argument("--wav", default=None, help="Optional file to time load_audio() against librosa.load().")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path.")
+    args = parser.parse_args()
+
+    report = {'rates': [bench_rate(rate, args.duration) for rate in args.rates]}
+    if args.wav:
+        report['wav'] = args.wav
+        report['load'] = bench_load(args.wav)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
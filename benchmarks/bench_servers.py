@@ -0,0 +1,152 @@
+"""
+    Side-by-side end-to-end latency of the eventlet server (run.py) and the
+    asyncio/ASGI server (server/asgi_app.py).
+
+    Each server is started in turn as a subprocess with the synthetic audio source
+    and EMIT_CHANGES_ONLY=0 (one update per prediction tick). Socket.IO clients
+    connect and record, for every 'prediction_update', the delay between the
+    capture time of the window's newest sample (payload 'ts') and its arrival,
+    plus the jitter of the gaps between updates. Both servers run on the same
+    machine as the clients, so the wall clocks agree.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_servers --model updated_model.h5 --duration 30
+        python -m benchmarks.bench_servers --servers asgi --clients 8 --output servers.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import socketio
+
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+SERVERS = {
+    'eventlet': [sys.executable, 'run.py'],
+    'asgi': [sys.executable, '-m', 'server.asgi_app'],
+}
+DEFAULT_PORT = 5001
+DEFAULT_DURATION_SEC = 20.0
+DEFAULT_CLIENTS = 4
+STARTUP_TIMEOUT_SEC = 120.0 # Model loading + TensorFlow import
+WARMUP_SEC = 3.0            # Updates received before this are ignored
+PERCENTILES = (50, 95, 99)
+# ---
+
+
+def wait_until_predicting(port, timeout=STARTUP_TIMEOUT_SEC, process=None):
+    """Polls /status until the prediction loop has produced its first prediction."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} during startup")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/status", timeout=2) as response:
+                if json.load(response)['prediction_loop']['predictions'] > 0:
+                    return
+        except (OSError, ValueError, KeyError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server on port {port} produced no predictions within {timeout:.0f}s")
+
+
+def collect_updates(port, clients, duration):
+    """Connects `clients` Socket.IO clients and returns their (arrival_time, payload_ts) lists."""
+    records = [[] for _ in range(clients)]
+    connections = []
+    start = time.time()
+    for i in range(clients):
+        client = socketio.Client(reconnection=False)
+
+        def on_update(data, records=records[i]):
+            records.append((time.time(), data.get('ts', 0.0)))
+
+        client.on('prediction_update', on_update)
+        client.connect(f"http://127.0.0.1:{port}", transports=['websocket'])
+        connections.append(client)
+    time.sleep(duration)
+    for client in connections:
+        client.disconnect()
+    return [[(arrival, ts) for arrival, ts in rows if arrival - start >= WARMUP_SEC and ts > 0] for rows in records]
+
+
+def summarize(records):
+    """Latency (arrival - capture) and inter-arrival jitter statistics in milliseconds."""
+    latencies = np.array([(arrival - ts) * 1000.0 for rows in records for arrival, ts in rows])
+    gaps = np.concatenate([np.diff([arrival for arrival, _ in rows]) * 1000.0 for rows in records if len(rows) > 1]
+                          or [np.empty(0)])
+    if not len(latencies):
+        return {'updates': 0}
+    summary = {'updates': int(len(latencies)), 'mean_ms': float(latencies.mean()), 'max_ms': float(latencies.max())}
+    summary.update({f"p{p}_ms": float(np.percentile(latencies, p)) for p in PERCENTILES})
+    if len(gaps):
+        summary['gap_mean_ms'] = float(gaps.mean())
+        summary['gap_std_ms'] = float(gaps.std())
+        summary['gap_max_ms'] = float(gaps.max())
+    return summary
+
+
+def bench_server(name, model, port=DEFAULT_PORT, clients=DEFAULT_CLIENTS, duration=DEFAULT_DURATION_SEC,
+                 audio_source='synthetic:0'):
+    """Starts one server, measures it and shuts it down again."""
+    env = dict(os.environ, AUDIO_SOURCE=audio_source, EMIT_CHANGES_ONLY='0', PORT=str(port),
+               PYTHONUNBUFFERED='1')
+    if model:
+        env['MODEL_FILENAME'] = model
+    log_path = os.path.join(ROOT_DIR, f"bench_server_{name}.log")
+    with open(log_path, 'w') as log_file:
+        process = subprocess.Popen(SERVERS[name], cwd=ROOT_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+        try:
+            wait_until_predicting(port, process=process)
+            records = collect_updates(port, clients, duration)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    os.remove(log_path)
+    return summarize(records)
+
+
+def print_comparison(results):
+    print(f"{'server':<10}{'updates':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'gap ms':>9}{'gap std':>9}")
+    for name, stats in results.items():
+        if not stats.get('updates'):
+            print(f"{name:<10}{0:>9}")
+            continue
+        print(f"{name:<10}{stats['updates']:>9}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+              f"{stats['max_ms']:>9.1f}{stats.get('gap_mean_ms', float('nan')):>9.1f}"
+              f"{stats.get('gap_std_ms', float('nan')):>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare end-to-end latency of the eventlet and asyncio servers.")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=['eventlet', 'asgi'])
+    parser.add_argument("--model", type=str, default=None,
+                        help="Model file in models/ (MODEL_FILENAME, default: the servers' default).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS, help="Concurrent Socket.IO clients.")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SEC, help="Seconds measured per server.")
+    parser.add_argument("--source", type=str, default='synthetic:0', help="AUDIO_SOURCE for both servers.")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path.")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.servers:
+        print(f"Measuring '{name}' server ({args.clients} clients, {args.duration:.0f}s)...")
+        results[name] = bench_server(name, args.model, args.port, args.clients, args.duration, args.source)
+    print_comparison(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
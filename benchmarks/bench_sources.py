@@ -0,0 +1,82 @@
+"""
+    Sustained-throughput load test of the capture -> buffer -> prediction pipeline.
+
+    Replays a file or synthetic audio at N x realtime (0 = as fast as possible)
+    through the same modules app.py uses, without the web server, and reports
+    chunk throughput, drop rates and prediction loop timing.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_sources --source synthetic:1 --speed 4 --duration 30
+        python -m benchmarks.bench_sources --source file:data/raw/G0/G0-fpick/G0_fingerpick-01.wav --speed 0
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+
+from benchmarks.bench_pipeline import MODEL_PATH, load_benchmark_model
+from server import audio_buffer
+from server import audio_processor
+from server import audio_sources
+from src.model.prediction_handler import get_tab_output
+
+
+def run_load_test(source_spec, speed, duration_sec, model_path=MODEL_PATH, process_interval_sec=0.05):
+    model = load_benchmark_model(model_path)
+    output_queue = queue.Queue(maxsize=5)
+    stop_event = threading.Event()
+
+    source = audio_sources.create_audio_source(source_spec, samplerate=audio_buffer.SAMPLE_RATE, speed=speed)
+    source.start()
+    audio_buffer.start_buffer_thread()
+    pred_thread = threading.Thread(
+        target=audio_processor.run_prediction_loop,
+        args=(model, get_tab_output, output_queue, stop_event, audio_buffer.SAMPLE_RATE, process_interval_sec),
+        name="PredictionLoopThread",
+        daemon=True,
+    )
+    pred_thread.start()
+
+    # Drain predictions like the emitter task would
+    received = 0
+    deadline = time.monotonic() + duration_sec
+    while time.monotonic() < deadline:
+        try:
+            output_queue.get(timeout=0.1)
+            received += 1
+        except queue.Empty:
+            pass
+
+    stop_event.set()
+    source.stop()
+    audio_buffer.stop_buffer_thread()
+    pred_thread.join(timeout=5.0)
+
+    loop = dict(audio_processor.loop_stats)
+    loop['mean_processing_ms'] = (1000.0 * loop['total_processing_sec'] / loop['ticks']) if loop['ticks'] else 0.0
+    return {
+        'source': source.get_stats(),
+        'prediction_loop': loop,
+        'predictions_received': received,
+        'predictions_per_sec': received / duration_sec,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the audio pipeline with a file or synthetic source.")
+    parser.add_argument("--source", type=str, default="synthetic",
+                        help="Audio source spec: 'file:<path>' or 'synthetic[:<seed>]' (default: synthetic).")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed, N x realtime; 0 = as fast as possible (default: 1.0).")
+    parser.add_argument("--duration", type=float, default=20.0, help="Test duration in seconds (default: 20).")
+    parser.add_argument("--model", type=str, default=MODEL_PATH, help="Model file (untrained model if missing).")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON output path.")
+    args = parser.parse_args()
+
+    report = run_load_test(args.source, args.speed, args.duration, args.model)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
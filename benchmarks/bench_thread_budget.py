@@ -0,0 +1,167 @@
+"""
+    Tail-latency impact of CPU thread budgets (server/thread_budget.py).
+
+    Every budget runs in its own subprocess (TensorFlow and BLAS pool sizes can only
+    be set once per process): synthetic audio at realtime goes through the same
+    capture -> buffer -> prediction loop as the server, optionally next to
+    `--load` busy threads doing NumPy work to emulate a loaded machine. For each
+    prediction the delay between the capture time of the window's newest sample and
+    the prediction reaching the output queue is recorded; the table compares its
+    percentiles and the prediction loop's per-tick processing time.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_thread_budget --duration 20
+        python -m benchmarks.bench_thread_budget --load 2 --budgets default tf1_blas1
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from server import thread_budget
+
+# --- Configuration ---
+DEFAULT_DURATION_SEC = 20.0
+WARMUP_SEC = 3.0
+PERCENTILES = (50, 95, 99)
+# Named budgets: environment variables read by thread_budget.ThreadBudget.from_env()
+BUDGETS = {
+    'default': {},
+    'tf1_blas1': {'TF_INTRA_OP_THREADS': '1', 'TF_INTER_OP_THREADS': '1', 'BLAS_THREADS': '1'},
+    'tf2_blas1': {'TF_INTRA_OP_THREADS': '2', 'TF_INTER_OP_THREADS': '1', 'BLAS_THREADS': '1'},
+    # Needs 3+ CPUs: capture + io share core 0, preprocessing on 1, TensorFlow on the rest
+    'pinned': {'TF_INTRA_OP_THREADS': '1', 'TF_INTER_OP_THREADS': '1', 'BLAS_THREADS': '1',
+               'CPU_AFFINITY': 'capture=0;io=0;preprocess=1;inference=2-{last}'},
+}
+MIN_CPUS = {'pinned': 3}
+RESULT_PREFIX = 'RESULT '
+# ---
+
+
+def run_worker(duration, load_threads, model_path):
+    """Runs the pipeline in this process (budget already configured) and returns latency stats."""
+    import queue
+
+    import numpy as np
+
+    from benchmarks.bench_pipeline import load_benchmark_model
+    from server import audio_buffer
+    from server import audio_processor
+    from server import audio_sources
+    from src.model.prediction_handler import get_tab_output
+
+    thread_budget.active_budget.apply_runtime()
+    with thread_budget.pinned('inference'):
+        model = load_benchmark_model(model_path)
+    thread_budget.pin_current_thread('io')
+
+    stop_event = threading.Event()
+
+    def busy_load():
+        rng = np.random.default_rng(0)
+        a = rng.standard_normal((256, 256))
+        while not stop_event.is_set():
+            a = np.tanh(a @ a.T / 256.0)
+
+    for i in range(load_threads):
+        threading.Thread(target=busy_load, name=f"LoadThread-{i}", daemon=True).start()
+
+    source = audio_sources.create_audio_source('synthetic:0', samplerate=audio_buffer.SAMPLE_RATE, speed=1.0)
+    source.start()
+    audio_buffer.start_buffer_thread()
+    output_queue = queue.Queue(maxsize=5)
+    threading.Thread(
+        target=audio_processor.run_prediction_loop,
+        args=(model, get_tab_output, output_queue, stop_event, audio_buffer.SAMPLE_RATE),
+        name="PredictionLoopThread",
+        daemon=True,
+    ).start()
+
+    latencies = []
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        try:
+            item = output_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if time.monotonic() - start >= WARMUP_SEC:
+            latencies.append((time.time() - item['capture_ts']) * 1000.0)
+
+    stop_event.set()
+    source.stop()
+    audio_buffer.stop_buffer_thread()
+
+    loop = audio_processor.loop_stats
+    latencies = np.array(latencies)
+    result = {
+        'predictions': int(len(latencies)),
+        'mean_processing_ms': 1000.0 * loop['total_processing_sec'] / max(loop['ticks'], 1),
+        'max_processing_ms': 1000.0 * loop['max_processing_sec'],
+        'late_ticks': loop['late_ticks'],
+        'ticks': loop['ticks'],
+        'thread_budget': thread_budget.get_report(),
+    }
+    if len(latencies):
+        result.update({f"p{p}_ms": float(np.percentile(latencies, p)) for p in PERCENTILES})
+        result['max_ms'] = float(latencies.max())
+    return result
+
+
+def run_budget(name, duration, load_threads, model_path):
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    if cpus < MIN_CPUS.get(name, 1):
+        return {'skipped': f"needs {MIN_CPUS[name]} CPUs, {cpus} available"}
+    env = dict(os.environ)
+    env.update({key: value.format(last=cpus - 1) for key, value in BUDGETS[name].items()})
+    command = [sys.executable, '-m', 'benchmarks.bench_thread_budget', '--worker', '--duration', str(duration),
+               '--load', str(load_threads)]
+    if model_path:
+        command += ['--model', model_path]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1:]}
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+
+def print_comparison(results):
+    print(f"{'budget':<12}{'preds':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'tick ms':>9}{'tick max':>10}{'late':>7}")
+    for name, stats in results.items():
+        if 'p50_ms' not in stats:
+            print(f"{name:<12}  {stats.get('skipped') or stats.get('error') or 'no predictions'}")
+            continue
+        print(f"{name:<12}{stats['predictions']:>7}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}{stats['mean_processing_ms']:>9.1f}"
+              f"{stats['max_processing_ms']:>10.1f}{stats['late_ticks']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pipeline tail latency under different thread budgets.")
+    parser.add_argument("--budgets", nargs="+", choices=list(BUDGETS), default=list(BUDGETS))
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SEC, help="Seconds per budget.")
+    parser.add_argument("--load", type=int, default=0, help="Busy NumPy threads competing with the pipeline.")
+    parser.add_argument("--model", type=str, default=None, help="Model file (untrained model if missing).")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        thread_budget.configure_from_env() # Before the worker imports NumPy
+        print(RESULT_PREFIX + json.dumps(run_worker(args.duration, args.load, args.model)))
+        sys.exit(0)
+
+    results = {}
+    for name in args.budgets:
+        print(f"Running budget '{name}' ({args.duration:.0f}s, {args.load} load threads)...")
+        results[name] = run_budget(name, args.duration, args.load, args.model)
+    print_comparison(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
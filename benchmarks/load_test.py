@@ -0,0 +1,237 @@
+"""
+    Socket.IO fan-out load test: how many UI clients one server instance sustains.
+
+    Starts run.py (or the ASGI server) with the synthetic audio source and
+    EMIT_CHANGES_ONLY=0, so every prediction tick is sent to every client, then
+    steps through increasing client counts. Simulated clients are asyncio
+    Socket.IO clients (python-socketio + aiohttp) spread over --procs worker
+    processes; they acknowledge every update like the browser page does. For
+    each step the clients connect, then all of them record the updates arriving
+    in the same wall-clock window:
+        - delivery latency: arrival time - capture time of the window's newest
+          sample (payload 'ts'); clients and server share the machine's clock
+        - missed updates: updates the server published in the window (its
+          /status 'emits'; the emitter coalesces to the newest prediction per
+          interval, so predictions it skips aren't counted) that a client
+          never received, e.g. dropped by its send queue; clients stay
+          connected GRACE_SEC longer to catch late ones
+        - server CPU (utime + stime of the server process) and resident memory
+    The report marks the largest step whose p95 latency stays within
+    --max_added_p95_ms of the first (smallest) step, which is the pipeline's
+    own latency on this machine, and that misses at most --max_missed. If the
+    first step received no updates there is no baseline and no capacity. The
+    load generator competes with the server for the same CPUs, so its own CPU
+    use is reported too; a saturated generator means the result is a lower
+    bound.
+
+    Usage (from the project root):
+        python -m benchmarks.load_test --model updated_model.h5 --steps 10 100 500 1000 2000
+        python -m benchmarks.load_test --server asgi --procs 4 --duration 20 --output capacity.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import time
+import urllib.request
+
+import numpy as np
+
+from benchmarks.bench_servers import SERVERS, wait_until_predicting
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+DEFAULT_STEPS = (10, 50, 100, 250, 500, 1000)
+DEFAULT_DURATION_SEC = 15.0
+DEFAULT_PORT = 5001
+DEFAULT_MAX_ADDED_P95_MS = 250.0 # p95 latency the fan-out may add on top of the first step's
+DEFAULT_MAX_MISSED = 0.05       # Fraction of the published updates a client may miss
+CONNECT_CONCURRENCY = 50        # Simultaneous connection attempts per worker process
+CONNECT_BUDGET_SEC = 5.0        # Base time allowed for connecting, plus CONNECT_SEC_PER_CLIENT per client
+CONNECT_SEC_PER_CLIENT = 0.02
+GRACE_SEC = 3.0                 # Clients keep listening this long after the window for in-flight updates
+PERCENTILES = (50, 95, 99)
+# ---
+
+
+# --- Client worker process ---
+
+async def _run_clients(port, count, start_at, duration):
+    import socketio
+
+    records = [[] for _ in range(count)]
+    clients = []
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def connect(index):
+        client = socketio.AsyncClient(reconnection=False)
+
+        async def on_update(data, rows=records[index]):
+            rows.append((time.time(), data.get('ts', 0.0), data.get('seq', 0)))
+
+        client.on('prediction_update', on_update)
+        async with semaphore:
+            try:
+                await client.connect(f"http://127.0.0.1:{port}", transports=['websocket'])
+                clients.append((index, client))
+            except Exception:
+                pass
+
+    await asyncio.gather(*(connect(i) for i in range(count)))
+    connected = len(clients)
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    cpu_start = time.process_time()
+    await asyncio.sleep(duration)
+    cpu_sec = time.process_time() - cpu_start
+    await asyncio.sleep(GRACE_SEC)
+    await asyncio.gather(*(client.disconnect() for _, client in clients), return_exceptions=True)
+    # (arrival, capture ts, seq) rows of every connected client; the parent selects the window by seq
+    rows = [np.array(records[index], dtype=np.float64).reshape(-1, 3) for index, _ in clients]
+    return {'connected': connected, 'rows': rows, 'cpu_sec': cpu_sec}
+
+
+def client_worker(port, count, start_at, duration):
+    return asyncio.run(_run_clients(port, count, start_at, duration))
+
+
+# --- Server process metrics ---
+
+def process_cpu_sec(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK') # utime + stime
+
+
+def process_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return None
+
+
+def server_counters(port):
+    """(predictions made, updates published to the clients) so far."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/status", timeout=5) as response:
+        status = json.load(response)
+    return status['prediction_loop']['predictions'], status['emits']
+
+
+# --- Steps ---
+
+def run_step(pool, server_pid, port, clients, procs, duration):
+    shares = [clients // procs + (1 if i < clients % procs else 0) for i in range(procs)]
+    start_at = time.time() + CONNECT_BUDGET_SEC + CONNECT_SEC_PER_CLIENT * clients
+    jobs = [pool.apply_async(client_worker, (port, share, start_at, duration)) for share in shares if share]
+
+    time.sleep(max(0.0, start_at - time.time()))
+    cpu_start, (predictions_start, emits_start) = process_cpu_sec(server_pid), server_counters(port)
+    time.sleep(duration)
+    cpu_end, (predictions_end, emits_end) = process_cpu_sec(server_pid), server_counters(port)
+    rss = process_rss_mb(server_pid)
+    results = [job.get() for job in jobs]
+
+    # Prediction seq numbers count up with loop_stats['predictions'], so the window is (start, end]
+    produced = predictions_end - predictions_start
+    published = emits_end - emits_start
+    latencies, received = [], []
+    for rows in (rows for result in results for rows in result['rows']):
+        rows = rows[(rows[:, 2] > predictions_start) & (rows[:, 2] <= predictions_end) & (rows[:, 1] > 0)]
+        latencies.append((rows[:, 0] - rows[:, 1]) * 1000.0)
+        received.append(len(np.unique(rows[:, 2])))
+    latencies = np.concatenate(latencies or [np.empty(0)])
+    received = np.array(received)
+    connected = sum(result['connected'] for result in results)
+    step = {
+        'clients': clients,
+        'connected': connected,
+        'produced': int(produced),
+        'published': int(published),
+        'updates_per_client_per_sec': float(received.mean() / duration) if len(received) else 0.0,
+        'missed': float(max(0.0, 1.0 - received.mean() / published)) if published and len(received) else None,
+        'server_cpu_pct': 100.0 * (cpu_end - cpu_start) / duration,
+        'server_rss_mb': rss,
+        'generator_cpu_pct': 100.0 * sum(result['cpu_sec'] for result in results) / duration,
+    }
+    if len(latencies):
+        step.update({f"p{p}_ms": float(np.percentile(latencies, p)) for p in PERCENTILES})
+        step['max_ms'] = float(latencies.max())
+    return step
+
+
+def within_limits(step, baseline_p95_ms, max_added_p95_ms, max_missed):
+    return (step['connected'] == step['clients'] and 'p95_ms' in step
+            and step['p95_ms'] - baseline_p95_ms <= max_added_p95_ms
+            and step['missed'] is not None and step['missed'] <= max_missed)
+
+
+def print_report(steps, max_added_p95_ms, max_missed):
+    print(f"{'clients':>8}{'conn':>7}{'upd/s':>7}{'missed':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'srv cpu':>9}{'srv MB':>8}{'gen cpu':>9}")
+    for step in steps:
+        missed = f"{100 * step['missed']:.1f}%" if step['missed'] is not None else "-"
+        print(f"{step['clients']:>8}{step['connected']:>7}{step['updates_per_client_per_sec']:>7.1f}{missed:>8}"
+              f"{step.get('p50_ms', float('nan')):>9.0f}{step.get('p95_ms', float('nan')):>9.0f}"
+              f"{step.get('p99_ms', float('nan')):>9.0f}{step['server_cpu_pct']:>8.0f}%{step['server_rss_mb']:>8.0f}"
+              f"{step['generator_cpu_pct']:>8.0f}%")
+    if not steps or 'p95_ms' not in steps[0]:
+        print("\nNo baseline: the first step received no updates, so no capacity can be given")
+        return 0
+    baseline = steps[0]['p95_ms']
+    limits = f"p95 <= {baseline + max_added_p95_ms:.0f} ms (first step + {max_added_p95_ms:.0f} ms) and " \
+             f"<= {100 * max_missed:.0f}% missed updates"
+    passing = [step['clients'] for step in steps if within_limits(step, baseline, max_added_p95_ms, max_missed)]
+    if passing:
+        print(f"\nCapacity: {max(passing)} clients within {limits}")
+    else:
+        print(f"\nNo step stayed within {limits}")
+    return max(passing) if passing else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Socket.IO fan-out capacity test against a local server.")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="eventlet")
+    parser.add_argument("--model", default=None, help="MODEL_FILENAME for the server (file in models/).")
+    parser.add_argument("--steps", type=int, nargs="+", default=list(DEFAULT_STEPS), help="Client counts.")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SEC, help="Measured seconds per step.")
+    parser.add_argument("--procs", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="Client worker processes.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max_added_p95_ms", type=float, default=DEFAULT_MAX_ADDED_P95_MS,
+                        help="Latency the fan-out may add over the first step (default: %(default)s).")
+    parser.add_argument("--max_missed", type=float, default=DEFAULT_MAX_MISSED,
+                        help="Fraction of updates a client may miss (default: %(default)s).")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON report path.")
+    args = parser.parse_args()
+
+    env = dict(os.environ, AUDIO_SOURCE='synthetic:0', EMIT_CHANGES_ONLY='0', PORT=str(args.port))
+    if args.model:
+        env['MODEL_FILENAME'] = args.model
+    steps = []
+    with open(os.devnull, 'w') as devnull:
+        server = subprocess.Popen(SERVERS[args.server], cwd=ROOT_DIR, env=env, stdout=devnull, stderr=devnull)
+        try:
+            wait_until_predicting(args.port, process=server)
+            with mp.get_context('spawn').Pool(args.procs) as pool:
+                for clients in args.steps:
+                    print(f"Step: {clients} clients...")
+                    steps.append(run_step(pool, server.pid, args.port, clients, args.procs, args.duration))
+                    if server.poll() is not None:
+                        print(f"Server exited with code {server.returncode}, stopping.")
+                        break
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    capacity = print_report(steps, args.max_added_p95_ms, args.max_missed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'server': args.server, 'duration_sec': args.duration, 'max_added_p95_ms': args.max_added_p95_ms,
+                       'max_missed': args.max_missed, 'capacity_clients': capacity, 'steps': steps}, f, indent=2)
+        print(f"Report written to {args.output}")
@@ -22,7 +22,7 @@ except ImportError as e:
 
 if __name__ == '__main__':
     host = '0.0.0.0'
-    port = 5001      # Make sure this matches the port you want to use
+    port = int(os.environ.get('PORT', '5001'))      # Make sure this matches the port you want to use
 
     print("Starting background audio tasks...")
     start_background_tasks() # Call the function to start threads
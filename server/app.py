@@ -8,7 +8,7 @@ import queue
 import time
 import atexit
 
-from flask import Flask, render_template, request
+from flask import Flask, Response, render_template, request, jsonify
 from flask_socketio import SocketIO, emit
 
 # --- Dynamic Python Path Adjustment ---
@@ -18,14 +18,26 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 # ---
 
+# --- CPU Thread Budget (before NumPy / TensorFlow are imported, see server/thread_budget.py) ---
+from server import thread_budget
+cpu_budget = thread_budget.configure_from_env()
+# ---
+
 # --- Import Project Modules ---
 try:
-    from src.model import model_loader
     from src.model import prediction_handler
+    from src.model import cascade
     from server import audio_stream
+    from server import audio_sources
     from server import audio_buffer
     from server import audio_prep
     from server import audio_processor
+    from server import prediction_codec
+    from server import client_queues
+    from server import session_recorder
+    from server import profiler
+    from server import perf_profiles
+    from server import model_manager as model_manager_module
 except ImportError as e:
     print("="*50)
     print(f"Error: Could not import one or more required modules: {e}")
@@ -45,33 +57,90 @@ app.config['SECRET_KEY'] = 'replace_this_with_a_real_secret_key!'
 socketio = SocketIO(app, async_mode='eventlet')
 
 # --- Load Model at Startup ---
-MODEL_FILENAME = 'updated_model.h5'
-MODEL_PATH = os.path.join(project_root, 'models', MODEL_FILENAME)
-loaded_model = None
+# Feature backend used for live preprocessing: 'cqt' or 'mel'. Must match what the model was trained on.
+FEATURE_BACKEND = os.environ.get('FEATURE_BACKEND', audio_prep.DEFAULT_FEATURE)
+MODEL_FILENAME = os.environ.get('MODEL_FILENAME', 'updated_model.h5' if FEATURE_BACKEND == 'cqt'
+                                else f'updated_model_{FEATURE_BACKEND}.h5')
+MODELS_DIR = os.path.join(project_root, 'models')
+MODEL_PATH = os.path.join(MODELS_DIR, MODEL_FILENAME)
+# Owns the active model; new models are loaded + warmed in the background and swapped in atomically
+model_manager = model_manager_module.ModelManager(MODELS_DIR, MODEL_FILENAME)
+cpu_budget.apply_runtime()
 try:
     log.info(f"Attempting to load model from: {MODEL_PATH}") # Use log variable
     if os.path.exists(MODEL_PATH):
-        loaded_model = model_loader.load_trained_model(MODEL_PATH)
-        if loaded_model:
+        loaded = model_manager.load() # Pinned to the inference cores while loading
+        if loaded:
              log.info("Model loading process completed successfully.") # Use log variable
         else:
-             log.error("Model loader returned None without raising an error.") # Use log variable
+             log.error(f"Model loading failed: {model_manager.status['last_error']}") # Use log variable
     else:
         log.error(f"Model file not found at path: {MODEL_PATH}") # Use log variable
 
 except Exception as e:
     log.error(f"An exception occurred during model loading: {e}", exc_info=True) # Use log variable
 
-if loaded_model is None:
+# Optional cascade gate (src/model/cascade.py), file in models/: the model only runs for windows
+# the gate can't answer itself (confident negatives, unchanged sustain)
+CASCADE_GATE = os.environ.get('CASCADE_GATE')
+cascade_gate = None
+if CASCADE_GATE:
+    try:
+        cascade_gate = cascade.CascadeGate.load(os.path.join(MODELS_DIR, CASCADE_GATE))
+        log.info(f"Cascade gate loaded from {CASCADE_GATE}")
+    except (OSError, KeyError, ValueError) as e:
+        log.error(f"Cascade gate disabled, could not load {CASCADE_GATE}: {e}")
+
+if model_manager.get_model() is None:
     log.warning("------------------------------------------------") # Use log variable
     log.warning("WARNING: Model failed to load. Predictions will not work.") # Use log variable
     log.warning("------------------------------------------------") # Use log variable
 # ---
 
+# --- Audio Source Selection ---
+# "mic" (default), "file:<path.wav>" or "synthetic[:<seed>]", see server/audio_sources.py
+AUDIO_SOURCE = os.environ.get('AUDIO_SOURCE', audio_sources.DEFAULT_SOURCE)
+# Replay speed for file/synthetic sources: 1.0 = realtime, N = N x realtime, 0 = as fast as possible
+AUDIO_SOURCE_SPEED = float(os.environ.get('AUDIO_SOURCE_SPEED', '1.0'))
+# Rate to open the microphone at (e.g. 48000), resampled to the model's rate; unset = 22050 Hz if the
+# device supports it, else its native rate
+DEVICE_SAMPLE_RATE = int(os.environ['DEVICE_SAMPLE_RATE']) if os.environ.get('DEVICE_SAMPLE_RATE') else None
+# 'queue' (callback -> audio_queue -> filler thread) or 'direct' (callback -> int16 ring buffer)
+CAPTURE_MODE = os.environ.get('CAPTURE_MODE', 'queue')
+# Interleaved input channels; > 1 (e.g. 6 for a hexaphonic pickup, one string per channel in tab order)
+# classifies every channel in one batched model call per tick and implies direct capture
+INPUT_CHANNELS = int(os.environ.get('INPUT_CHANNELS', '1'))
+# Record captured audio and emitted predictions: '1' = data/recorded_sessions/<timestamp>/, or a directory
+RECORD_SESSION = os.environ.get('RECORD_SESSION', '0')
+# Named performance profiles (config/perf_profiles.json), switchable at runtime via /api/profiles
+PERF_PROFILES_PATH = os.environ.get('PERF_PROFILES_PATH', perf_profiles.DEFAULT_PROFILES_PATH)
+PERF_PROFILE = os.environ.get('PERF_PROFILE')
+# ---
+
+# --- Prediction Emission ---
+# Only emit when the tab changes (plus a keepalive so clients can tell the server is alive)
+EMIT_CHANGES_ONLY = os.environ.get('EMIT_CHANGES_ONLY', '1') != '0'
+EMIT_KEEPALIVE_SEC = float(os.environ.get('EMIT_KEEPALIVE_SEC', '2.0'))
+# Every client has its own bounded queue keeping only the latest CLIENT_QUEUE_SIZE updates, so a
+# slow connection gets fewer, fresh updates instead of a stale backlog (see server/client_queues.py)
+CLIENT_QUEUE_SIZE = int(os.environ.get('CLIENT_QUEUE_SIZE', str(client_queues.DEFAULT_MAX_PENDING)))
+send_queues = client_queues.ClientSendQueues(
+    lambda sid, event, payload, callback: socketio.emit(event, payload, to=sid, callback=callback),
+    max_pending=CLIENT_QUEUE_SIZE)
+# ---
+
 # --- Global variables for background tasks and communication ---
 prediction_queue = queue.Queue(maxsize=5)
 stop_event = threading.Event()
 background_threads = []
+audio_source = None
+recorder = None
+emits = 0 # Predictions published to the clients (the emitter coalesces to the newest per interval)
+try:
+    profile_manager = perf_profiles.ProfileManager(PERF_PROFILES_PATH, model_manager, prediction_queue)
+except (OSError, ValueError) as e:
+    log.warning(f"Performance profiles disabled: {e}")
+    profile_manager = None
 # ---
 
 # --- Background Task Definitions ---
@@ -80,22 +149,39 @@ def emit_prediction_updates(output_queue: queue.Queue, stop_event: threading.Eve
     """
     Worker thread function that checks the output queue and emits predictions
     via SocketIO to connected clients.
+
+    Only the newest queued prediction is published each interval, into every
+    client's send queue. JSON clients get 'prediction_update' events, clients
+    that negotiated the binary format get 'prediction_frame' events (see
+    prediction_codec.py). Each payload is encoded once per format in use.
     """
+    global emits
     log.info("SocketIO emitter task starting.") # Use log variable
     last_sent_tab = None
+    last_emit_time = 0.0
     while not stop_event.is_set():
         try:
-            item = output_queue.get_nowait()
+            # Drain the queue, keeping only the latest prediction
+            item = None
+            while True:
+                try:
+                    item = output_queue.get_nowait()
+                except queue.Empty:
+                    break
             if item and item.get('type') == 'prediction':
                 tab_output = item.get('data')
-                # Optional: Only emit if the prediction has changed
-                # if tab_output != last_sent_tab:
-                #    log.info(f"Emitting prediction update: {tab_output}")
-                #    socketio.emit('prediction_update', {'tab': tab_output})
-                #    last_sent_tab = tab_output
-                socketio.emit('prediction_update', {'tab': tab_output})
-        except queue.Empty:
-            pass
+                now = time.monotonic()
+                changed = tab_output != last_sent_tab
+                if changed or not EMIT_CHANGES_ONLY or now - last_emit_time >= EMIT_KEEPALIVE_SEC:
+                    send_queues.publish(lambda fmt: prediction_codec.build_event(fmt, item))
+                    emits += 1
+                    if recorder is not None:
+                        recorder.record_prediction(item)
+                    if changed:
+                        log.debug(f"Emitted prediction update: {tab_output}")
+                    last_sent_tab = tab_output
+                    last_emit_time = now
+            send_queues.pump() # Clients in reduced mode, and unacknowledged updates that timed out
         except Exception as e:
             log.error(f"Error in emitter task: {e}", exc_info=False) # Use log variable
         socketio.sleep(interval_sec)
@@ -104,44 +190,69 @@ def emit_prediction_updates(output_queue: queue.Queue, stop_event: threading.Eve
 
 def start_background_tasks():
     """Initializes and starts all background audio processing threads."""
-    global background_threads
+    global background_threads, audio_source, recorder
 
-    if loaded_model is None:
+    if model_manager.get_model() is None:
         log.error("Model not loaded, cannot start background processing.") # Use log variable
         return
 
     log.info("Starting background tasks...") # Use log variable
 
-    # 1. Start Audio Input Stream
+    # 1. Start Audio Input Source (and the session recorder, which taps its chunks)
+    if CAPTURE_MODE == 'direct' or INPUT_CHANNELS > 1: # The deque path is mono only
+        audio_buffer.enable_direct_capture(channels=INPUT_CHANNELS)
+    if RECORD_SESSION != '0':
+        recorder = session_recorder.SessionRecorder(
+            session_recorder.create_session_dir() if RECORD_SESSION == '1' else RECORD_SESSION,
+            audio_buffer.SAMPLE_RATE, channels=INPUT_CHANNELS)
+        try:
+            recorder.start()
+            audio_stream.recorder = recorder
+        except OSError as e:
+            log.error(f"Session recording disabled: {e}")
+            recorder = None
     try:
-        log.info("Starting audio stream...") # Use log variable
-        # Assuming SAMPLE_RATE is defined in audio_buffer and needed by start_stream
+        log.info(f"Starting audio source '{AUDIO_SOURCE}'...") # Use log variable
+        # Assuming SAMPLE_RATE is defined in audio_buffer and needed by the source
         sample_rate = audio_buffer.SAMPLE_RATE
-        audio_stream.start_stream(samplerate=sample_rate)
-        log.info("Audio stream started.") # Use log variable
+        audio_source = audio_sources.create_audio_source(AUDIO_SOURCE, samplerate=sample_rate,
+                                                         speed=AUDIO_SOURCE_SPEED, channels=INPUT_CHANNELS,
+                                                         device_rate=DEVICE_SAMPLE_RATE)
+        audio_source.start()
+        log.info("Audio source started.") # Use log variable
     except Exception as e:
         log.error(f"FATAL: Failed to start audio stream: {e}", exc_info=True) # Use log variable
         return
 
-    # 2. Start Buffer Filling Thread
+    # 2. Start Buffer Filling Thread (not needed in direct capture mode)
     try:
-        log.info("Starting audio buffer thread...") # Use log variable
-        audio_buffer.start_buffer_thread()
-        log.info("Audio buffer thread started.") # Use log variable
+        if audio_buffer.CAPTURE_MODE != 'direct':
+            log.info("Starting audio buffer thread...") # Use log variable
+            audio_buffer.start_buffer_thread()
+            log.info("Audio buffer thread started.") # Use log variable
     except Exception as e:
         log.error(f"FATAL: Failed to start buffer thread: {e}", exc_info=True) # Use log variable
         return
 
+    # Startup profile (PERF_PROFILE, else the file's default_profile)
+    if profile_manager is not None and (PERF_PROFILE or profile_manager.default_profile):
+        try:
+            profile_manager.apply(PERF_PROFILE or profile_manager.default_profile)
+        except ValueError as e:
+            log.error(f"Could not apply startup profile: {e}")
+
     log.info("Allowing initial buffer fill (2s)...") # Use log variable
     time.sleep(2)
 
     # 3. Start the Prediction Loop Thread
     log.info("Starting prediction loop thread...") # Use log variable
     try:
-        handler_func = prediction_handler.get_tab_output
+        handler_func = (prediction_handler.get_hexaphonic_tab_output if INPUT_CHANNELS > 1
+                        else prediction_handler.get_tab_output)
         pred_thread = threading.Thread(
             target=audio_processor.run_prediction_loop,
-            args=(loaded_model, handler_func, prediction_queue, stop_event, audio_buffer.SAMPLE_RATE),
+            args=(model_manager, handler_func, prediction_queue, stop_event, audio_buffer.SAMPLE_RATE),
+            kwargs={'feature': FEATURE_BACKEND, 'gate': cascade_gate},
             name="PredictionLoopThread",
             daemon=True
         )
@@ -163,6 +274,13 @@ def start_background_tasks():
         log.error(f"FATAL: Failed to start SocketIO emitter task: {e}", exc_info=True) # Use log variable
         return
 
+    # 5. Watch the models directory for a retrained/overwritten model file
+    model_manager.start_watching()
+
+    # Pin the main thread last: threads inherit the affinity of the thread that creates them
+    thread_budget.pin_current_thread('io')
+    log.info(f"Thread budget: {thread_budget.get_report()}")
+
     log.info("All background tasks initiated.") # Use log variable
 
 # --- Web Routes and SocketIO Handlers ---
@@ -171,14 +289,130 @@ def index():
     # log.info("HTTP Request: Serving index.html") # Use log variable
     return render_template('index.html')
 
+@app.route('/status')
+def status():
+    """Pipeline throughput and drop counters, for load testing and monitoring."""
+    return jsonify({
+        'audio_source': audio_source.get_stats() if audio_source is not None else None,
+        'audio_queue_size': audio_stream.audio_queue.qsize(),
+        'capture': audio_buffer.get_capture_stats(),
+        'prediction_loop': audio_processor.loop_stats,
+        'prediction_queue_size': prediction_queue.qsize(),
+        'emits': emits,
+        'clients': {fmt: list(send_queues.formats().values()).count(fmt) for fmt in ('json', 'binary')},
+        'client_queues': send_queues.get_stats(),
+        'recorder': recorder.get_stats() if recorder is not None else None,
+        'thread_budget': thread_budget.get_report(),
+        'perf_profile': profile_manager.active if profile_manager is not None else None,
+        'cascade_gate': cascade_gate.get_stats() if cascade_gate is not None else None,
+    })
+
+def is_admin_request():
+    """
+    Admin endpoints are allowed from localhost, or from anywhere with ?token=<ADMIN_TOKEN>
+    when the ADMIN_TOKEN environment variable is set.
+    """
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if admin_token:
+        return request.args.get('token') == admin_token or request.headers.get('X-Admin-Token') == admin_token
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/model', methods=['GET', 'POST'])
+def model_api():
+    """
+    GET: active model status and the model files available in models/.
+    POST {"filename": "<file in models/>"}: load, warm up and hot-swap that model in the background.
+    """
+    if request.method == 'POST':
+        if not is_admin_request():
+            return jsonify({'error': 'forbidden'}), 403
+        filename = os.path.basename((request.get_json(silent=True) or {}).get('filename', ''))
+        if filename not in model_manager.available_models():
+            return jsonify({'error': f"unknown model file '{filename}'",
+                            'available': model_manager.available_models()}), 400
+        model_manager.request_swap(filename)
+        return jsonify({'status': 'loading', 'filename': filename}), 202
+    return jsonify({**model_manager.status, 'available': model_manager.available_models()})
+
+@app.route('/api/profiles', methods=['GET', 'POST'])
+def profiles_api():
+    """
+    GET: active performance profile, the effective pipeline settings and all defined profiles.
+    POST {"name": "<profile>"}: switch profiles in place (admin only); {"reload": true} re-reads the file first.
+    """
+    if profile_manager is None:
+        return jsonify({'error': 'performance profiles are not configured'}), 404
+    if request.method == 'POST':
+        if not is_admin_request():
+            return jsonify({'error': 'forbidden'}), 403
+        body = request.get_json(silent=True) or {}
+        try:
+            if body.get('reload'):
+                profile_manager.reload()
+            if body.get('name'):
+                profile_manager.apply(body['name'])
+        except (OSError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(profile_manager.get_status())
+
+@app.route('/api/profile', methods=['GET'])
+def profile_api():
+    """
+    Admin only. Profiles the running process for ?seconds=N (default 5, max 60):
+    ?mode=cpu (default): samples every thread's stack and returns collapsed stacks as text
+        (flamegraph.pl / speedscope input); ?thread=<name part> keeps matching threads only,
+        ?format=json returns per-thread sample counts and the top stacks instead.
+    ?mode=memory: tracemalloc allocation growth per source line, for allocations made from
+        ?files=<basenames, comma separated> (default audio_prep.py,audio_buffer.py).
+    The profile runs in its own thread; this handler only polls it, so the emitter keeps running.
+    """
+    if not is_admin_request():
+        return jsonify({'error': 'forbidden'}), 403
+    mode = request.args.get('mode', 'cpu')
+    if mode not in ('cpu', 'memory'):
+        return jsonify({'error': f"unknown mode '{mode}'"}), 400
+    seconds = request.args.get('seconds', default=profiler.DEFAULT_DURATION_SEC, type=float)
+    if mode == 'memory':
+        files = request.args.get('files')
+        kwargs = {'files': tuple(files.split(','))} if files else {}
+    else:
+        kwargs = {'thread_filter': request.args.get('thread')}
+    try:
+        result = profiler.ProfileJob(mode, seconds, **kwargs).start().wait(socketio.sleep)
+    except profiler.ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    if mode == 'memory':
+        return jsonify(result)
+    if request.args.get('format') == 'json':
+        return jsonify({**result, 'stacks': [{'stack': stack, 'samples': count}
+                                             for stack, count in result['stacks'].most_common(50)]})
+    return Response(profiler.collapsed(result['stacks']), mimetype='text/plain')
+
 @socketio.on('connect')
 def handle_connect():
     log.info(f"Client connected: {request.sid}") # Use log variable
-    emit('prediction_update', {'tab': [0, 0, 0, 0, 0, 0]}, room=request.sid)
+    send_queues.add(request.sid, 'json')
+    emit('prediction_update', prediction_codec.json_payload([0, 0, 0, 0, 0, 0]), room=request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     log.info(f"Client disconnected: {request.sid}") # Use log variable
+    send_queues.remove(request.sid)
+
+@socketio.on('set_format')
+def handle_set_format(data):
+    """
+    Per-client payload negotiation: {'format': 'binary'} switches the client to
+    'prediction_frame' binary frames, {'format': 'json'} back to 'prediction_update'.
+    Returns the accepted format (and frame version) as the event acknowledgement.
+    """
+    requested = (data or {}).get('format', 'json')
+    if requested not in ('json', 'binary'):
+        log.warning(f"Client {request.sid} requested unknown format '{requested}', keeping JSON.")
+        requested = 'json'
+    send_queues.set_format(request.sid, requested)
+    log.info(f"Client {request.sid} switched to {requested} prediction payloads.")
+    return {'format': requested, 'version': prediction_codec.FRAME_VERSION}
 
 @socketio.on_error_default
 def default_error_handler(e):
@@ -190,6 +424,7 @@ def shutdown_server():
     """Signals background threads to stop and cleans up."""
     log.info("Shutdown requested. Signaling background tasks...") # Use log variable
     stop_event.set()
+    model_manager.stop_watching()
 
     try:
         log.info("Stopping audio buffer thread...") # Use log variable
@@ -202,17 +437,16 @@ def shutdown_server():
         log.error(f"Error stopping audio buffer thread: {e}") # Use log variable
 
     try:
-        log.info("Stopping audio stream...") # Use log variable
-        # Add a stop_stream() function to audio_stream.py or use sd.stop()
-        if hasattr(audio_stream, 'stop_stream'):
-           audio_stream.stop_stream()
-           log.info("Called audio_stream.stop_stream()")
-        else:
-           import sounddevice as sd
-           sd.stop()
-           log.info("Called sounddevice.stop()")
+        log.info("Stopping audio source...") # Use log variable
+        if audio_source is not None:
+           audio_source.stop()
+           log.info(f"Stopped audio source '{audio_source.name}'.")
     except Exception as e:
-        log.error(f"Error stopping audio stream: {e}") # Use log variable
+        log.error(f"Error stopping audio source: {e}") # Use log variable
+
+    if recorder is not None:
+        audio_stream.recorder = None
+        recorder.stop()
 
     log.info("Shutdown sequence completed.") # Use log variable
 
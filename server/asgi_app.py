@@ -0,0 +1,404 @@
+# server/asgi_app.py
+
+"""
+Alternative server entry point on asyncio (ASGI Socket.IO + uvicorn).
+
+The eventlet server (app.py / run.py) mixes green threads with TensorFlow,
+librosa and PyAudio running in real OS threads, so a long native call can
+stall the emitter. Here the event loop only does network I/O:
+    - capture runs in the audio source's own thread (PortAudio callback or
+      file/synthetic pacing thread), buffering as in app.py
+    - preprocessing + inference run in the dedicated prediction loop thread
+    - model loading runs in the default thread pool executor
+    - predictions reach the loop through a queue that wakes the emitter with
+      call_soon_threadsafe(), so there is no polling interval
+The Socket.IO protocol, events, payloads and per-client send queues are the
+same as app.py's, so the same web page and clients work against either server.
+
+Usage (from the project root):
+    python -m server.asgi_app                    # http://localhost:5001
+    AUDIO_SOURCE=synthetic PORT=5002 python -m server.asgi_app
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.parse
+
+import socketio
+import uvicorn
+
+from server import thread_budget
+cpu_budget = thread_budget.configure_from_env() # Before NumPy / TensorFlow are imported
+
+from src.model import cascade
+from src.model import prediction_handler
+from server import audio_buffer
+from server import audio_prep
+from server import audio_processor
+from server import audio_sources
+from server import audio_stream
+from server import client_queues
+from server import model_manager as model_manager_module
+from server import perf_profiles
+from server import prediction_codec
+from server import profiler
+from server import session_recorder
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(threadName)s] - %(message)s')
+log = logging.getLogger(__name__)
+
+# --- Configuration (same environment variables as app.py) ---
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FEATURE_BACKEND = os.environ.get('FEATURE_BACKEND', audio_prep.DEFAULT_FEATURE)
+MODEL_FILENAME = os.environ.get('MODEL_FILENAME', 'updated_model.h5' if FEATURE_BACKEND == 'cqt'
+                                else f'updated_model_{FEATURE_BACKEND}.h5')
+MODELS_DIR = os.path.join(project_root, 'models')
+AUDIO_SOURCE = os.environ.get('AUDIO_SOURCE', audio_sources.DEFAULT_SOURCE)
+AUDIO_SOURCE_SPEED = float(os.environ.get('AUDIO_SOURCE_SPEED', '1.0'))
+DEVICE_SAMPLE_RATE = int(os.environ['DEVICE_SAMPLE_RATE']) if os.environ.get('DEVICE_SAMPLE_RATE') else None
+CAPTURE_MODE = os.environ.get('CAPTURE_MODE', 'queue')
+INPUT_CHANNELS = int(os.environ.get('INPUT_CHANNELS', '1')) # > 1: hexaphonic input, implies direct capture
+EMIT_CHANGES_ONLY = os.environ.get('EMIT_CHANGES_ONLY', '1') != '0'
+EMIT_KEEPALIVE_SEC = float(os.environ.get('EMIT_KEEPALIVE_SEC', '2.0'))
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', '5001'))
+RECORD_SESSION = os.environ.get('RECORD_SESSION', '0')
+PERF_PROFILES_PATH = os.environ.get('PERF_PROFILES_PATH', perf_profiles.DEFAULT_PROFILES_PATH)
+PERF_PROFILE = os.environ.get('PERF_PROFILE')
+CLIENT_QUEUE_SIZE = int(os.environ.get('CLIENT_QUEUE_SIZE', str(client_queues.DEFAULT_MAX_PENDING)))
+CASCADE_GATE = os.environ.get('CASCADE_GATE') # Cascade gate file in models/, see src/model/cascade.py
+INITIAL_FILL_SEC = 2.0
+# ---
+
+
+class LoopNotifyingQueue(queue.Queue):
+    """
+    queue.Queue for the prediction loop thread that also wakes an asyncio
+    consumer: every put sets an asyncio.Event on the consumer's loop.
+    """
+
+    def __init__(self, loop, maxsize=0):
+        super().__init__(maxsize)
+        self._loop = loop
+        self.ready = asyncio.Event()
+
+    def _put(self, item):
+        super()._put(item)
+        self._loop.call_soon_threadsafe(self.ready.set)
+
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+model_manager = model_manager_module.ModelManager(MODELS_DIR, MODEL_FILENAME)
+send_queues = client_queues.ClientSendQueues(
+    lambda sid, event, payload, callback: asyncio.ensure_future(sio.emit(event, payload, to=sid, callback=callback)),
+    max_pending=CLIENT_QUEUE_SIZE)
+stop_event = threading.Event()
+cascade_gate = None
+if CASCADE_GATE:
+    try:
+        cascade_gate = cascade.CascadeGate.load(os.path.join(MODELS_DIR, CASCADE_GATE))
+    except (OSError, KeyError, ValueError) as e:
+        log.error(f"Cascade gate disabled, could not load {CASCADE_GATE}: {e}")
+try:
+    profile_manager = perf_profiles.ProfileManager(PERF_PROFILES_PATH, model_manager)
+except (OSError, ValueError) as e:
+    log.warning(f"Performance profiles disabled: {e}")
+    profile_manager = None
+state = {'audio_source': None, 'prediction_queue': None, 'emitter': None, 'emits': 0, 'recorder': None}
+
+
+# --- Emitter (event loop) ---
+
+async def emit_prediction_updates(output_queue: LoopNotifyingQueue):
+    """Waits for predictions and emits the newest one per wake-up, like app.emit_prediction_updates."""
+    log.info("Async emitter task starting.")
+    last_sent_tab = None
+    last_emit_time = 0.0
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(output_queue.ready.wait(), timeout=client_queues.REDUCED_INTERVAL_SEC)
+        except asyncio.TimeoutError:
+            pass
+        output_queue.ready.clear()
+        item = None
+        while True:
+            try:
+                item = output_queue.get_nowait()
+            except queue.Empty:
+                break
+        send_queues.pump() # Clients in reduced mode, and unacknowledged updates that timed out
+        if not item or item.get('type') != 'prediction':
+            continue
+        tab_output = item.get('data')
+        now = time.monotonic()
+        changed = tab_output != last_sent_tab
+        if changed or not EMIT_CHANGES_ONLY or now - last_emit_time >= EMIT_KEEPALIVE_SEC:
+            try:
+                send_queues.publish(lambda fmt: prediction_codec.build_event(fmt, item))
+                if state['recorder'] is not None:
+                    state['recorder'].record_prediction(item)
+            except Exception as e:
+                log.error(f"Error in emitter task: {e}")
+            state['emits'] += 1
+            last_sent_tab = tab_output
+            last_emit_time = now
+    log.info("Async emitter task stopped.")
+
+
+# --- Startup / Shutdown ---
+
+def load_model():
+    """Runs in an executor thread; TensorFlow's pools are created there and inherit the inference cores."""
+    cpu_budget.apply_runtime()
+    return model_manager.load()
+
+
+async def start_background_tasks():
+    """Same pipeline as app.start_background_tasks, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    model_path = model_manager.model_path()
+    if not os.path.exists(model_path) or not await loop.run_in_executor(None, load_model):
+        log.error(f"Model not loaded ({model_path}), cannot start background processing.")
+        return
+
+    if CAPTURE_MODE == 'direct' or INPUT_CHANNELS > 1: # The deque path is mono only
+        audio_buffer.enable_direct_capture(channels=INPUT_CHANNELS)
+    if RECORD_SESSION != '0':
+        recorder = session_recorder.SessionRecorder(
+            session_recorder.create_session_dir() if RECORD_SESSION == '1' else RECORD_SESSION,
+            audio_buffer.SAMPLE_RATE, channels=INPUT_CHANNELS)
+        try:
+            recorder.start()
+            audio_stream.recorder = state['recorder'] = recorder
+        except OSError as e:
+            log.error(f"Session recording disabled: {e}")
+    try:
+        audio_source = audio_sources.create_audio_source(AUDIO_SOURCE, samplerate=audio_buffer.SAMPLE_RATE,
+                                                         speed=AUDIO_SOURCE_SPEED, channels=INPUT_CHANNELS,
+                                                         device_rate=DEVICE_SAMPLE_RATE)
+        audio_source.start()
+        state['audio_source'] = audio_source
+        log.info(f"Audio source '{AUDIO_SOURCE}' started.")
+    except Exception as e:
+        log.error(f"FATAL: Failed to start audio source: {e}", exc_info=True)
+        return
+    if audio_buffer.CAPTURE_MODE != 'direct':
+        audio_buffer.start_buffer_thread()
+
+    output_queue = LoopNotifyingQueue(loop, maxsize=5)
+    state['prediction_queue'] = output_queue
+    if profile_manager is not None and (PERF_PROFILE or profile_manager.default_profile):
+        profile_manager.prediction_queue = output_queue
+        try:
+            profile_manager.apply(PERF_PROFILE or profile_manager.default_profile)
+        except ValueError as e:
+            log.error(f"Could not apply startup profile: {e}")
+
+    await asyncio.sleep(INITIAL_FILL_SEC) # Initial buffer fill without blocking the loop
+    handler_func = (prediction_handler.get_hexaphonic_tab_output if INPUT_CHANNELS > 1
+                    else prediction_handler.get_tab_output)
+    threading.Thread(
+        target=audio_processor.run_prediction_loop,
+        args=(model_manager, handler_func, output_queue, stop_event, audio_buffer.SAMPLE_RATE),
+        kwargs={'feature': FEATURE_BACKEND, 'gate': cascade_gate},
+        name="PredictionLoopThread",
+        daemon=True,
+    ).start()
+    state['emitter'] = asyncio.create_task(emit_prediction_updates(output_queue))
+    model_manager.start_watching()
+    thread_budget.pin_current_thread('io') # Last: threads inherit the affinity of the thread that creates them
+    log.info("All background tasks initiated (asyncio server).")
+
+
+def shutdown():
+    log.info("Shutdown requested. Signaling background tasks...")
+    stop_event.set()
+    model_manager.stop_watching()
+    if hasattr(audio_buffer, 'stop_buffer_thread'):
+        audio_buffer.stop_buffer_thread()
+    if state['audio_source'] is not None:
+        state['audio_source'].stop()
+    if state['recorder'] is not None:
+        audio_stream.recorder = None
+        state['recorder'].stop()
+
+
+# --- Socket.IO Handlers ---
+
+@sio.event
+async def connect(sid, environ):
+    log.info(f"Client connected: {sid}")
+    send_queues.add(sid, 'json')
+    await sio.emit('prediction_update', prediction_codec.json_payload([0, 0, 0, 0, 0, 0]), to=sid)
+
+
+@sio.event
+async def disconnect(sid, *args):
+    log.info(f"Client disconnected: {sid}")
+    send_queues.remove(sid)
+
+
+@sio.event
+async def set_format(sid, data):
+    """Per-client payload negotiation, see app.handle_set_format."""
+    requested = (data or {}).get('format', 'json')
+    if requested not in ('json', 'binary'):
+        log.warning(f"Client {sid} requested unknown format '{requested}', keeping JSON.")
+        requested = 'json'
+    send_queues.set_format(sid, requested)
+    return {'format': requested, 'version': prediction_codec.FRAME_VERSION}
+
+
+# --- Plain HTTP routes (everything that isn't Socket.IO or the page) ---
+
+def get_status():
+    audio_source = state['audio_source']
+    prediction_queue = state['prediction_queue']
+    return {
+        'server': 'asgi',
+        'audio_source': audio_source.get_stats() if audio_source is not None else None,
+        'audio_queue_size': audio_stream.audio_queue.qsize(),
+        'capture': audio_buffer.get_capture_stats(),
+        'prediction_loop': audio_processor.loop_stats,
+        'prediction_queue_size': prediction_queue.qsize() if prediction_queue is not None else 0,
+        'emits': state['emits'],
+        'clients': {fmt: list(send_queues.formats().values()).count(fmt) for fmt in ('json', 'binary')},
+        'client_queues': send_queues.get_stats(),
+        'recorder': state['recorder'].get_stats() if state['recorder'] is not None else None,
+        'thread_budget': thread_budget.get_report(),
+        'perf_profile': profile_manager.active if profile_manager is not None else None,
+        'cascade_gate': cascade_gate.get_stats() if cascade_gate is not None else None,
+    }
+
+
+def is_admin_scope(scope, query):
+    """Same rule as app.is_admin_request: localhost, or ?token= / X-Admin-Token matching ADMIN_TOKEN."""
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if admin_token:
+        headers = dict(scope.get('headers') or [])
+        return query.get('token') == admin_token or headers.get(b'x-admin-token', b'').decode() == admin_token
+    return (scope.get('client') or ('',))[0] in ('127.0.0.1', '::1')
+
+
+async def profile_route(scope, query):
+    """GET /api/profile, same parameters as app.profile_api; the profile runs in an executor thread."""
+    if not is_admin_scope(scope, query):
+        return 403, {'error': 'forbidden'}
+    mode = query.get('mode', 'cpu')
+    if mode not in ('cpu', 'memory'):
+        return 400, {'error': f"unknown mode '{mode}'"}
+    try:
+        seconds = float(query.get('seconds', profiler.DEFAULT_DURATION_SEC))
+    except ValueError:
+        return 400, {'error': f"invalid seconds '{query['seconds']}'"}
+    if mode == 'memory':
+        kwargs = {'files': tuple(query['files'].split(','))} if query.get('files') else {}
+    else:
+        kwargs = {'thread_filter': query.get('thread')}
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(None, lambda: profiler.run_profile(mode, seconds, **kwargs))
+    except profiler.ProfilerBusy as e:
+        return 409, {'error': str(e)}
+    if mode == 'memory':
+        return 200, result
+    if query.get('format') == 'json':
+        return 200, {**result, 'stacks': [{'stack': stack, 'samples': count}
+                                          for stack, count in result['stacks'].most_common(50)]}
+    return 200, profiler.collapsed(result['stacks'])
+
+
+def profiles_route(scope, query, method, body):
+    """GET / POST /api/profiles, same behaviour as app.profiles_api."""
+    if profile_manager is None:
+        return 404, {'error': 'performance profiles are not configured'}
+    if method == 'POST':
+        if not is_admin_scope(scope, query):
+            return 403, {'error': 'forbidden'}
+        try:
+            request = json.loads(body or b'{}')
+            if request.get('reload'):
+                profile_manager.reload()
+            if request.get('name'):
+                profile_manager.apply(request['name'])
+        except (OSError, ValueError) as e:
+            return 400, {'error': str(e)}
+    return 200, profile_manager.get_status()
+
+
+def model_route(scope, query, method, body):
+    """GET / POST /api/model, same behaviour as app.model_api."""
+    if method == 'POST':
+        if not is_admin_scope(scope, query):
+            return 403, {'error': 'forbidden'}
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            request = {}
+        filename = os.path.basename((request if isinstance(request, dict) else {}).get('filename') or '')
+        if filename not in model_manager.available_models():
+            return 400, {'error': f"unknown model file '{filename}'", 'available': model_manager.available_models()}
+        model_manager.request_swap(filename)
+        return 202, {'status': 'loading', 'filename': filename}
+    return 200, {**model_manager.status, 'available': model_manager.available_models()}
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def http_app(scope, receive, send):
+    """Minimal ASGI app for lifespan events and the JSON routes."""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                asyncio.create_task(start_background_tasks())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    query = dict(urllib.parse.parse_qsl(scope.get('query_string', b'').decode()))
+    if scope['path'] == '/status':
+        status_code, body = 200, get_status()
+    elif scope['path'] == '/api/profile':
+        status_code, body = await profile_route(scope, query)
+    elif scope['path'] == '/api/profiles':
+        status_code, body = profiles_route(scope, query, scope['method'], await read_body(receive))
+    elif scope['path'] == '/api/model':
+        status_code, body = model_route(scope, query, scope['method'], await read_body(receive))
+    else:
+        status_code, body = 404, {'error': 'not found'}
+    if isinstance(body, str):
+        payload, content_type = body.encode(), b'text/plain; charset=utf-8'
+    else:
+        payload, content_type = json.dumps(body, default=float).encode(), b'application/json'
+    await send({'type': 'http.response.start', 'status': status_code,
+                'headers': [(b'content-type', content_type), (b'content-length', str(len(payload)).encode())]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+app = socketio.ASGIApp(
+    sio,
+    other_asgi_app=http_app,
+    static_files={'/': os.path.join(os.path.dirname(__file__), 'templates', 'index.html')},
+)
+
+
+if __name__ == '__main__':
+    print(f"Starting asyncio Socket.IO server on http://{HOST}:{PORT}")
+    uvicorn.run(app, host=HOST, port=PORT, log_level='info')
@@ -1,30 +1,101 @@
 from collections import deque
 import numpy as np
+from . import audio_stream
 from .audio_stream import audio_queue
+from .ring_buffer import SampleRingBuffer
+from . import thread_budget
 import queue
 import time
 from threading import Thread, Lock
 
 SAMPLE_RATE = 22050
 WINDOW_SIZE = 2 * SAMPLE_RATE # 2 seconds of recording
+CHANNELS = 1 # Input channels; multi-channel windows are (WINDOW_SIZE, CHANNELS) (direct capture only)
 
 # Shared buffer and a lock for thread-safe access
 buffer = deque(maxlen=WINDOW_SIZE)
 buffer_lock = Lock()
+last_write_time = 0.0 # Wall-clock time (time.time()) of the newest sample in the buffer
 _stop_filling = False # Flag to signal the filling thread to stop
 _filler_thread = None
 
+# --- Direct Capture Mode ---
+# 'queue': callback -> audio_queue -> filler thread -> deque of floats (default)
+# 'direct': callback -> int16 ring buffer, read directly by get_current_audio_window()
+CAPTURE_MODE = 'queue'
+RING_CAPACITY_WINDOWS = 2 # Ring holds this many windows so the reader rarely races the writer
+ring = None
+_ring_window = None # Preallocated int16 window the ring is copied into
+
+def _window_shape(window_size):
+    return (window_size, CHANNELS) if CHANNELS > 1 else (window_size,)
+
+def enable_direct_capture(channels=1):
+    """
+    Switches to direct capture: allocates the int16 ring buffer and installs it in
+    audio_stream so callbacks and audio sources write into it. No filler thread is needed.
+    Call before starting the audio source. Multi-channel input (channels > 1) is
+    stored interleaved and is only supported in this mode.
+    """
+    global CAPTURE_MODE, CHANNELS, ring, _ring_window
+    CHANNELS = channels
+    ring = SampleRingBuffer(RING_CAPACITY_WINDOWS * WINDOW_SIZE, dtype=np.int16, channels=channels)
+    _ring_window = np.empty(_window_shape(WINDOW_SIZE), dtype=np.int16)
+    audio_stream.capture_ring = ring
+    CAPTURE_MODE = 'direct'
+    print(f"Direct capture enabled: int16 ring of {ring.capacity} frames x {channels} channel(s) "
+          f"({ring.get_stats()['memory_bytes']} bytes).")
+
+def set_window_size(window_size):
+    """
+    Changes the analysis window at runtime (see server/perf_profiles.py). The newest
+    samples already buffered are kept, so a shorter window is available immediately.
+    In direct mode the window must fit the ring buffer allocated at startup.
+    """
+    global WINDOW_SIZE, buffer, _ring_window
+    if window_size == WINDOW_SIZE:
+        return
+    if CAPTURE_MODE == 'direct':
+        if window_size > ring.capacity:
+            raise ValueError(f"Window of {window_size} samples exceeds the capture ring ({ring.capacity} samples)")
+        _ring_window = np.empty(_window_shape(window_size), dtype=np.int16)
+        WINDOW_SIZE = window_size
+        return
+    with buffer_lock:
+        buffer = deque(buffer, maxlen=window_size)
+        WINDOW_SIZE = window_size
+
+def get_capture_time():
+    """Wall-clock time (time.time()) of the newest sample in the buffer."""
+    if CAPTURE_MODE == 'direct':
+        return ring.last_write_time
+    return last_write_time
+
+def get_capture_stats():
+    """Capture mode and, in direct mode, the ring buffer's overrun/underrun counters."""
+    stats = {'mode': CAPTURE_MODE}
+    if CAPTURE_MODE == 'direct':
+        stats.update(ring.get_stats())
+    return stats
+
+def write_chunk(chunk):
+    """Appends an audio chunk to the shared buffer (oldest samples fall off)."""
+    global last_write_time
+    with buffer_lock:
+        buffer.extend(chunk) # Add chunk to the deque
+        last_write_time = time.time()
+
 def _fill_buffer_continuously():
     """(Internal) Target function for the background thread."""
     global _stop_filling
     print("Audio buffer filling thread started.")
+    thread_budget.pin_current_thread('capture')
     while not _stop_filling:
         try:
             # Get audio chunk. block=True waits if queue is empty.
             # Add a timeout to prevent indefinite blocking if stream dies.
             chunk = audio_queue.get(block=True, timeout=1.0) # Wait max 1 sec
-            with buffer_lock:
-                buffer.extend(chunk) # Add chunk to the deque
+            write_chunk(chunk)
         except queue.Empty:
             # Timeout occurred, queue was empty. Continue loop or check stop flag.
             print("Audio queue empty, continuing...") # Optional log
@@ -39,9 +110,12 @@ def _fill_buffer_continuously():
 def start_buffer_thread():
     """Starts the background thread to fill the buffer."""
     global _filler_thread, _stop_filling
+    if CAPTURE_MODE == 'direct':
+        print("Direct capture mode: no buffer filling thread needed.")
+        return
     if _filler_thread is None or not _filler_thread.is_alive():
         _stop_filling = False
-        _filler_thread = Thread(target=_fill_buffer_continuously, daemon=True)
+        _filler_thread = Thread(target=_fill_buffer_continuously, name="AudioBufferThread", daemon=True)
         _filler_thread.start()
         print("Buffer filling thread initiated.")
     else:
@@ -61,7 +135,15 @@ def get_current_audio_window():
     """
     Gets a snapshot of the current audio buffer content.
     Returns None if buffer is not yet full.
+
+    In direct capture mode this returns the raw int16 window (float conversion is
+    left to the feature stage) in a reused array that is overwritten by the next
+    call, and None if no new samples arrived since the previous call. With
+    CHANNELS > 1 the window is (WINDOW_SIZE, CHANNELS).
     """
+    if CAPTURE_MODE == 'direct':
+        window = _ring_window # One read of the global, so a concurrent set_window_size() can't mix sizes
+        return ring.read_latest(len(window), out=window)
     with buffer_lock:
         # Only return if the buffer has reached the desired window size
         if len(buffer) == WINDOW_SIZE:
@@ -1,174 +1,275 @@
+# server/audio_main.py
+
+"""
+Headless live classification: capture -> features -> inference -> JSON lines.
+
+Runs the same pipeline as the web server (audio source, buffer filler,
+audio_processor.run_prediction_loop, optional cascade gate) without importing
+Flask, Socket.IO or eventlet. By default the model runs on the NumPy backend
+(src/model/numpy_model.py), so TensorFlow isn't loaded either; `--backend keras`
+uses Keras. One JSON object is written per line:
+    {"type": "ready", "startup_sec": ..., "rss_mb": ..., ...}     once, when the first window was classified
+    {"type": "tab", "seq": 12, "ts": 1712345678.123, "tab": [0, 0, 1, 0, 0, 0],
+     "string": "G3", "confidence": 0.93}                         per prediction (only changes by default)
+    {"type": "stats", ...}                                        on exit
+Events go to stdout or to every client connected to a Unix socket
+(`--output unix:/tmp/tabs.sock`, e.g. `socat - UNIX-CONNECT:/tmp/tabs.sock`).
+Library messages that print to stdout are redirected to stderr, so stdout
+carries only the event stream.
+
+Usage (from the project root):
+    python -m server.audio_main                                  # microphone, models/updated_model.h5
+    python -m server.audio_main --source synthetic --all
+    python -m server.audio_main --output unix:/tmp/tabs.sock --gate cascade_gate.npz
+    python -m server.audio_main --channels 6 --source synthetic   # hexaphonic input, one string per channel
+"""
+
+import sys
 import time
-import multiprocessing as mp
-from server import audio_stream
-from server import audio_buffer
-from server import audio_prep
-from keras import models
+
+_START_TIME = time.perf_counter()
+_event_stream = sys.stdout
+sys.stdout = sys.stderr # Keep stdout clean for the JSON lines
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+
+from server import thread_budget
+cpu_budget = thread_budget.configure_from_env() # Before NumPy / TensorFlow are imported
+
 import numpy as np
-from src.model.prediction_handler import get_tab_output
-from src.visualization import ROOT_DIR
 
-MODEL_NAME = "updated_model.h5"
-MODEL_PATH = ROOT_DIR + "/models/" + MODEL_NAME
-# --- Main Execution Guard ---
-if __name__ == '__main__':
-    print("Starting application...")
-    print("Loading prediction model...")
-    prediction_model = models.load_model(MODEL_PATH)
-    # --- Set Multiprocessing Start Method ---
-    # 'spawn' is generally safer and more consistent across platforms than 'fork'
-    try:
-        mp.set_start_method('spawn', force=True)
-        print("Multiprocessing start method set to 'spawn'.")
-    except RuntimeError as e:
-        print(f"Warning: Could not set start method 'spawn' (possibly already set or unavailable): {e}")
+from server import audio_buffer
+from server import audio_processor
+from server import audio_sources
+from src.model import prediction_handler
 
+log = logging.getLogger(__name__)
 
-    # --- Create Multiprocessing Queues ---
-    # These queues handle communication between main process and worker process
-    # Limit size to prevent unbounded memory usage if processing falls behind
-    MAX_QUEUE_SIZE = 10
-    process_input_queue = mp.Queue(maxsize=MAX_QUEUE_SIZE)
-    process_output_queue = mp.Queue(maxsize=MAX_QUEUE_SIZE)
+# --- Configuration ---
+MODELS_DIR = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'models')
+DEFAULT_MODEL = "updated_model.h5"
+INITIAL_FILL_SEC = 2.0
+KEEPALIVE_SEC = 2.0             # Without --all, repeat the current tab at least this often
+SOCKET_SEND_TIMEOUT_SEC = 0.1   # Unix socket clients slower than this are disconnected
+# ---
 
 
-    # --- Start Audio Input Stream (using threading as before) ---
+def resident_memory_mb():
+    """Current and peak resident set size of this process in MB (Linux /proc, else peak only)."""
+    current = None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    current = int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
     try:
-        audio_stream.start_stream()
-        print("Audio stream started.")
-    except Exception as e:
-        print(f"FATAL: Failed to start audio stream: {e}")
-        exit(1)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 # KB on Linux
+    except ImportError:
+        peak = None
+    return current, peak
 
-    # --- Allow Buffers to Fill Slightly ---
-    print("Allowing initial buffer fill...")
-    time.sleep(3)  # Adjust as needed
 
-    # --- Start Buffer Filling Thread (using threading as before) ---
-    try:
-        audio_buffer.start_buffer_thread()
-        print("Audio buffer filling thread started.")
-    except Exception as e:
-        print(f"FATAL: Failed to start buffer thread: {e}")
-        # Optionally stop audio stream here
-        exit(1)
+class StreamSink:
+    """JSON lines on a text stream (stdout)."""
 
+    def __init__(self, stream):
+        self.stream = stream
 
-    # --- Start Preprocessing Worker Process ---
-    worker_process = None
-    try:
-        worker_process = mp.Process(
-            target=audio_prep.preprocessing_worker_process, # Target the function
-            args=(process_input_queue, process_output_queue), # Pass the mp.Queues
-            name="PreprocessingWorkerProcess",
-            daemon=True # Exits automatically if main process exits
-        )
-        worker_process.start()
-        print(f"Preprocessing worker process [{worker_process.pid}] started.")
-    except Exception as e:
-         print(f"FATAL: Failed to start preprocessing worker process: {e}")
-         # Optionally stop other components here
-         exit(1)
+    def write(self, event):
+        self.stream.write(json.dumps(event) + "\n")
+        self.stream.flush()
 
+    def close(self):
+        self.stream.flush()
 
 
+class UnixSocketSink:
+    """
+    JSON lines to every client of a listening Unix socket. Clients can connect
+    and disconnect at any time; a client that doesn't take a line within
+    SOCKET_SEND_TIMEOUT_SEC is dropped so it can't stall the pipeline.
+    """
 
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        self._clients = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._accept, name="SocketAcceptThread", daemon=True)
+        self._thread.start()
 
-    # --- Main Processing Loop ---
-    print("Starting main processing loop...")
-    try:
+    def _accept(self):
         while True:
-            # 1. Get the latest audio window from the buffer filler thread
-            current_window = audio_buffer.get_current_audio_window()
-
-            # 2. If a full window is available, submit it to the worker process
-            if current_window is not None:
-                try:
-                    # Put the window onto the input queue for the worker process
-                    # Use put_nowait to avoid blocking the main loop if queue is full
-                    process_input_queue.put_nowait(current_window)
-                    print("MainLoop: Submitted window for preprocessing.")
-                except mp.queues.Full: # Requires importing queue package as mp.queues
-                    print("MainLoop: Warning - Preprocessing input queue full. Skipping window.")
-                    # Maybe sleep a bit longer if queue is consistently full
-                    time.sleep(0.1)
-            # else:
-                # Optional: Log if buffer isn't full yet
-                # print("MainLoop: Buffer not full. Waiting...")
-
-            # 3. Check for results from the worker process (non-blocking)
             try:
-                processed_result = process_output_queue.get_nowait()
-                print(f"MainLoop: Received processed result (shape {processed_result.shape}).")
-                processed_result = np.expand_dims(processed_result, axis=2)
-                processed_result = np.expand_dims(processed_result, axis=0)
-                prediction = prediction_model.predict(processed_result)
-                prediction = get_tab_output(prediction)
+                client, _ = self._server.accept()
+            except OSError:
+                return # Closed
+            client.settimeout(SOCKET_SEND_TIMEOUT_SEC)
+            with self._lock:
+                self._clients.append(client)
 
-                print(f"Prediction: {prediction}")
+    def write(self, event):
+        line = (json.dumps(event) + "\n").encode()
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.sendall(line)
+            except OSError:
+                client.close()
+                with self._lock:
+                    self._clients.remove(client)
 
-            except mp.queues.Empty: # Requires importing queue package as mp.queues
-                # No result ready from the worker yet, continue loop
-                pass
+    def close(self):
+        self._server.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
 
-            # 4. Control loop speed
-            # Adjust sleep time based on how quickly you need results vs CPU usage
-            time.sleep(0.02) # Example: Check ~20 times per second
 
+def create_sink(spec):
+    if spec in (None, '-', 'stdout'):
+        return StreamSink(_event_stream)
+    if spec.startswith('unix:'):
+        return UnixSocketSink(spec[len('unix:'):])
+    raise ValueError(f"Unknown output '{spec}', expected '-' (stdout) or 'unix:<path>'")
+
+
+def tab_event(item):
+    tab = item['data']
+    confidences = np.asarray(item['confidences'])
+    index = tab.index(1) if 1 in tab else None
+    event = {
+        'type': 'tab',
+        'seq': item['seq'],
+        'ts': round(item['capture_ts'], 4),
+        'tab': tab,
+        'string': prediction_handler.OUTPUT_TAB_ORDER[index] if index is not None else None,
+        'confidence': round(float(confidences.max()), 4) if confidences.size else None,
+    }
+    if tab.count(1) > 1: # Hexaphonic input can sound several strings at once
+        event['strings'] = [name for name, active in zip(prediction_handler.OUTPUT_TAB_ORDER, tab) if active]
+    return event
+
+
+def load_model(model_path, backend='numpy'):
+    """
+    'numpy' runs the model without TensorFlow (src/model/numpy_model.py) and falls
+    back to Keras for architectures it doesn't support; 'keras' always uses Keras.
+    """
+    if backend == 'numpy':
+        from src.model.numpy_model import NumpyModel
+        try:
+            return NumpyModel.from_h5(model_path)
+        except (ValueError, KeyError) as e:
+            log.warning(f"NumPy backend can't run {model_path} ({e}), loading it with Keras.")
+    from src.model.model_loader import load_trained_model
+    cpu_budget.apply_runtime()
+    with thread_budget.pinned('inference'): # TensorFlow's pools inherit the inference cores
+        return load_trained_model(model_path)
+
+
+def run(args):
+    sink = create_sink(args.output)
+    model = load_model(os.path.join(MODELS_DIR, args.model), args.backend)
+    gate = None
+    if args.gate:
+        from src.model.cascade import CascadeGate
+        gate = CascadeGate.load(os.path.join(MODELS_DIR, args.gate))
+
+    if args.channels > 1: # Multi-channel windows need the interleaved ring buffer
+        audio_buffer.enable_direct_capture(channels=args.channels)
+    source = audio_sources.create_audio_source(args.source, samplerate=audio_buffer.SAMPLE_RATE, speed=args.speed,
+                                               channels=args.channels, device_rate=args.device_rate)
+    source.start()
+    audio_buffer.start_buffer_thread()
+    time.sleep(INITIAL_FILL_SEC)
+
+    stop_event = threading.Event()
+    output_queue = queue.Queue(maxsize=5)
+    handler_func = (prediction_handler.get_hexaphonic_tab_output if args.channels > 1
+                    else prediction_handler.get_tab_output)
+    threading.Thread(
+        target=audio_processor.run_prediction_loop,
+        args=(model, handler_func, output_queue, stop_event, audio_buffer.SAMPLE_RATE),
+        kwargs={'process_interval_sec': args.interval, 'feature': args.feature, 'gate': gate},
+        name="PredictionLoopThread",
+        daemon=True,
+    ).start()
+    thread_budget.pin_current_thread('io') # Last: threads inherit the affinity of the thread that creates them
+
+    events = 0
+    last_tab = None
+    last_sent = 0.0
+    ready = False
+    deadline = time.monotonic() + args.duration if args.duration else None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                item = output_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if not ready:
+                current, peak = resident_memory_mb()
+                sink.write({'type': 'ready', 'startup_sec': round(time.perf_counter() - _START_TIME, 3),
+                            'rss_mb': current, 'peak_rss_mb': peak, 'model': args.model, 'source': args.source,
+                            'gate': args.gate, 'backend': type(model).__name__, 'channels': args.channels})
+                ready = True
+            now = time.monotonic()
+            if args.all or item['data'] != last_tab or now - last_sent >= KEEPALIVE_SEC:
+                sink.write(tab_event(item))
+                events += 1
+                last_tab, last_sent = item['data'], now
     except KeyboardInterrupt:
-        print("\nCtrl+C detected. Shutting down...")
-    except Exception as e:
-         print(f"\nUNEXPECTED ERROR in main loop: {e}")
+        pass
     finally:
-        # --- Graceful Shutdown ---
-        print("Initiating shutdown sequence...")
-
-        # 1. Signal worker process to stop by sending None
-        if worker_process and worker_process.is_alive():
-             print("Signaling preprocessing worker to stop...")
-             try:
-                  process_input_queue.put(None, timeout=1.0) # Send sentinel
-             except mp.queues.Full:
-                  print("Warning: Could not put stop signal on input queue (full).")
-             except Exception as e:
-                  print(f"Error sending stop signal: {e}")
-
-        # 2. Stop the buffer filling thread
-        print("Stopping audio buffer thread...")
-        audio_buffer.stop_buffer_thread() # Ensure this function exists and works
-
-        # 3. Stop the audio stream (important!)
-        print("Stopping audio stream...")
-        try:
-            # Assuming sounddevice is used, find the stream object or use sd.stop()
-            # This might require modification to audio_stream.py to allow stopping
-            # For now, we'll assume sd.stop() might work if stream wasn't stored
-             import sounddevice as sd
-             sd.stop() # Attempt to stop the default stream
-             print("Audio stream stopped.")
-        except Exception as e:
-            print(f"Warning: Could not explicitly stop audio stream: {e}")
-
-
-        # 4. Wait briefly for worker process to exit (optional, esp. if daemon=True)
-        # if worker_process and worker_process.is_alive():
-        #     print("Waiting for worker process to exit...")
-        #     worker_process.join(timeout=3.0) # Wait max 3 seconds
-        #     if worker_process.is_alive():
-        #         print("Warning: Worker process did not exit gracefully. Terminating.")
-        #         worker_process.terminate() # Force kill
-
-        # 5. Close multiprocessing queues (releases resources)
-        print("Closing queues...")
-        try:
-            process_input_queue.close()
-            process_output_queue.close()
-            # Use join_thread ONLY if you are sure all items have been processed
-            # or queues are empty. Otherwise, it can hang.
-            # process_input_queue.join_thread()
-            # process_output_queue.join_thread()
-        except Exception as e:
-            print(f"Error closing queues: {e}")
+        stop_event.set()
+        source.stop()
+        audio_buffer.stop_buffer_thread()
+        current, peak = resident_memory_mb()
+        sink.write({'type': 'stats', 'events': events, 'prediction_loop': audio_processor.loop_stats,
+                    'rss_mb': current, 'peak_rss_mb': peak,
+                    'cascade_gate': gate.get_stats() if gate is not None else None})
+        sink.close()
 
 
-        print("Shutdown complete.")
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless live tab classification, JSON lines output.")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model file in models/ (default: %(default)s).")
+    parser.add_argument("--source", default=audio_sources.DEFAULT_SOURCE,
+                        help="'mic', 'file:<path.wav>' or 'synthetic[:<seed>]' (default: %(default)s).")
+    parser.add_argument("--device_rate", type=int, default=None,
+                        help="Microphone rate, resampled to 22050 Hz (default: 22050 if supported, else native).")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed for file/synthetic sources.")
+    parser.add_argument("--backend", choices=("numpy", "keras"), default="numpy",
+                        help="Inference without TensorFlow (default) or with Keras.")
+    parser.add_argument("--channels", type=int, default=1,
+                        help="Input channels; up to 6 for a hexaphonic pickup (channel order E4 B3 G3 D3 A2 E2).")
+    parser.add_argument("--feature", choices=("cqt", "mel"), default="cqt", help="Feature backend of the model.")
+    parser.add_argument("--interval", type=float, default=0.05, help="Prediction tick in seconds.")
+    parser.add_argument("--gate", default=None, help="Cascade gate file in models/ (see src/model/cascade.py).")
+    parser.add_argument("--output", default="-", help="'-' for stdout or 'unix:<socket path>'.")
+    parser.add_argument("--all", action="store_true", help="Write every prediction, not only changes.")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds.")
+    parser.add_argument("--log_level", default="WARNING", help="Logging level on stderr (default: %(default)s).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - [%(threadName)s] - %(message)s')
+    run(args)
@@ -17,6 +17,17 @@ except ImportError:
     SAMPLE_RATE = 22050
     print("Warning: Using default SAMPLE_RATE in audio_prep.py")
 
+from src.data_utils.preprocessing import (audio_to_mel, stft_window, mel_filterbank,
+                                          MEL_N_FFT, MEL_HOP_LENGTH, MEL_N_MELS)
+
+# --- Feature Backend ---
+# 'cqt' (HPSS + CQT, what the current model was trained on) or 'mel' (log-mel, much cheaper per window).
+# The model must have been trained on the same feature (see src/data_utils/data_loader.py).
+FEATURES = ('cqt', 'mel')
+DEFAULT_FEATURE = 'cqt'
+INT16_SCALE = 1.0 / 32768.0 # int16 samples (direct capture ring) -> float range -1.0 to 1.0
+# ---
+
 
 # --- Existing Preprocessing Functions ---
 
@@ -39,6 +50,16 @@ def audio_to_cqt(audio, sr):
         traceback.print_exc()
         return None
 
+def audio_to_mel_db(audio, sr):
+    try:
+        if not np.issubdtype(audio.dtype, np.floating):
+             audio = audio.astype(np.float32)
+        return audio_to_mel(audio, sr)
+    except Exception as e:
+        print(f"Preprocessing: ERROR inside audio_to_mel_db: {e}")
+        traceback.print_exc()
+        return None
+
 def normalize_cqt(cqt):
     # ... (Your implementation from before with std dev check) ...
     try:
@@ -54,9 +75,10 @@ def normalize_cqt(cqt):
         traceback.print_exc()
         return None
 
-def preprocess_buffer(audio_buffer: np.ndarray, sample_rate: int):
+def preprocess_buffer(audio_buffer: np.ndarray, sample_rate: int, feature: str = DEFAULT_FEATURE):
     """
     (Existing function) Preprocesses an in-memory audio buffer.
+    `feature` selects the backend: 'cqt' (default) or 'mel'.
     """
     # ... (Your existing validation and logic calling audio_to_cqt, normalize_cqt) ...
     if not isinstance(audio_buffer, np.ndarray) or audio_buffer.ndim != 1:
@@ -68,12 +90,17 @@ def preprocess_buffer(audio_buffer: np.ndarray, sample_rate: int):
 
     try:
          audio_buffer_float = audio_buffer.astype(np.float32)
+         if audio_buffer.dtype == np.int16: # Raw samples from the direct capture ring
+             audio_buffer_float *= INT16_SCALE
     except Exception as e:
          print(f"Audio Prep: ERROR during float conversion: {e}")
          return None
 
     try:
-        cqt = audio_to_cqt(audio_buffer_float, sr=sample_rate)
+        if feature == 'mel':
+            cqt = audio_to_mel_db(audio_buffer_float, sr=sample_rate)
+        else:
+            cqt = audio_to_cqt(audio_buffer_float, sr=sample_rate)
         if cqt is None: return None # Propagate failure
 
         cqt_normalized = normalize_cqt(cqt)
@@ -87,6 +114,170 @@ def preprocess_buffer(audio_buffer: np.ndarray, sample_rate: int):
         return None
 
 
+# --- Preallocated Preprocessing Engine ---
+
+DB_AMIN = 1e-5 # librosa.amplitude_to_db default
+MEL_AMIN = 1e-10 # librosa.power_to_db default
+TOP_DB = 80.0
+
+class PreprocessingEngine:
+    """
+    Hot-loop version of preprocess_buffer() that owns preallocated float32 work
+    buffers sized for the configured window. Dtype conversion, dB scaling and
+    normalization run in place, and process() returns a view of the engine's
+    feature buffer, so steady-state ticks create no new large arrays.
+
+    With the 'mel' feature the whole path (framing, windowing, FFT, filterbank
+    matmul) writes into owned buffers. With 'cqt', librosa's HPSS and CQT still
+    allocate their own outputs; everything after them is in place.
+
+    The returned array is overwritten by the next call, so consume it (e.g. run
+    the model) before processing the next window. Not thread-safe: use one
+    engine per processing thread.
+
+    Setting `hpss = False` skips the harmonic/percussive separation before the
+    CQT (the most expensive step) at some cost in accuracy, since the model was
+    trained on the harmonic component.
+
+    Multi-channel windows (e.g. a hexaphonic pickup) are (window_size, channels)
+    interleaved arrays; all channels go through one batched call per stage
+    (librosa's HPSS/CQT and the mel matmul accept a leading channel axis) and the
+    result is (channels, bins, frames), with dB scaling and normalization per channel.
+    HPSS is the one stage that doesn't amortize (its median filters scale with the
+    channel count), so by default (`shared_hpss_mask = True`) the harmonic mask is
+    computed once from the channels' summed magnitude spectrogram and applied to
+    every channel's STFT. Set it to False for exact per-channel HPSS.
+    """
+
+    def __init__(self, window_size: int, sample_rate: int = SAMPLE_RATE, feature: str = DEFAULT_FEATURE):
+        if feature not in FEATURES:
+            raise ValueError(f"Unknown feature '{feature}', expected one of {FEATURES}")
+        self.sample_rate = sample_rate
+        self.feature = feature
+        self.hpss = True
+        self.shared_hpss_mask = True
+        self._features = None
+        self._allocate(window_size)
+
+    def _allocate(self, window_size, channels=1):
+        self.window_size = window_size
+        self.channels = channels
+        lead = (channels,) if channels > 1 else () # Leading channel axis of every work buffer
+        self._audio = np.empty(lead + (window_size,), dtype=np.float32)
+        if self.feature == 'mel':
+            num_frames = 1 + window_size // MEL_HOP_LENGTH
+            # Zero-padded signal for centered frames; only the middle is rewritten each tick
+            self._padded = np.zeros(lead + (window_size + 2 * (MEL_N_FFT // 2),), dtype=np.float32)
+            self._frames = np.lib.stride_tricks.sliding_window_view(
+                self._padded, MEL_N_FFT, axis=-1)[..., ::MEL_HOP_LENGTH, :]
+            # numpy's FFT upcasts float32 input through a hidden temporary, so the FFT stage runs in float64
+            self._windowed = np.empty(lead + (num_frames, MEL_N_FFT), dtype=np.float64)
+            self._spectrum = np.empty(lead + (num_frames, MEL_N_FFT // 2 + 1), dtype=np.complex128)
+            self._power = np.empty(lead + (num_frames, MEL_N_FFT // 2 + 1), dtype=np.float32)
+            self._window = stft_window(MEL_N_FFT)
+            self._mel_basis = mel_filterbank(self.sample_rate, MEL_N_FFT, MEL_N_MELS)
+            self._features = np.empty(lead + (MEL_N_MELS, num_frames), dtype=np.float32)
+        else:
+            self._features = None # Allocated on first use, from the CQT output shape
+        print(f"PreprocessingEngine: allocated '{self.feature}' work buffers for window of {window_size} samples"
+              f"{f' x {channels} channels' if channels > 1 else ''}.")
+
+    def _load_audio(self, audio_buffer):
+        """Copies/converts the input window into the owned float32 buffer (channels first)."""
+        np.copyto(self._audio, audio_buffer.T, casting='unsafe')
+        if audio_buffer.dtype == np.int16:
+            self._audio *= INT16_SCALE
+
+    def _compute_mel_db(self):
+        half = MEL_N_FFT // 2
+        self._padded[..., half:half + self.window_size] = self._audio
+        np.multiply(self._frames, self._window, out=self._windowed)
+        np.fft.rfft(self._windowed, axis=-1, out=self._spectrum)
+        np.abs(self._spectrum, out=self._power)
+        np.square(self._power, out=self._power)
+        features = self._features
+        np.matmul(self._mel_basis, np.swapaxes(self._power, -1, -2), out=features)
+        # In-place power_to_db(ref=np.max, top_db=TOP_DB), ref per channel
+        np.maximum(features, MEL_AMIN, out=features)
+        np.log10(features, out=features)
+        features *= 10.0
+        features -= features.max(axis=(-2, -1), keepdims=True)
+        np.maximum(features, -TOP_DB, out=features)
+        return features
+
+    def _shared_mask_harmonic(self):
+        """Harmonic component of every channel from one HPSS soft mask of the summed magnitudes."""
+        stft = librosa.stft(self._audio) # (channels, bins, frames), same parameters as librosa.effects.hpss
+        harmonic_mask = librosa.decompose.hpss(np.abs(stft).sum(axis=0), mask=True)[0]
+        stft *= harmonic_mask
+        return librosa.istft(stft, dtype=np.float32, length=self.window_size)
+
+    def _compute_cqt_db(self):
+        if not self.hpss:
+            harmonic = self._audio
+        elif self.channels > 1 and self.shared_hpss_mask:
+            harmonic = self._shared_mask_harmonic()
+        else:
+            harmonic = librosa.effects.hpss(self._audio)[0]
+        cqt = librosa.cqt(harmonic, sr=self.sample_rate)
+        if self._features is None or self._features.shape != cqt.shape:
+            self._features = np.empty(cqt.shape, dtype=np.float32)
+        features = self._features
+        # In-place amplitude_to_db(ref=np.max, top_db=TOP_DB), ref per channel
+        np.abs(cqt, out=features)
+        np.maximum(features, DB_AMIN, out=features)
+        np.log10(features, out=features)
+        features *= 20.0
+        features -= features.max(axis=(-2, -1), keepdims=True)
+        np.maximum(features, -TOP_DB, out=features)
+        return features
+
+    @classmethod
+    def _normalize_in_place(cls, features):
+        """Standardizes features (each channel separately) in place without the temporaries np.std() creates."""
+        if features.ndim == 3:
+            for channel_features in features:
+                cls._normalize_in_place(channel_features)
+            return features
+        flat = features.reshape(-1)
+        features -= flat.sum() / flat.size
+        std = np.sqrt(np.dot(flat, flat) / flat.size)
+        if std < 1e-8:
+            print("Preprocessing: Warning - CQT std dev near zero. Returning zeros.")
+            features.fill(0.0)
+        else:
+            features /= std
+        return features
+
+    def process(self, audio_buffer: np.ndarray):
+        """
+        Preprocesses one audio window, (window_size,) or (window_size, channels).
+        Returns a view of the engine's feature buffer (valid until the next call),
+        (bins, frames) or (channels, bins, frames), or None on invalid input or failure.
+        """
+        if not isinstance(audio_buffer, np.ndarray) or audio_buffer.ndim not in (1, 2):
+            print(f"Error: Invalid buffer for PreprocessingEngine. Expected a 1-D or 2-D (samples, channels) "
+                  f"numpy array.")
+            return None
+        if audio_buffer.size == 0:
+            print("Error: Empty audio buffer.")
+            return None
+        channels = audio_buffer.shape[1] if audio_buffer.ndim == 2 else 1
+        if audio_buffer.ndim == 2 and channels == 1:
+            audio_buffer = audio_buffer[:, 0]
+        if len(audio_buffer) != self.window_size or channels != self.channels:
+            self._allocate(len(audio_buffer), channels)
+
+        try:
+            self._load_audio(audio_buffer)
+            features = self._compute_mel_db() if self.feature == 'mel' else self._compute_cqt_db()
+            return self._normalize_in_place(features)
+        except Exception as e:
+            print(f"Audio Prep: UNCAUGHT EXCEPTION in PreprocessingEngine: {e}")
+            traceback.print_exc()
+            return None
+
+
 # --- New Worker Function for Multiprocessing ---
 
 def preprocessing_worker_process(input_queue: mp.Queue, output_queue: mp.Queue):
@@ -9,47 +9,88 @@ import logging
 try:
     from server import audio_buffer
     from server import audio_prep
+    from server import thread_budget
 except ImportError:
     # Allow importing if run directly for testing, assuming siblings
     import audio_buffer
     import audio_prep
+    import thread_budget
 
 # Configure logging for this module
 log = logging.getLogger(__name__)
 
+# Throughput counters for the prediction loop (exposed via app.py's /status route)
+loop_stats = {
+    'ticks': 0,               # Loop iterations
+    'windows_processed': 0,   # Ticks where a full window was available
+    'predictions': 0,         # Tab outputs put onto the output queue
+    'late_ticks': 0,          # Ticks whose processing exceeded process_interval_sec
+    'model_runs': 0,          # Windows that went through the CNN (cascade stage two)
+    'gate_negative': 0,       # Windows the cascade gate answered as negative without the CNN
+    'gate_unchanged': 0,      # Windows the cascade gate answered with the previous CNN output
+    'total_processing_sec': 0.0,
+    'max_processing_sec': 0.0,
+}
+
+# Runtime overrides of the loop parameters, re-read every tick (set by server/perf_profiles.py):
+# 'process_interval_sec', 'hpss' (HPSS before the CQT on/off) and 'shared_hpss_mask' (multi-channel HPSS)
+loop_settings = {}
+
 def run_prediction_loop(model,
                         prediction_handler_func,
                         output_queue: queue.Queue,
                         stop_event,
                         sample_rate: int,
-                        process_interval_sec: float = 0.05):
+                        process_interval_sec: float = 0.05,
+                        feature: str = audio_prep.DEFAULT_FEATURE,
+                        gate=None):
     """
     Continuously gets audio windows, preprocesses, predicts, handles prediction,
     and puts the result onto the output queue. Runs until stop_event is set.
 
     Args:
-        model: The loaded Keras/TF model object.
+        model: The loaded Keras/TF model object, or a ModelManager (server/model_manager.py),
+               in which case the active model is fetched every tick so hot swaps apply immediately.
         prediction_handler_func: The function to call to convert softmax to tab output
                                  (e.g., prediction_handler.get_tab_output).
         output_queue (queue.Queue): Thread-safe queue to put the resulting tab_output list into.
         stop_event (threading.Event): Event to signal when the loop should stop.
         sample_rate (int): The sample rate required for preprocessing.
         process_interval_sec (float): How often to fetch/process audio (controls loop speed).
+        feature (str): Feature backend for preprocessing, 'cqt' or 'mel' (must match the model).
+        gate: Optional cascade gate (src/model/cascade.py CascadeGate) deciding per window whether
+              the model has to run at all. Only applied to mono windows.
+
+    Multi-channel windows (audio_buffer.CHANNELS > 1) run the model once per tick on a
+    batch of one feature map per channel, and prediction_handler_func gets the
+    (channels, classes) softmax batch (e.g. prediction_handler.get_hexaphonic_tab_output).
     """
     log.info("Audio processing loop starting.")
+    thread_budget.pin_current_thread('preprocess')
     last_prediction = None # Keep track to potentially only send changes
+    seq = 0 # Sequence number of the predictions put onto the output queue
+    last_model = None # Model and output of the last CNN run, reused for windows the gate finds unchanged
+    last_model_output = None
+    # Owns preallocated work buffers, so steady-state ticks don't allocate new feature arrays
+    engine = audio_prep.PreprocessingEngine(audio_buffer.WINDOW_SIZE, sample_rate, feature)
 
     while not stop_event.is_set():
         start_time = time.monotonic()
+        interval_sec = loop_settings.get('process_interval_sec', process_interval_sec)
+        engine.hpss = loop_settings.get('hpss', True)
+        engine.shared_hpss_mask = loop_settings.get('shared_hpss_mask', True)
 
         # 1. Get Audio Window
         current_window = audio_buffer.get_current_audio_window()
+        capture_ts = audio_buffer.get_capture_time() # Capture time of the window's newest sample
 
         tab_output = None # Default to no output for this cycle
+        softmax_output = None
 
         if current_window is not None:
-            # 2. Preprocess Audio (Directly in this thread)
-            processed_data = audio_prep.preprocess_buffer(current_window, sample_rate)
+            loop_stats['windows_processed'] += 1
+            # 2. Preprocess Audio (Directly in this thread; result is a view into the engine's buffer)
+            processed_data = engine.process(current_window)
 
             if processed_data is not None:
                 try:
@@ -59,13 +100,31 @@ def run_prediction_loop(model,
                     if processed_data.ndim == 2: # Add batch and channel dims
                         processed_reshaped = np.expand_dims(processed_data, axis=0) # Add batch dim -> (1, H, W)
                         processed_reshaped = np.expand_dims(processed_reshaped, axis=-1) # Add channel dim -> (1, H, W, 1)
+                    elif processed_data.ndim == 3: # Multi-channel input: one batch entry per input channel
+                        processed_reshaped = np.expand_dims(processed_data, axis=-1) # -> (C, H, W, 1)
                     else:
                         log.warning(f"Unexpected preprocessed data shape: {processed_data.shape}")
                         processed_reshaped = None
 
                     if processed_reshaped is not None:
-                        # 4. Predict
-                        softmax_output = model.predict(processed_reshaped)
+                        # 4. Predict (fetch the active model once per tick, see ModelManager)
+                        active_model = model.get_model() if hasattr(model, 'get_model') else model
+                        decision = 'full'
+                        if gate is not None and processed_data.ndim == 2: # The gate is trained on mono windows
+                            if active_model is not last_model: # Swapped: don't reuse the old model's output
+                                gate.reset()
+                            decision = gate.decide(processed_data)
+                        if decision == 'negative':
+                            softmax_output = gate.negative_output()
+                            loop_stats['gate_negative'] += 1
+                        elif decision == 'unchanged':
+                            softmax_output = last_model_output
+                            loop_stats['gate_unchanged'] += 1
+                        else:
+                            last_model = None # Reset first, so a failed run isn't reused
+                            softmax_output = active_model.predict(processed_reshaped, verbose=0)
+                            last_model, last_model_output = active_model, softmax_output
+                            loop_stats['model_runs'] += 1
 
                         # 5. Handle Prediction (Convert to tab format)
                         tab_output = prediction_handler_func(softmax_output)
@@ -85,7 +144,11 @@ def run_prediction_loop(model,
                         log.warning("Output queue was full, discarded oldest prediction.")
                     except queue.Empty:
                         break # Should not happen if .full() was true, but safety first
-                output_queue.put_nowait({'type': 'prediction', 'data': tab_output})
+                seq += 1
+                output_queue.put_nowait({'type': 'prediction', 'data': tab_output,
+                                         'confidences': np.asarray(softmax_output).ravel(),
+                                         'seq': seq, 'capture_ts': capture_ts})
+                loop_stats['predictions'] += 1
                 last_prediction = tab_output # Update last sent prediction
             except queue.Full:
                 # This case should be rare now, but log if it happens
@@ -95,7 +158,12 @@ def run_prediction_loop(model,
 
         # 7. Control Loop Speed
         processing_time = time.monotonic() - start_time
-        sleep_time = max(0, process_interval_sec - processing_time)
+        loop_stats['ticks'] += 1
+        loop_stats['total_processing_sec'] += processing_time
+        loop_stats['max_processing_sec'] = max(loop_stats['max_processing_sec'], processing_time)
+        if processing_time > interval_sec:
+            loop_stats['late_ticks'] += 1
+        sleep_time = max(0, interval_sec - processing_time)
         # Use event.wait for sleeping - allows faster exit if stop_event is set
         stop_event.wait(timeout=sleep_time)
 
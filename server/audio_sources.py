@@ -0,0 +1,256 @@
+# server/audio_sources.py
+
+"""
+Pluggable audio sources feeding `audio_stream.audio_queue`.
+
+The rest of the pipeline (audio_buffer -> audio_processor -> app emitter) only
+sees float32 chunks on the queue, so any source can drive it:
+    - "mic"                : live PyAudio capture (audio_stream.start_stream)
+    - "file:<path>"        : replays a WAV file, at 1x realtime or accelerated (speed=N)
+    - "synthetic[:<seed>]" : endless Karplus-Strong plucks, deterministic for a given seed
+
+With channels > 1 (e.g. a hexaphonic pickup) chunks are (frames, channels)
+arrays; the synthetic source then plucks each string on its own channel.
+
+A speed of 0 replays as fast as possible, which is useful to overload the
+pipeline and measure sustained throughput and drop rates.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+try:
+    from server import audio_stream
+    from server import thread_budget
+    from server.ring_buffer import float_to_int16
+except ImportError:
+    import audio_stream
+    import thread_budget
+    from ring_buffer import float_to_int16
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_SOURCE = "mic"
+SYNTHETIC_BLOCK_SEC = 10.0 # Seconds of synthetic audio generated at a time
+# ---
+
+
+class AudioSource:
+    """
+    Base class for audio sources. Subclasses implement `_generate_chunks()`;
+    the base class paces them in a background thread and pushes them onto
+    audio_stream.audio_queue without ever blocking.
+    """
+    name = "base"
+
+    def __init__(self, samplerate=audio_stream.SAMPLE_RATE, blocksize=audio_stream.FRAMES_PER_BUFFER, speed=1.0,
+                 channels=1):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.speed = speed # 1.0 = realtime, N = N x realtime, 0 = unthrottled
+        self.stats = {'chunks_produced': 0, 'chunks_dropped': 0, 'frames_produced': 0,
+                      'error': None} # Why the source stopped early, shown in /status
+        self._start_time = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            log.info(f"Audio source '{self.name}' already running.")
+            return
+        self._stop_event.clear()
+        self._start_time = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"AudioSource-{self.name}", daemon=True)
+        self._thread.start()
+        log.info(f"Audio source '{self.name}' started (SR={self.samplerate}, blocksize={self.blocksize}, "
+                 f"channels={self.channels}, speed={self.speed or 'unthrottled'}).")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        log.info(f"Audio source '{self.name}' stopped.")
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # --- Chunk delivery ---
+    def _generate_chunks(self):
+        """Yields float32 chunks of `blocksize` frames ((blocksize, channels) if multi-channel)."""
+        raise NotImplementedError
+
+    def _emit(self, chunk):
+        """Pushes one chunk onto the audio queue, dropping it if the consumer is behind."""
+        self.stats['chunks_produced'] += 1
+        self.stats['frames_produced'] += len(chunk)
+        if audio_stream.recorder is not None:
+            audio_stream.recorder.record_audio(chunk)
+        ring = audio_stream.capture_ring
+        if ring is not None:
+            # Direct capture mode: store int16 samples straight into the ring buffer
+            ring.write(float_to_int16(chunk))
+            return
+        try:
+            audio_stream.audio_queue.put_nowait(chunk)
+        except queue.Full:
+            self.stats['chunks_dropped'] += 1
+
+    def _run(self):
+        thread_budget.pin_current_thread('capture')
+        frames_sent = 0
+        try:
+            for chunk in self._generate_chunks():
+                if self._stop_event.is_set():
+                    break
+                self._emit(chunk)
+                frames_sent += len(chunk)
+                if self.speed > 0:
+                    # Sleep until the wall-clock time this many frames would take at the given speed
+                    due = self._start_time + frames_sent / (self.samplerate * self.speed)
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+        except Exception as e:
+            # start() has already returned, so this thread is the only place the failure can be reported
+            self.stats['error'] = f"{type(e).__name__}: {e}"
+            log.error(f"Audio source '{self.name}' failed: {e}", exc_info=True)
+            return
+        log.info(f"Audio source '{self.name}' finished producing audio.")
+
+    def get_stats(self):
+        """Returns production/drop counters plus derived throughput figures."""
+        stats = dict(self.stats)
+        elapsed = time.monotonic() - self._start_time if self._start_time else 0.0
+        stats['source'] = self.name
+        stats['elapsed_sec'] = elapsed
+        stats['chunks_per_sec'] = stats['chunks_produced'] / elapsed if elapsed > 0 else 0.0
+        stats['realtime_factor'] = stats['frames_produced'] / (elapsed * self.samplerate) if elapsed > 0 else 0.0
+        stats['drop_rate'] = (stats['chunks_dropped'] / stats['chunks_produced']
+                              if stats['chunks_produced'] else 0.0)
+        return stats
+
+
+class MicrophoneSource(AudioSource):
+    """
+    Live capture through PyAudio; audio_stream's callback does the queueing.
+    `device_rate` opens the interface at another rate (default: `samplerate` if
+    supported, else the device's native rate); chunks are resampled to `samplerate`.
+    """
+    name = "mic"
+
+    def __init__(self, device_rate=None, **kwargs):
+        super().__init__(**kwargs)
+        self.device_rate = device_rate
+
+    def start(self):
+        self._start_time = time.monotonic()
+        audio_stream.start_stream(samplerate=self.samplerate, blocksize=self.blocksize, channels=self.channels,
+                                  device_rate=self.device_rate)
+
+    def stop(self):
+        audio_stream.stop_stream()
+
+    def is_running(self):
+        return audio_stream._stream is not None and audio_stream._stream.is_active()
+
+    def get_stats(self):
+        self.stats.update(audio_stream.stream_stats)
+        return super().get_stats()
+
+
+class FileReplaySource(AudioSource):
+    """
+    Replays a WAV file (resampled to `samplerate`), optionally looping. Mono sources
+    mix the file down; multi-channel sources need a file with that many channels.
+    """
+    name = "file"
+
+    def __init__(self, path, loop=True, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.loop = loop
+
+    def _generate_chunks(self):
+        from src.data_utils.preprocessing import load_audio
+
+        audio, _ = load_audio(self.path, sr=self.samplerate, mono=self.channels == 1)
+        if self.channels > 1 and audio.shape[1] != self.channels:
+            raise ValueError(f"{self.path} has {audio.shape[1]} channel(s), expected {self.channels}")
+        # Zero-pad to whole chunks so short files still produce audio
+        audio = np.pad(audio, [(0, -len(audio) % self.blocksize)] + [(0, 0)] * (audio.ndim - 1))
+        log.info(f"Replaying {self.path} ({len(audio) / self.samplerate:.1f}s, loop={self.loop}).")
+        while True:
+            for start in range(0, len(audio), self.blocksize):
+                yield audio[start:start + self.blocksize]
+            if not self.loop:
+                return
+
+
+class SyntheticSource(AudioSource):
+    """
+    Endless random open-string plucks; the same seed always produces the same audio.
+    Multi-channel sources put each string on its own channel, in the tab order
+    of prediction_handler.OUTPUT_TAB_ORDER (high E first).
+    """
+    name = "synthetic"
+
+    def __init__(self, seed=0, note_duration_sec=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.seed = seed
+        self.note_duration_sec = note_duration_sec
+
+    def _generate_chunks(self):
+        from src.data_utils.synthetic_audio import random_hexaphonic_sequence, random_pluck_sequence
+        from src.model.prediction_handler import OUTPUT_TAB_ORDER
+
+        rng = np.random.default_rng(self.seed)
+        strings = OUTPUT_TAB_ORDER[:self.channels]
+        leftover = np.zeros((0, self.channels) if self.channels > 1 else 0, dtype=np.float32)
+        while True:
+            seed = int(rng.integers(0, 2**31 - 1))
+            if self.channels > 1:
+                block = random_hexaphonic_sequence(SYNTHETIC_BLOCK_SEC, strings, sr=self.samplerate,
+                                                   note_duration_sec=self.note_duration_sec, seed=seed)
+            else:
+                block = random_pluck_sequence(SYNTHETIC_BLOCK_SEC, sr=self.samplerate,
+                                              note_duration_sec=self.note_duration_sec, seed=seed)
+            audio = np.concatenate([leftover, block])
+            usable = len(audio) - len(audio) % self.blocksize
+            for start in range(0, usable, self.blocksize):
+                yield audio[start:start + self.blocksize]
+            leftover = audio[usable:]
+
+
+def create_audio_source(spec=DEFAULT_SOURCE, **kwargs):
+    """
+    Builds an audio source from a spec string: "mic", "file:<path>" or "synthetic[:<seed>]".
+
+    Args:
+        spec (str): Source specification (e.g. from the AUDIO_SOURCE environment variable).
+        **kwargs: samplerate, blocksize, speed and channels, passed to the source
+                  (and device_rate for the microphone).
+
+    Returns:
+        AudioSource: The (not yet started) source.
+    """
+    kind, _, arg = spec.partition(":")
+    kind = kind.strip().lower()
+    if kind in ("mic", "microphone", "pyaudio"):
+        kwargs.pop('speed', None)
+        return MicrophoneSource(**kwargs)
+    if kind == "file":
+        if not arg:
+            raise ValueError("File audio source needs a path, e.g. 'file:data/raw/negatives/negative_part1.wav'")
+        kwargs.pop('device_rate', None)
+        return FileReplaySource(arg, **kwargs)
+    if kind == "synthetic":
+        kwargs.pop('device_rate', None)
+        return SyntheticSource(seed=int(arg) if arg else 0, **kwargs)
+    raise ValueError(f"Unknown audio source '{spec}'. Expected 'mic', 'file:<path>' or 'synthetic[:<seed>]'.")
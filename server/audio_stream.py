@@ -1,20 +1,35 @@
 # server/audio_stream.py (PyAudio Version)
 
 import queue
-import pyaudio # Import PyAudio
 import numpy as np
 import time # Keep time for potential sleeps if needed
 import sys
 
+try:
+    from server import thread_budget
+    from server.ring_buffer import float_to_int16
+except ImportError:
+    import thread_budget
+    from ring_buffer import float_to_int16
+
+try:
+    import pyaudio # Import PyAudio
+except ImportError:
+    # Headless boxes without PortAudio can still run the file/synthetic sources (see audio_sources.py)
+    pyaudio = None
+
 # --- Configuration ---
 SAMPLE_RATE = 22050
 # BLOCK_SIZE equivalent for PyAudio is frames_per_buffer
 FRAMES_PER_BUFFER = 2048 # Let's use the blocksize from your start_stream call
-CHANNELS = 1
+CHANNELS = 1 # Interleaved input channels, e.g. 6 for a hexaphonic pickup (set by start_stream)
 # We'll request 16-bit integer format, common & compatible, then convert to float32
-AUDIO_FORMAT = pyaudio.paInt16
+AUDIO_FORMAT = pyaudio.paInt16 if pyaudio is not None else None
 NUMPY_FORMAT = np.int16
 NORMALIZATION_FACTOR = 32768.0 # For converting int16 to float range -1.0 to 1.0
+# Rate the device is opened at. Interfaces that don't support SAMPLE_RATE natively run at their own
+# rate (e.g. 44100/48000) and the callbacks resample every chunk to SAMPLE_RATE (src/data_utils/resampling.py)
+DEVICE_SAMPLE_RATE = SAMPLE_RATE
 
 # Queue for sharing audio data
 # Use the maxsize calculated previously if desired
@@ -22,12 +37,36 @@ MAX_QUEUE_CHUNKS = int((5 * SAMPLE_RATE) / FRAMES_PER_BUFFER) + 1
 audio_queue = queue.Queue(maxsize=MAX_QUEUE_CHUNKS)
 print(f"Audio queue initialized with maxsize={MAX_QUEUE_CHUNKS}")
 
+# Counters for the microphone path (read by audio_sources.MicrophoneSource)
+stream_stats = {'chunks_produced': 0, 'chunks_dropped': 0, 'frames_produced': 0}
+
+# Direct capture mode: when audio_buffer.enable_direct_capture() installs a ring buffer here,
+# callbacks write raw int16 samples straight into it instead of going through audio_queue.
+capture_ring = None
+
+# Optional session recorder (server/session_recorder.py): when set, every captured
+# chunk is also handed to recorder.record_audio(), which never blocks.
+recorder = None
+
 
 # --- Global variables for PyAudio instance and stream ---
 # We need these to manage the stream state (start/stop)
 _pyaudio_instance = None
 _stream = None
 _stop_stream_requested = False # Flag to manage stopping gracefully
+_callback_thread_pinned = False # PortAudio creates the callback thread, so it is pinned on its first call
+_resampler = None # StreamingResampler from DEVICE_SAMPLE_RATE to SAMPLE_RATE, None when they match
+
+
+def _pin_callback_thread():
+    global _callback_thread_pinned
+    _callback_thread_pinned = True
+    thread_budget.pin_current_thread('capture')
+
+
+def _resample_chunk(samples):
+    """Device-rate int16 frames -> float32 frames at SAMPLE_RATE (constant cost per chunk)."""
+    return _resampler.process(samples.astype(np.float32) / NORMALIZATION_FACTOR)
 
 
 # --- PyAudio Callback Function ---
@@ -37,18 +76,30 @@ def pyaudio_callback(in_data, frame_count, time_info, status_flags):
     Converts data to float32 NumPy array and puts it onto the queue.
     """
     global audio_queue
+    if not _callback_thread_pinned:
+        _pin_callback_thread()
     try:
         # Convert the raw bytes (`in_data`) to a NumPy array of int16
         audio_data_int16 = np.frombuffer(in_data, dtype=NUMPY_FORMAT)
+        if CHANNELS > 1:
+            audio_data_int16 = audio_data_int16.reshape(-1, CHANNELS)
 
-        # Convert int16 array to float32 array (range -1.0 to 1.0)
-        audio_data_float32 = audio_data_int16.astype(np.float32) / NORMALIZATION_FACTOR
+        # Convert int16 array to float32 array (range -1.0 to 1.0), at the model's rate
+        if _resampler is not None:
+            audio_data_float32 = _resample_chunk(audio_data_int16)
+        else:
+            audio_data_float32 = audio_data_int16.astype(np.float32) / NORMALIZATION_FACTOR
+        if recorder is not None:
+            recorder.record_audio(audio_data_int16 if _resampler is None else audio_data_float32)
 
         # Put the float32 NumPy array onto the queue (non-blocking)
+        stream_stats['chunks_produced'] += 1
+        stream_stats['frames_produced'] += len(audio_data_float32)
         audio_queue.put_nowait(audio_data_float32)
 
     except queue.Full:
         # If the queue is full, we drop the data to avoid blocking the callback
+        stream_stats['chunks_dropped'] += 1
         print("Warning: Audio queue full. Discarding audio chunk.", file=sys.stderr) # Requires import sys
         pass # Or implement other handling like logging counts
     except Exception as e:
@@ -65,42 +116,101 @@ def pyaudio_callback(in_data, frame_count, time_info, status_flags):
     return (None, pyaudio.paContinue)
 
 
+def pyaudio_direct_callback(in_data, frame_count, time_info, status_flags):
+    """
+    Direct-mode callback: writes the raw int16 samples straight into capture_ring.
+    No float conversion, no queue and no filler thread; conversion happens in the feature stage.
+    A device running at another rate is resampled here first.
+    """
+    if not _callback_thread_pinned:
+        _pin_callback_thread()
+    try:
+        samples = np.frombuffer(in_data, dtype=NUMPY_FORMAT)
+        if CHANNELS > 1:
+            samples = samples.reshape(-1, CHANNELS) # Interleaved frames, stored as-is by the ring
+        if _resampler is not None:
+            samples = float_to_int16(_resample_chunk(samples))
+        capture_ring.write(samples)
+        if recorder is not None:
+            recorder.record_audio(samples)
+        stream_stats['chunks_produced'] += 1
+        stream_stats['frames_produced'] += len(samples)
+    except Exception as e:
+        print(f"Error in pyaudio_direct_callback: {e}")
+        return (None, pyaudio.paAbort)
+    return (None, pyaudio.paContinue)
+
+
 # --- Stream Management Functions ---
-def start_stream(samplerate=SAMPLE_RATE, blocksize=FRAMES_PER_BUFFER):
+def _choose_device_rate(samplerate, channels):
+    """samplerate if the default input device supports it natively, else the device's default rate."""
+    device = _pyaudio_instance.get_default_input_device_info()
+    try:
+        if _pyaudio_instance.is_format_supported(samplerate, input_device=device['index'], input_channels=channels,
+                                                 input_format=AUDIO_FORMAT):
+            return samplerate
+    except ValueError: # PyAudio signals unsupported formats with ValueError
+        pass
+    return int(device['defaultSampleRate'])
+
+
+def start_stream(samplerate=SAMPLE_RATE, blocksize=FRAMES_PER_BUFFER, channels=CHANNELS, device_rate=None):
     """
     Initializes PyAudio and starts the audio input stream.
+    With channels > 1 the callbacks deliver (frames, channels) arrays.
+
+    `samplerate` is the rate the pipeline receives. The device is opened at
+    `device_rate` (default: samplerate if the device supports it, else its native
+    rate); when the two differ every chunk is resampled in the callback, and
+    blocksize is scaled so chunks keep their duration.
     """
-    global _pyaudio_instance, _stream, FRAMES_PER_BUFFER, SAMPLE_RATE
+    global _pyaudio_instance, _stream, FRAMES_PER_BUFFER, SAMPLE_RATE, CHANNELS, DEVICE_SAMPLE_RATE, _resampler
     global _stop_stream_requested
 
     if _stream is not None and _stream.is_active():
         print("Stream already running.")
         return
 
-    print(f"Attempting to start PyAudio stream with SR={samplerate}, Blocksize={blocksize}")
+    print(f"Attempting to start PyAudio stream with SR={samplerate}, Blocksize={blocksize}, Channels={channels}")
+
+    if pyaudio is None:
+        raise RuntimeError("PyAudio is not installed; use a file or synthetic audio source instead.")
 
     _stop_stream_requested = False
     # Update global constants if different values are passed
     SAMPLE_RATE = samplerate
     FRAMES_PER_BUFFER = blocksize
+    CHANNELS = channels
 
     try:
         # 1. Initialize PyAudio
         _pyaudio_instance = pyaudio.PyAudio()
         print("PyAudio instance created.")
 
-        # 2. Open the audio stream
+        # 2. Pick the device rate and, if it isn't SAMPLE_RATE, a streaming resampler for the callbacks
+        DEVICE_SAMPLE_RATE = int(device_rate) if device_rate else _choose_device_rate(SAMPLE_RATE, CHANNELS)
+        _resampler = None
+        device_blocksize = FRAMES_PER_BUFFER
+        if DEVICE_SAMPLE_RATE != SAMPLE_RATE:
+            from src.data_utils.resampling import StreamingResampler
+            _resampler = StreamingResampler(DEVICE_SAMPLE_RATE, SAMPLE_RATE, channels=CHANNELS)
+            device_blocksize = int(round(FRAMES_PER_BUFFER * DEVICE_SAMPLE_RATE / SAMPLE_RATE))
+            print(f"Device opened at {DEVICE_SAMPLE_RATE} Hz, resampling to {SAMPLE_RATE} Hz "
+                  f"({_resampler.up}/{_resampler.down}, {_resampler.taps} taps per output).")
+
+        # 3. Open the audio stream
         _stream = _pyaudio_instance.open(
             format=AUDIO_FORMAT,
             channels=CHANNELS,
-            rate=SAMPLE_RATE,
+            rate=DEVICE_SAMPLE_RATE,
             input=True,                   # Specify as input stream
-            frames_per_buffer=FRAMES_PER_BUFFER,
-            stream_callback=pyaudio_callback # Link the callback function
+            frames_per_buffer=device_blocksize,
+            # Link the callback function (direct-to-ring if audio_buffer enabled direct capture)
+            stream_callback=pyaudio_direct_callback if capture_ring is not None else pyaudio_callback
         )
-        print("PyAudio stream opened.")
+        print(f"PyAudio stream opened ({'direct ring' if capture_ring is not None else 'queue'} capture).")
 
-        # 3. Start the stream callbacks (THIS IS KEY - open() doesn't start it)
+        # 4. Start the stream callbacks (THIS IS KEY - open() doesn't start it)
         _stream.start_stream()
         print("PyAudio stream started (callbacks active).")
 
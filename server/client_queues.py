@@ -0,0 +1,199 @@
+# server/client_queues.py
+
+"""
+Per-client bounded send queues for prediction updates.
+
+Broadcasting every update to a room hands it to every connection's transport
+queue, so a slow client accumulates a backlog of stale predictions (and, with
+the eventlet server, can hold up the emitter for everyone). Instead each client
+gets its own small queue:
+    - only the latest `max_pending` updates are kept; older ones are dropped
+    - at most `max_in_flight` updates are unacknowledged at a time; the client's
+      acknowledgement releases the next one (updates are sent with an ack
+      callback, the web page and python-socketio clients answer it)
+    - the ack round trip is the client's lag; a client whose lag stays above
+      slow_lag_sec (or that stops acknowledging) is downgraded to 'reduced'
+      mode, where it gets at most one update per reduced_interval_sec, and is
+      upgraded again once its lag has recovered
+The send function is supplied by the server (Flask-SocketIO or asyncio), and is
+never called with the internal lock held.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_MAX_PENDING = 2       # Latest N updates kept per client
+DEFAULT_MAX_IN_FLIGHT = 2     # Unacknowledged updates per client
+ACK_TIMEOUT_SEC = 2.0         # An update without ack after this counts as lost
+SLOW_LAG_SEC = 0.25           # Ack round trip above this is a strike against the client
+SLOW_STRIKES = 5              # Consecutive strikes before downgrading
+RECOVER_ACKS = 20             # Consecutive fast acks before upgrading again
+REDUCED_INTERVAL_SEC = 0.5    # Minimum gap between updates in reduced mode
+LAG_EWMA_ALPHA = 0.2
+MODE_NORMAL = 'normal'
+MODE_REDUCED = 'reduced'
+# ---
+
+
+class _ClientState:
+    def __init__(self, fmt, max_pending):
+        self.format = fmt
+        self.pending = collections.deque(maxlen=max_pending) # (build_time, event, payload)
+        self.in_flight = {} # message id -> send time
+        self.next_id = 0
+        self.mode = MODE_NORMAL
+        self.last_send = 0.0
+        self.strikes = 0
+        self.fast_acks = 0
+        self.stats = {'sent': 0, 'acked': 0, 'dropped_stale': 0, 'timeouts': 0, 'downgrades': 0,
+                      'lag_ms': 0.0, 'max_lag_ms': 0.0, 'staleness_ms': 0.0}
+
+
+class ClientSendQueues:
+    def __init__(self, send_func, max_pending=DEFAULT_MAX_PENDING, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 ack_timeout_sec=ACK_TIMEOUT_SEC, slow_lag_sec=SLOW_LAG_SEC,
+                 reduced_interval_sec=REDUCED_INTERVAL_SEC):
+        """
+        Args:
+            send_func (callable): send_func(sid, event, payload, callback) emits one event to one
+                                  client and arranges for callback() to run when it is acknowledged.
+        """
+        self._send = send_func
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+        self.ack_timeout_sec = ack_timeout_sec
+        self.slow_lag_sec = slow_lag_sec
+        self.reduced_interval_sec = reduced_interval_sec
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    # --- Client registry ---
+    def add(self, sid, fmt='json'):
+        with self._lock:
+            self._clients[sid] = _ClientState(fmt, self.max_pending)
+
+    def remove(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def set_format(self, sid, fmt):
+        """Switches the payload format; queued updates in the old format are discarded."""
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is not None:
+                client.format = fmt
+                client.pending.clear()
+
+    def formats(self):
+        with self._lock:
+            return {sid: client.format for sid, client in self._clients.items()}
+
+    # --- Sending ---
+    def publish(self, build_payload):
+        """
+        Queues one update for every client and sends what each client can take now.
+
+        Args:
+            build_payload (callable): build_payload(fmt) -> (event, payload). Called at most
+                                      once per format, and only for formats in use.
+        """
+        now = time.monotonic()
+        payloads = {}
+        with self._lock:
+            for client in self._clients.values():
+                if client.format not in payloads:
+                    payloads[client.format] = build_payload(client.format)
+                if len(client.pending) == client.pending.maxlen:
+                    client.stats['dropped_stale'] += 1
+                client.pending.append((now,) + payloads[client.format])
+        self.pump()
+
+    def pump(self):
+        """Sends pending updates to clients with free capacity (also expires lost ones)."""
+        now = time.monotonic()
+        sends = []
+        with self._lock:
+            for sid, client in self._clients.items():
+                self._expire(sid, client, now)
+                if client.mode == MODE_REDUCED and now - client.last_send < self.reduced_interval_sec:
+                    continue
+                while client.pending and len(client.in_flight) < self.max_in_flight:
+                    # In reduced mode only the newest update is sent, the rest are dropped
+                    built, event, payload = client.pending.pop() if client.mode == MODE_REDUCED \
+                        else client.pending.popleft()
+                    message_id = client.next_id
+                    client.next_id += 1
+                    client.in_flight[message_id] = now
+                    client.last_send = now
+                    client.stats['sent'] += 1
+                    client.stats['staleness_ms'] = (now - built) * 1000.0
+                    sends.append((sid, event, payload, self._ack_callback(sid, message_id)))
+                    if client.mode == MODE_REDUCED:
+                        client.stats['dropped_stale'] += len(client.pending)
+                        client.pending.clear()
+                        break
+        for sid, event, payload, callback in sends:
+            try:
+                self._send(sid, event, payload, callback)
+            except Exception as e:
+                log.warning(f"Send to client {sid} failed: {e}")
+
+    def _ack_callback(self, sid, message_id):
+        def on_ack(*args):
+            self._on_ack(sid, message_id)
+        return on_ack
+
+    def _on_ack(self, sid, message_id):
+        now = time.monotonic()
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                return
+            sent_at = client.in_flight.pop(message_id, None)
+            if sent_at is None:
+                return # Already expired
+            lag = now - sent_at
+            stats = client.stats
+            stats['acked'] += 1
+            stats['lag_ms'] += LAG_EWMA_ALPHA * (lag * 1000.0 - stats['lag_ms'])
+            stats['max_lag_ms'] = max(stats['max_lag_ms'], lag * 1000.0)
+            self._update_mode(sid, client, slow=lag > self.slow_lag_sec)
+        self.pump()
+
+    def _expire(self, sid, client, now):
+        """Counts updates whose ack never arrived as lost and frees their slots."""
+        for message_id, sent_at in list(client.in_flight.items()):
+            if now - sent_at > self.ack_timeout_sec:
+                del client.in_flight[message_id]
+                client.stats['timeouts'] += 1
+                self._update_mode(sid, client, slow=True)
+
+    def _update_mode(self, sid, client, slow):
+        if slow:
+            client.strikes += 1
+            client.fast_acks = 0
+        else:
+            client.fast_acks += 1
+            client.strikes = 0
+        if client.mode == MODE_NORMAL and client.strikes >= SLOW_STRIKES:
+            client.mode = MODE_REDUCED
+            client.stats['downgrades'] += 1
+            log.info(f"Client {sid} is persistently slow, downgraded to {MODE_REDUCED} updates.")
+        elif client.mode == MODE_REDUCED and client.fast_acks >= RECOVER_ACKS:
+            client.mode = MODE_NORMAL
+            log.info(f"Client {sid} recovered, back to {MODE_NORMAL} updates.")
+
+    # --- Metrics ---
+    def get_stats(self):
+        """Per-client queue depth, lag (ack round trip EWMA / max, ms), drops and mode."""
+        with self._lock:
+            return {
+                sid: {**client.stats, 'format': client.format, 'mode': client.mode,
+                      'pending': len(client.pending), 'in_flight': len(client.in_flight)}
+                for sid, client in self._clients.items()
+            }
@@ -0,0 +1,170 @@
+# server/model_manager.py
+
+"""
+Zero-downtime model hot swap.
+
+ModelManager owns the active Keras model. New models (from an API call, or
+because the active model file changed on disk) are loaded and warmed up in a
+background thread with dummy inputs shaped like the preprocessing output,
+then swapped in with a single reference assignment. The prediction loop
+fetches the model once per tick via get_model(), so a swap takes effect on the
+next tick without dropping one, and the old model is released afterwards.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.model import model_loader
+
+try:
+    from server import thread_budget
+except ImportError:
+    import thread_budget
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+WATCH_INTERVAL_SEC = 2.0
+WARMUP_RUNS = 2
+MODEL_EXTENSIONS = ('.h5', '.keras')
+# ---
+
+
+class ModelManager:
+    def __init__(self, models_dir: str, model_filename: str, watch_interval_sec: float = WATCH_INTERVAL_SEC):
+        self.models_dir = models_dir
+        self.model_filename = model_filename
+        self.watch_interval_sec = watch_interval_sec
+        self._model = None
+        self._swap_lock = threading.Lock() # Serializes loads; never held by the prediction loop
+        self._file_signature = None
+        self._failed_signature = None # (filename, signature) of the last file that failed to load
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+        self.status = {
+            'model_filename': model_filename,
+            'loaded_at': None,
+            'swaps': 0,
+            'loading': False,
+            'last_error': None,
+            'last_load_sec': None,
+            'last_warmup_sec': None,
+        }
+
+    # --- Access ---
+    def get_model(self):
+        """Returns the active model (None until the first successful load)."""
+        return self._model
+
+    def model_path(self, filename=None):
+        return os.path.join(self.models_dir, filename or self.model_filename)
+
+    # --- Loading ---
+    def _signature(self, path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    @staticmethod
+    def warm_up(model, runs=WARMUP_RUNS):
+        """Runs dummy predictions so the first real tick doesn't pay graph building / allocation costs."""
+        dummy = np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32)
+        for _ in range(runs):
+            model.predict(dummy, verbose=0)
+
+    def load(self, filename=None):
+        """
+        Loads, validates and warms up a model, then atomically makes it the active one.
+        Blocks the calling thread; use request_swap() to do this in the background.
+
+        Returns:
+            bool: True if the new model is now active.
+        """
+        filename = filename or self.model_filename
+        path = self.model_path(filename)
+        # TensorFlow's pools inherit the inference cores; swap threads would otherwise keep their creator's
+        with self._swap_lock, thread_budget.pinned('inference'):
+            self.status['loading'] = True
+            signature = self._signature(path)
+            try:
+                start = time.monotonic()
+                new_model = model_loader.load_trained_model(path)
+                self.status['last_load_sec'] = time.monotonic() - start
+
+                old_model = self._model
+                if old_model is not None and tuple(new_model.input_shape[1:]) != tuple(old_model.input_shape[1:]):
+                    raise ValueError(f"Input shape {new_model.input_shape[1:]} of {filename} does not match the "
+                                     f"active model's {old_model.input_shape[1:]} (wrong feature backend?)")
+
+                start = time.monotonic()
+                self.warm_up(new_model)
+                self.status['last_warmup_sec'] = time.monotonic() - start
+
+                # Atomic swap: the prediction loop picks it up on its next tick
+                self._model = new_model
+                self.model_filename = filename
+                self._file_signature = signature
+                self.status.update({'model_filename': filename, 'loaded_at': time.time(), 'last_error': None})
+                if old_model is not None:
+                    self.status['swaps'] += 1
+                log.info(f"Model '{filename}' active (load {self.status['last_load_sec']:.2f}s, "
+                         f"warmup {self.status['last_warmup_sec']:.2f}s).")
+            except Exception as e:
+                self._failed_signature = (filename, signature) # The watcher skips it until the file changes
+                self.status['last_error'] = str(e)
+                log.error(f"Failed to load model '{filename}', keeping the current one: {e}")
+                return False
+            finally:
+                self.status['loading'] = False
+
+        # Release the old model outside the lock
+        del old_model
+        gc.collect()
+        return True
+
+    def request_swap(self, filename=None):
+        """Loads and swaps in a model in a background thread. Returns immediately."""
+        thread = threading.Thread(target=self.load, args=(filename,), name="ModelSwapThread", daemon=True)
+        thread.start()
+        return thread
+
+    # --- Watching the models directory ---
+    def _watch(self):
+        log.info(f"Watching {self.models_dir} for changes to the active model file.")
+        pending = None
+        while not self._watch_stop.wait(self.watch_interval_sec):
+            signature = self._signature(self.model_path())
+            if signature is None or signature == self._file_signature \
+                    or (self.model_filename, signature) == self._failed_signature:
+                pending = None
+                continue
+            # Only reload once the file stopped changing for one interval (avoids half-written files)
+            if signature == pending:
+                log.info(f"Model file '{self.model_filename}' changed on disk, reloading...")
+                self.load()
+                pending = None
+            else:
+                pending = signature
+
+    def start_watching(self):
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch, name="ModelWatchThread", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        self._watch_stop.set()
+
+    def available_models(self):
+        try:
+            return sorted(f for f in os.listdir(self.models_dir) if f.endswith(MODEL_EXTENSIONS))
+        except OSError:
+            return []
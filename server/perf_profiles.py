@@ -0,0 +1,141 @@
+# server/perf_profiles.py
+
+"""
+Named performance profiles, switchable at runtime.
+
+A profile (config/perf_profiles.json) sets any of:
+    window_sec             analysis window (must give the frame count the model expects)
+    process_interval_sec   prediction loop tick
+    max_queue_chunks       capture queue size (audio_stream.audio_queue)
+    prediction_queue_size  prediction loop -> emitter queue size
+    hpss                   harmonic/percussive separation before the CQT on/off
+    shared_hpss_mask       multi-channel input: one HPSS mask for all channels (fast) or exact per channel
+    model                  model file in models/ (hot-swapped through the ModelManager)
+Switching reconfigures the running pipeline in place: the queues are resized,
+the buffer window is changed keeping the newest samples, the prediction loop
+picks up its new settings on the next tick and a model switch is loaded and
+swapped in the background. Nothing is restarted, so connected clients stay
+connected and keep receiving updates.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from server import audio_buffer
+    from server import audio_processor
+    from server import audio_stream
+except ImportError:
+    import audio_buffer
+    import audio_processor
+    import audio_stream
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+DEFAULT_PROFILES_PATH = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')),
+                                     'config', 'perf_profiles.json')
+PROFILE_KEYS = ('description', 'window_sec', 'process_interval_sec', 'max_queue_chunks', 'prediction_queue_size',
+                'hpss', 'shared_hpss_mask', 'model')
+FEATURE_HOP_LENGTH = 512 # CQT and mel hop: a window of n samples gives 1 + n // 512 frames
+# ---
+
+
+def resize_queue(q, maxsize):
+    """Changes a queue.Queue's capacity in place; items beyond the new size are dropped (oldest first)."""
+    with q.mutex:
+        q.maxsize = maxsize
+        while maxsize > 0 and len(q.queue) > maxsize:
+            q.queue.popleft()
+        q.not_full.notify_all()
+
+
+class ProfileManager:
+    def __init__(self, path=DEFAULT_PROFILES_PATH, model_manager=None, prediction_queue=None):
+        self.path = path
+        self.model_manager = model_manager
+        self.prediction_queue = prediction_queue
+        self.active = None
+        self.switched_at = None
+        self._lock = threading.Lock()
+        self.profiles, self.default_profile = self.load_profiles(path)
+
+    @staticmethod
+    def load_profiles(path):
+        """Reads and validates the profiles file. Returns (profiles, default profile name)."""
+        with open(path) as f:
+            config = json.load(f)
+        profiles = config.get('profiles', {})
+        for name, profile in profiles.items():
+            unknown = set(profile) - set(PROFILE_KEYS)
+            if unknown:
+                raise ValueError(f"Profile '{name}' has unknown settings {sorted(unknown)}, expected {PROFILE_KEYS}")
+        default = config.get('default_profile')
+        if default is not None and default not in profiles:
+            raise ValueError(f"default_profile '{default}' is not defined in {path}")
+        return profiles, default
+
+    def reload(self):
+        """Re-reads the profiles file (the active profile's settings stay applied until the next switch)."""
+        with self._lock:
+            self.profiles, self.default_profile = self.load_profiles(self.path)
+
+    def _check_window(self, window_size):
+        model = self.model_manager.get_model() if self.model_manager is not None else None
+        if model is None:
+            return
+        expected = model.input_shape[2]
+        frames = 1 + window_size // FEATURE_HOP_LENGTH
+        if frames != expected:
+            raise ValueError(f"A window of {window_size} samples gives {frames} feature frames, the active model "
+                             f"expects {expected}")
+
+    def apply(self, name):
+        """Applies a profile to the running pipeline. Raises ValueError for unknown or invalid profiles."""
+        with self._lock:
+            if name not in self.profiles:
+                raise ValueError(f"Unknown profile '{name}', available: {sorted(self.profiles)}")
+            profile = self.profiles[name]
+
+            # Validate everything before changing anything
+            window_size = None
+            if 'window_sec' in profile:
+                window_size = int(round(profile['window_sec'] * audio_buffer.SAMPLE_RATE))
+                self._check_window(window_size)
+            model = profile.get('model')
+            if model and self.model_manager is not None and model not in self.model_manager.available_models():
+                raise ValueError(f"Profile '{name}' uses unknown model file '{model}'")
+
+            if window_size is not None:
+                audio_buffer.set_window_size(window_size)
+            for key in ('process_interval_sec', 'hpss', 'shared_hpss_mask'):
+                if key in profile:
+                    audio_processor.loop_settings[key] = profile[key]
+            if 'max_queue_chunks' in profile:
+                resize_queue(audio_stream.audio_queue, int(profile['max_queue_chunks']))
+            if 'prediction_queue_size' in profile and self.prediction_queue is not None:
+                resize_queue(self.prediction_queue, int(profile['prediction_queue_size']))
+            if model and self.model_manager is not None and model != self.model_manager.model_filename:
+                self.model_manager.request_swap(model)
+
+            self.active = name
+            self.switched_at = time.time()
+            log.info(f"Performance profile '{name}' applied: {profile}")
+            return profile
+
+    def get_status(self):
+        return {
+            'active': self.active,
+            'switched_at': self.switched_at,
+            'effective': {
+                'window_sec': audio_buffer.WINDOW_SIZE / audio_buffer.SAMPLE_RATE,
+                'loop_settings': dict(audio_processor.loop_settings),
+                'max_queue_chunks': audio_stream.audio_queue.maxsize,
+                'prediction_queue_size': self.prediction_queue.maxsize if self.prediction_queue is not None else None,
+                'model': self.model_manager.model_filename if self.model_manager is not None else None,
+            },
+            'profiles': self.profiles,
+        }
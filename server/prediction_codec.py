@@ -0,0 +1,104 @@
+# server/prediction_codec.py
+
+"""
+Compact binary encoding of prediction updates, for clients that negotiate
+the binary format (see the 'set_format' SocketIO event in app.py).
+
+Frame layout (little-endian, 15 + N bytes, N = number of classes, 7 today):
+    uint8   version         FRAME_VERSION
+    uint8   string mask     bit i set <=> tab[i] == 1 (tab order E4, B3, G3, D3, A2, E2)
+    uint32  seq             prediction sequence number (wraps at 2**32)
+    uint64  capture_ts_us   wall-clock capture time of the newest audio sample, microseconds since epoch
+    uint8   N               number of confidences that follow
+    uint8   confidences[N]  softmax probabilities quantized to 0..255 (model output order)
+
+The equivalent JSON payload ({'tab': [...], 'seq': ..., 'ts': ...}) is
+about 60-70 bytes before SocketIO framing, the binary frame is 22.
+"""
+
+import struct
+
+import numpy as np
+
+# --- Configuration ---
+FRAME_VERSION = 1
+HEADER = struct.Struct('<BBIQB')
+CONFIDENCE_LEVELS = 255
+# ---
+
+
+def pack_tab_mask(tab):
+    """Packs a 0/1 tab list into an integer bit mask (bit i = tab[i])."""
+    mask = 0
+    for i, value in enumerate(tab):
+        if value:
+            mask |= 1 << i
+    return mask
+
+
+def unpack_tab_mask(mask, num_strings=6):
+    """Inverse of pack_tab_mask."""
+    return [(mask >> i) & 1 for i in range(num_strings)]
+
+
+def quantize_confidences(confidences):
+    """Maps probabilities in [0, 1] to bytes 0..255."""
+    if confidences is None:
+        return b''
+    values = np.clip(np.asarray(confidences, dtype=np.float32).ravel(), 0.0, 1.0)
+    return np.rint(values * CONFIDENCE_LEVELS).astype(np.uint8).tobytes()
+
+
+def encode_frame(tab, confidences=None, seq=0, capture_ts=0.0):
+    """
+    Encodes one prediction update as a binary frame.
+
+    Args:
+        tab (list[int]): 6-element tab output from the prediction handler.
+        confidences (array-like | None): Softmax output of the model (any shape, flattened).
+        seq (int): Prediction sequence number.
+        capture_ts (float): Capture time (time.time() seconds) of the window's newest sample.
+
+    Returns:
+        bytes: The encoded frame.
+    """
+    quantized = quantize_confidences(confidences)
+    header = HEADER.pack(FRAME_VERSION, pack_tab_mask(tab), seq & 0xFFFFFFFF,
+                         int(capture_ts * 1_000_000), len(quantized))
+    return header + quantized
+
+
+def decode_frame(frame):
+    """
+    Decodes a binary frame back into a dict with 'tab', 'seq', 'ts' and 'confidences'.
+    Raises ValueError for frames with an unknown version or wrong length.
+    """
+    version, mask, seq, capture_ts_us, count = HEADER.unpack_from(frame)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported prediction frame version {version}")
+    if len(frame) != HEADER.size + count:
+        raise ValueError(f"Prediction frame length {len(frame)} does not match header ({HEADER.size + count})")
+    confidences = np.frombuffer(frame, dtype=np.uint8, count=count, offset=HEADER.size)
+    return {
+        'tab': unpack_tab_mask(mask),
+        'seq': seq,
+        'ts': capture_ts_us / 1_000_000,
+        'confidences': (confidences.astype(np.float32) / CONFIDENCE_LEVELS).tolist(),
+    }
+
+
+def json_payload(tab, seq=0, capture_ts=0.0):
+    """The JSON form of a prediction update ('prediction_update' event)."""
+    return {'tab': tab, 'seq': seq, 'ts': capture_ts}
+
+
+def build_event(fmt, item):
+    """
+    (event name, payload) of a prediction queue item for a client using format fmt:
+    'prediction_frame' with a binary frame for 'binary', 'prediction_update' with JSON otherwise.
+    """
+    seq = item.get('seq', 0)
+    capture_ts = item.get('capture_ts', 0.0)
+    if fmt == 'binary':
+        return 'prediction_frame', encode_frame(item.get('data'), item.get('confidences'), seq, capture_ts)
+    return 'prediction_update', json_payload(item.get('data'), seq, capture_ts)
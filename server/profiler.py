@@ -0,0 +1,177 @@
+# server/profiler.py
+
+"""
+On-demand profiling of the running server process.
+
+CPU mode samples the Python stacks of every OS thread (PredictionLoopThread,
+AudioBufferThread, audio source / capture threads, the main thread running the
+web server) with sys._current_frames() at a fixed interval, from a separate
+thread, and aggregates them into collapsed stacks:
+    <thread name>;<module>:<function>:<line>;... <sample count>
+which flamegraph.pl, speedscope or inferno render directly. Nothing is
+instrumented, so the overhead is one stack walk per thread per sample and the
+pipeline runs unchanged while profiling. Native frames (TensorFlow kernels,
+PortAudio) appear as the Python frame that called into them, and eventlet
+green threads only show up while they are running on the main thread.
+
+Memory mode takes a tracemalloc snapshot, waits, takes another and reports
+the allocation growth per source line, filtered to the given files (by default
+audio_prep.py and audio_buffer.py). tracemalloc is only enabled for the
+duration of the run.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# --- Configuration ---
+DEFAULT_DURATION_SEC = 5.0
+MAX_DURATION_SEC = 60.0
+DEFAULT_INTERVAL_SEC = 0.01      # 100 Hz
+MEMORY_TRACE_FRAMES = 10
+DEFAULT_MEMORY_FILES = ('audio_prep.py', 'audio_buffer.py')
+DEFAULT_MEMORY_TOP = 25
+# ---
+
+_profile_lock = threading.Lock() # One profile at a time
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+def sample_stacks(duration_sec=DEFAULT_DURATION_SEC, interval_sec=DEFAULT_INTERVAL_SEC, thread_filter=None):
+    """
+    Samples all threads' stacks for duration_sec.
+
+    Args:
+        thread_filter (str | None): Only keep threads whose name contains this string.
+
+    Returns:
+        dict: 'stacks' (Counter of collapsed stack -> samples), 'threads' (samples per thread),
+              'samples' (sampling rounds), 'duration_sec' and 'overhead_sec' (time spent sampling).
+    """
+    stacks = collections.Counter()
+    threads = collections.Counter()
+    own_id = threading.get_ident()
+    rounds = 0
+    overhead = 0.0
+    start = time.perf_counter()
+    next_sample = start
+    while time.perf_counter() - start < duration_sec:
+        sample_start = time.perf_counter()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            name = names.get(thread_id, f"thread-{thread_id}")
+            if thread_filter and thread_filter not in name:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[";".join([name] + labels[::-1])] += 1
+            threads[name] += 1
+        rounds += 1
+        overhead += time.perf_counter() - sample_start
+        next_sample += interval_sec
+        delay = next_sample - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_sample = time.perf_counter() # Fell behind, don't try to catch up
+    return {'stacks': stacks, 'threads': dict(threads), 'samples': rounds,
+            'duration_sec': time.perf_counter() - start, 'overhead_sec': overhead}
+
+
+def collapsed(stacks):
+    """Collapsed-stack text (one 'frame;frame;... count' line per stack) for flame graph tools."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def memory_diff(duration_sec=DEFAULT_DURATION_SEC, files=DEFAULT_MEMORY_FILES, top=DEFAULT_MEMORY_TOP):
+    """
+    Allocation growth per source line over duration_sec, for allocations whose
+    traceback passes through one of `files` (basenames).
+
+    Returns:
+        dict: 'top' (list of {'size_diff_kb', 'count_diff', 'size_kb', 'traceback'}), totals and the filter.
+    """
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+    try:
+        filters = [tracemalloc.Filter(True, f"*{os.sep}{name}", all_frames=True) for name in files]
+        before = tracemalloc.take_snapshot().filter_traces(filters)
+        time.sleep(duration_sec)
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+    finally:
+        if started_here:
+            tracemalloc.stop()
+    diff = after.compare_to(before, 'traceback')
+    return {
+        'duration_sec': duration_sec,
+        'files': list(files),
+        'size_diff_kb': sum(stat.size_diff for stat in diff) / 1024.0,
+        'top': [{'size_diff_kb': stat.size_diff / 1024.0, 'count_diff': stat.count_diff,
+                 'size_kb': stat.size / 1024.0,
+                 'traceback': [f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback]}
+                for stat in diff[:top]],
+    }
+
+
+def run_profile(mode='cpu', duration_sec=DEFAULT_DURATION_SEC, **kwargs):
+    """Runs one CPU or memory profile; raises ProfilerBusy if another one is in progress."""
+    duration_sec = min(max(float(duration_sec), 0.1), MAX_DURATION_SEC)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        if mode == 'memory':
+            return memory_diff(duration_sec, **kwargs)
+        return sample_stacks(duration_sec, **kwargs)
+    finally:
+        _profile_lock.release()
+
+
+class ProfileJob:
+    """
+    Runs run_profile() in its own OS thread, so servers whose request handlers
+    must not block (eventlet green threads) can poll for the result.
+    """
+
+    def __init__(self, mode='cpu', duration_sec=DEFAULT_DURATION_SEC, **kwargs):
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(mode, duration_sec), kwargs=kwargs,
+                                        name="ProfilerThread", daemon=True)
+
+    def _run(self, mode, duration_sec, **kwargs):
+        try:
+            self.result = run_profile(mode, duration_sec, **kwargs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wait(self, sleep_func=time.sleep, poll_sec=0.1):
+        """Waits with sleep_func (e.g. socketio.sleep) and returns the result or raises the job's error."""
+        while not self._done.is_set():
+            sleep_func(poll_sec)
+        if self.error is not None:
+            raise self.error
+        return self.result
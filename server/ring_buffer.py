@@ -0,0 +1,116 @@
+# server/ring_buffer.py
+
+"""
+Single-producer / single-consumer sample ring buffer used by the direct
+capture path: the PyAudio callback (or an audio source thread) writes raw
+int16 samples straight into it, and the prediction loop copies the latest
+window out. No lock, queue or filler thread is involved.
+
+Lock-free protocol (one writer, one reader):
+    - The writer copies samples into the array first and only then advances
+      `write_pos` (a monotonically increasing frame count). Under the GIL the
+      integer update is atomic, so the reader never sees a position whose
+      samples are not in place yet.
+    - The reader snapshots `write_pos`, copies the window, then re-reads
+      `write_pos`. If the writer advanced far enough to lap the copied region
+      while copying, the copy is torn: it is counted as an overrun and retried.
+
+Multi-channel input (e.g. a hexaphonic pickup) is stored interleaved: the
+array is (capacity, channels) in C order, so one frame holds one sample per
+channel and every position/length above counts frames.
+"""
+
+import time
+
+import numpy as np
+
+INT16_MAX = 32767
+
+
+def float_to_int16(chunk):
+    """Converts float audio in [-1.0, 1.0] to int16 samples (used when float sources feed the ring)."""
+    return np.clip(np.rint(np.asarray(chunk) * 32768.0), -32768, INT16_MAX).astype(np.int16)
+
+
+class SampleRingBuffer:
+    def __init__(self, capacity: int, dtype=np.int16, channels: int = 1):
+        self.capacity = capacity
+        self.channels = channels
+        self._frame_shape = (channels,) if channels > 1 else ()
+        self._data = np.zeros((capacity,) + self._frame_shape, dtype=dtype)
+        self.write_pos = 0         # Total frames ever written (only the producer changes it)
+        self.last_write_time = 0.0 # Wall-clock time (time.time()) of the newest sample
+        self._last_read_end = 0    # write_pos at the end of the previous successful read
+        # Counters
+        self.samples_written = 0
+        self.overruns = 0          # Torn reads: the writer lapped the region being copied
+        self.underruns = 0         # Reads that found no new samples (or not enough yet for a window)
+
+    # --- Producer side ---
+    def write(self, samples):
+        """Appends samples ((n,) or (n, channels)); the oldest frames are overwritten once the ring is full."""
+        n = len(samples)
+        if n == 0:
+            return
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            skipped = n - self.capacity
+            n = self.capacity
+        else:
+            skipped = 0
+        start = (self.write_pos + skipped) % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+        # Publish only after the samples are in place
+        self.write_pos += n + skipped
+        self.samples_written += n + skipped
+        self.last_write_time = time.time()
+
+    # --- Consumer side ---
+    def read_latest(self, n: int, out=None, require_new: bool = True, max_retries: int = 2):
+        """
+        Copies the newest n frames (oldest first) into `out` (allocated if None).
+
+        Args:
+            n (int): Number of frames to read, at most `capacity`.
+            out (np.ndarray | None): Preallocated destination of shape (n,) or (n, channels) and the ring's dtype.
+            require_new (bool): Return None if nothing was written since the previous read.
+            max_retries (int): Retries after a torn read before giving up.
+
+        Returns:
+            np.ndarray | None: The window, or None on underrun / repeated overrun.
+        """
+        if n > self.capacity:
+            raise ValueError(f"Requested {n} samples from a ring of capacity {self.capacity}")
+        if out is None:
+            out = np.empty((n,) + self._frame_shape, dtype=self._data.dtype)
+
+        for _ in range(max_retries + 1):
+            end = self.write_pos
+            if end < n or (require_new and end == self._last_read_end):
+                self.underruns += 1
+                return None
+            start = (end - n) % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self._data[start:start + first]
+            if first < n:
+                out[first:] = self._data[:n - first]
+            # The copy is valid if the writer did not overwrite [end - n, end) meanwhile
+            if self.write_pos - (end - n) <= self.capacity:
+                self._last_read_end = end
+                return out
+            self.overruns += 1
+        return None
+
+    def get_stats(self):
+        return {
+            'capacity': self.capacity,
+            'channels': self.channels,
+            'dtype': str(self._data.dtype),
+            'memory_bytes': self._data.nbytes,
+            'samples_written': self.samples_written,
+            'overruns': self.overruns,
+            'underruns': self.underruns,
+        }
@@ -0,0 +1,292 @@
+# server/session_recorder.py
+
+"""
+Optional recorder for live sessions: captured audio and emitted predictions.
+
+The capture paths (PyAudio callbacks and audio sources) hand every chunk to
+record_audio(), which only appends a reference to a bounded queue and never
+blocks; when the writer falls behind, chunks are dropped and counted rather
+than stalling capture. A background writer thread stores
+    - audio as append-only raw int16 segment files (audio_00000.pcm, ...),
+      rotated every segment_sec
+    - predictions as back-to-back binary frames (predictions.bin, the 22-byte
+      prediction_codec layout, self-delimiting)
+    - session.json: samplerate and, per segment, its first sample index and
+      the wall-clock capture time of that sample, so predictions (whose frames
+      carry the capture time) can be aligned with the audio
+Multi-channel capture is stored interleaved (one int16 per channel per frame,
+'channels' in session.json); sample counts and indices are in frames.
+Raw segments survive a crash with everything written so far. export_wav()
+turns a session into one PCM_16 WAV for the offline tooling
+(extract_multi_onset_chunks.py --stream, split_wav_script.py, ...).
+
+Usage (from the project root):
+    RECORD_SESSION=1 python run.py                           # data/recorded_sessions/<timestamp>/
+    python -m server.session_recorder export data/recorded_sessions/<session> session.wav
+    python -m server.session_recorder predictions data/recorded_sessions/<session>
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import soundfile as sf
+
+try:
+    from server import prediction_codec
+    from server.ring_buffer import float_to_int16
+except ImportError:
+    import prediction_codec
+    from ring_buffer import float_to_int16
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+SESSIONS_DIR = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')),
+                            'data', 'recorded_sessions')
+SEGMENT_SEC = 60.0          # Audio segment file rotation
+MAX_BUFFERED_SEC = 10.0     # Audio held in memory while the writer is behind; beyond that chunks are dropped
+FLUSH_INTERVAL_SEC = 1.0
+MANIFEST_NAME = 'session.json'
+PREDICTIONS_NAME = 'predictions.bin'
+EXPORT_BLOCK_SAMPLES = 1 << 20
+# ---
+
+
+class SessionRecorder:
+    def __init__(self, session_dir, samplerate, blocksize=2048, segment_sec=SEGMENT_SEC,
+                 max_buffered_sec=MAX_BUFFERED_SEC, channels=1):
+        self.session_dir = session_dir
+        self.samplerate = samplerate
+        self.channels = channels
+        self.segment_samples = int(segment_sec * samplerate)
+        # Bounded by chunk count: max_buffered_sec of audio at the capture block size
+        self._queue = queue.Queue(maxsize=max(1, int(max_buffered_sec * samplerate / blocksize)))
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._segments = []
+        self._audio_file = None
+        self._segment_written = 0
+        self._predictions_file = None
+        self.stats = {'chunks_recorded': 0, 'chunks_dropped': 0, 'samples_written': 0,
+                      'predictions_recorded': 0, 'predictions_dropped': 0, 'bytes_written': 0}
+
+    # --- Producer side (capture callbacks, emitter) ---
+    def record_audio(self, chunk):
+        """Queues a captured chunk (float32 or int16). Never blocks; drops the chunk if the buffer is full."""
+        try:
+            self._queue.put_nowait(('audio', time.time(), chunk))
+        except queue.Full:
+            self.stats['chunks_dropped'] += 1
+
+    def record_prediction(self, item):
+        """Queues an emitted prediction (a prediction queue item). Never blocks."""
+        try:
+            self._queue.put_nowait(('prediction', item))
+        except queue.Full:
+            self.stats['predictions_dropped'] += 1
+
+    # --- Lifecycle ---
+    def start(self):
+        # Segment numbering and sample indices start at 0, so appending to an earlier session would corrupt it
+        if os.path.isdir(self.session_dir) and os.listdir(self.session_dir):
+            raise FileExistsError(f"Session directory {self.session_dir} is not empty")
+        os.makedirs(self.session_dir, exist_ok=True)
+        self._predictions_file = open(os.path.join(self.session_dir, PREDICTIONS_NAME), 'ab')
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="SessionRecorderThread", daemon=True)
+        self._thread.start()
+        log.info(f"Recording session to {self.session_dir}")
+
+    def stop(self):
+        """Writes everything still queued, then closes the files."""
+        self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        log.info(f"Session recording stopped ({self.stats['samples_written'] / self.samplerate:.1f}s of audio, "
+                 f"{self.stats['predictions_recorded']} predictions, {self.stats['chunks_dropped']} chunks dropped).")
+
+    # --- Writer thread ---
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self._handle(self._queue.get(timeout=FLUSH_INTERVAL_SEC))
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL_SEC:
+                self._flush()
+                last_flush = time.monotonic()
+        # Stopping: write what was queued up to now
+        for _ in range(self._queue.qsize()):
+            self._handle(self._queue.get_nowait())
+        self._close_segment()
+        self._predictions_file.close()
+        self._write_manifest()
+
+    def _handle(self, item):
+        try:
+            if item[0] == 'audio':
+                self._write_audio(item[1], item[2])
+            else:
+                self._write_prediction(item[1])
+        except Exception as e:
+            log.error(f"Error in session recorder: {e}")
+
+    def _write_audio(self, capture_time, chunk):
+        samples = np.asarray(chunk)
+        if samples.dtype != np.int16:
+            samples = float_to_int16(samples)
+        capture_time -= len(samples) / self.samplerate # Chunks are timed when their last sample arrives
+        while len(samples):
+            if self._audio_file is None:
+                self._open_segment(capture_time)
+            n = min(len(samples), self.segment_samples - self._segment_written)
+            self._audio_file.write(samples[:n].tobytes())
+            self._segment_written += n
+            self.stats['samples_written'] += n
+            self.stats['bytes_written'] += 2 * n * self.channels
+            samples = samples[n:]
+            capture_time += n / self.samplerate
+            if self._segment_written >= self.segment_samples:
+                self._close_segment()
+        self.stats['chunks_recorded'] += 1
+
+    def _write_prediction(self, item):
+        frame = prediction_codec.encode_frame(item.get('data'), item.get('confidences'), item.get('seq', 0),
+                                              item.get('capture_ts', 0.0))
+        self._predictions_file.write(frame)
+        self.stats['predictions_recorded'] += 1
+        self.stats['bytes_written'] += len(frame)
+
+    def _open_segment(self, capture_time):
+        name = f"audio_{len(self._segments):05d}.pcm"
+        self._audio_file = open(os.path.join(self.session_dir, name), 'ab')
+        self._segment_written = 0
+        self._segments.append({'file': name, 'start_sample': self.stats['samples_written'],
+                               'start_time': capture_time, 'samples': 0})
+        self._write_manifest()
+
+    def _close_segment(self):
+        if self._audio_file is None:
+            return
+        self._audio_file.close()
+        self._audio_file = None
+        self._segments[-1]['samples'] = self._segment_written
+        self._write_manifest()
+
+    def _flush(self):
+        if self._audio_file is not None:
+            self._audio_file.flush()
+            self._segments[-1]['samples'] = self._segment_written
+        self._predictions_file.flush()
+
+    def _write_manifest(self):
+        manifest = {'samplerate': self.samplerate, 'dtype': 'int16', 'channels': self.channels, 'segments': self._segments,
+                    'stats': self.stats}
+        path = os.path.join(self.session_dir, MANIFEST_NAME)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['session_dir'] = self.session_dir
+        stats['buffered_chunks'] = self._queue.qsize()
+        return stats
+
+
+def create_session_dir(root=SESSIONS_DIR):
+    return os.path.join(root, time.strftime('%Y%m%d-%H%M%S'))
+
+
+# --- Reading sessions back ---
+
+def load_manifest(session_dir):
+    with open(os.path.join(session_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def iter_session_audio(session_dir):
+    """
+    Yields the recorded int16 audio segment by segment as memory-mapped arrays,
+    (frames, channels) for multi-channel sessions. Segment sizes are taken from the
+    files, so a session whose recorder was killed is read up to the last complete frame.
+    """
+    manifest = load_manifest(session_dir)
+    channels = manifest.get('channels', 1)
+    frame_bytes = 2 * channels
+    for segment in manifest['segments']:
+        path = os.path.join(session_dir, segment['file'])
+        frames = os.path.getsize(path) // frame_bytes
+        if frames:
+            yield np.memmap(path, dtype=np.int16, mode='r', shape=(frames, channels) if channels > 1 else (frames,))
+
+
+def export_wav(session_dir, wav_path):
+    """Writes the whole session as one PCM_16 WAV file (with the session's channels). Returns the number of frames."""
+    manifest = load_manifest(session_dir)
+    total = 0
+    with sf.SoundFile(wav_path, 'w', samplerate=manifest['samplerate'], channels=manifest.get('channels', 1),
+                      subtype='PCM_16') as out:
+        for samples in iter_session_audio(session_dir):
+            for start in range(0, len(samples), EXPORT_BLOCK_SAMPLES):
+                out.write(np.asarray(samples[start:start + EXPORT_BLOCK_SAMPLES]))
+            total += len(samples)
+    return total
+
+
+def read_predictions(session_dir):
+    """Decodes predictions.bin into a list of dicts ('tab', 'seq', 'ts', 'confidences')."""
+    with open(os.path.join(session_dir, PREDICTIONS_NAME), 'rb') as f:
+        data = f.read()
+    predictions = []
+    offset = 0
+    while offset + prediction_codec.HEADER.size <= len(data):
+        count = data[offset + prediction_codec.HEADER.size - 1]
+        end = offset + prediction_codec.HEADER.size + count
+        if end > len(data):
+            break # Truncated last frame
+        predictions.append(prediction_codec.decode_frame(data[offset:end]))
+        offset = end
+    return predictions
+
+
+def prediction_sample_positions(session_dir, predictions=None):
+    """Sample index in the recorded audio of every prediction's capture time (newest window sample)."""
+    manifest = load_manifest(session_dir)
+    predictions = read_predictions(session_dir) if predictions is None else predictions
+    segments = manifest['segments']
+    if not segments:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.array([segment['start_time'] for segment in segments])
+    times = np.array([p['ts'] for p in predictions])
+    index = np.clip(np.searchsorted(starts, times, side='right') - 1, 0, len(segments) - 1)
+    offsets = np.array([segment['start_sample'] for segment in segments])
+    return (offsets[index] + (times - starts[index]) * manifest['samplerate']).astype(np.int64)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect and export recorded live sessions.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help="Write a session's audio as one WAV file.")
+    export_parser.add_argument('session_dir')
+    export_parser.add_argument('wav_path')
+    predictions_parser = subparsers.add_parser('predictions', help="Print a session's predictions.")
+    predictions_parser.add_argument('session_dir')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        samples = export_wav(args.session_dir, args.wav_path)
+        print(f"Wrote {samples / load_manifest(args.session_dir)['samplerate']:.1f}s of audio to {args.wav_path}")
+    else:
+        predictions = read_predictions(args.session_dir)
+        positions = prediction_sample_positions(args.session_dir, predictions)
+        samplerate = load_manifest(args.session_dir)['samplerate']
+        for prediction, position in zip(predictions, positions):
+            print(f"{position / samplerate:9.3f}s  seq={prediction['seq']:<6} tab={prediction['tab']}")
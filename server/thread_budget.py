@@ -0,0 +1,221 @@
+# server/thread_budget.py
+
+"""
+Startup-time CPU thread budget and optional core affinity for the pipeline.
+
+By default TensorFlow's intra-/inter-op pools and the BLAS/OpenMP pools used by
+NumPy and librosa each size themselves to the whole machine, and compete with
+the capture callback, the buffer filler and the prediction loop. A budget
+fixes those pool sizes and can pin each pipeline role to its own cores:
+    capture    - PyAudio callback / audio source thread and the buffer filler
+    preprocess - the prediction loop thread (HPSS/CQT or mel, plus TF ops that
+                 run inline on the calling thread)
+    inference  - TensorFlow's thread pools: they inherit the affinity of the
+                 thread that creates them, so the model is loaded while the
+                 loading thread is temporarily pinned to these cores
+    io         - the main thread (web server / emitter), pinned once the
+                 pipeline threads are started
+On Linux a new thread inherits the affinity of the thread that creates it, so
+a thread whose role has no cores configured is reset to all the process's
+CPUs rather than staying on its creator's cores.
+
+Configuration (environment variables, read by configure_from_env()):
+    TF_INTRA_OP_THREADS, TF_INTER_OP_THREADS, BLAS_THREADS : pool sizes
+    CPU_AFFINITY : e.g. "capture=0;preprocess=1;inference=2-3;io=0"
+
+BLAS thread counts must be set before NumPy is imported, so configure_from_env()
+has to run at the top of the entry point. This module deliberately imports
+neither NumPy nor TensorFlow at import time.
+"""
+
+import contextlib
+import logging
+import os
+import sys
+import threading
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+ROLES = ('capture', 'preprocess', 'inference', 'io')
+BLAS_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                 'VECLIB_MAXIMUM_THREADS')
+# ---
+
+active_budget = None # Installed by configure(); pin_current_thread() is a no-op without one
+
+
+def parse_cpu_list(spec):
+    """'0,2-3' -> {0, 2, 3}"""
+    cpus = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            low, high = part.split('-')
+            cpus.update(range(int(low), int(high) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def parse_affinity(spec):
+    """'capture=0;inference=2-3' -> {'capture': {0}, 'inference': {2, 3}}"""
+    affinity = {}
+    for entry in (spec or '').split(';'):
+        if not entry.strip():
+            continue
+        role, cpus = entry.split('=')
+        role = role.strip()
+        if role not in ROLES:
+            raise ValueError(f"Unknown CPU_AFFINITY role '{role}', expected one of {ROLES}")
+        affinity[role] = parse_cpu_list(cpus)
+    return affinity
+
+
+class ThreadBudget:
+    def __init__(self, tf_intra_op=None, tf_inter_op=None, blas_threads=None, affinity=None):
+        self.tf_intra_op = tf_intra_op
+        self.tf_inter_op = tf_inter_op
+        self.blas_threads = blas_threads
+        self.affinity = dict(affinity or {})
+        self.pinned_threads = {} # thread name -> sorted CPU list
+        self.warnings = []
+        self.process_cpus = self.available_cpus() # Before any thread is pinned
+        if self.affinity and not hasattr(os, 'sched_setaffinity'):
+            self._warn("CPU affinity is not supported on this platform, CPU_AFFINITY ignored.")
+            self.affinity = {}
+        available = self.process_cpus
+        for role, cpus in list(self.affinity.items()):
+            if available is not None and not cpus <= available:
+                self._warn(f"CPU_AFFINITY {role}={sorted(cpus)} is outside the available CPUs {sorted(available)}, "
+                           f"ignored.")
+                del self.affinity[role]
+
+    @classmethod
+    def from_env(cls):
+        def env_int(name):
+            value = os.environ.get(name)
+            return int(value) if value else None
+        return cls(tf_intra_op=env_int('TF_INTRA_OP_THREADS'), tf_inter_op=env_int('TF_INTER_OP_THREADS'),
+                   blas_threads=env_int('BLAS_THREADS'), affinity=parse_affinity(os.environ.get('CPU_AFFINITY')))
+
+    def _warn(self, message):
+        log.warning(message)
+        self.warnings.append(message)
+
+    @staticmethod
+    def available_cpus():
+        return set(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+
+    # --- Pool sizes ---
+    def apply_blas_env(self):
+        """Sets the BLAS/OpenMP thread environment variables. Only effective before NumPy is imported."""
+        if self.blas_threads is None:
+            return
+        if 'numpy' in sys.modules:
+            self._warn("NumPy was imported before the thread budget; BLAS_THREADS is applied with threadpoolctl "
+                       "only (if installed).")
+        for name in BLAS_ENV_VARS:
+            os.environ[name] = str(self.blas_threads)
+
+    def apply_runtime(self):
+        """Limits already loaded BLAS/OpenMP pools and configures TensorFlow's pools (before it initializes)."""
+        if self.blas_threads is not None:
+            try:
+                from threadpoolctl import threadpool_limits
+                threadpool_limits(limits=self.blas_threads)
+            except ImportError:
+                pass
+        if self.tf_intra_op is not None or self.tf_inter_op is not None:
+            import tensorflow as tf
+            try:
+                if self.tf_intra_op is not None:
+                    tf.config.threading.set_intra_op_parallelism_threads(self.tf_intra_op)
+                if self.tf_inter_op is not None:
+                    tf.config.threading.set_inter_op_parallelism_threads(self.tf_inter_op)
+            except RuntimeError as e:
+                self._warn(f"TensorFlow was already initialized, thread pool sizes unchanged: {e}")
+
+    # --- Affinity ---
+    def role_cpus(self, role):
+        """The role's cores; all the process's CPUs for roles without affinity (None without any affinity)."""
+        if not self.affinity:
+            return None
+        return self.affinity.get(role) or self.process_cpus
+
+    def pin_current_thread(self, role):
+        """Pins the calling thread to the role's cores (no-op without any CPU_AFFINITY)."""
+        cpus = self.role_cpus(role)
+        if not cpus:
+            return
+        try:
+            os.sched_setaffinity(0, cpus) # pid 0 = the calling thread on Linux
+            self.pinned_threads[threading.current_thread().name] = sorted(cpus)
+        except OSError as e:
+            self._warn(f"Could not pin thread '{threading.current_thread().name}' to {sorted(cpus)}: {e}")
+
+    @contextlib.contextmanager
+    def pinned(self, role):
+        """Temporarily pins the calling thread, e.g. while TensorFlow creates its pools during model loading."""
+        cpus = self.role_cpus(role)
+        if not cpus:
+            yield
+            return
+        previous = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, cpus)
+        try:
+            yield
+        finally:
+            os.sched_setaffinity(0, previous)
+
+    # --- Report ---
+    def report(self):
+        """Effective configuration: requested values, what the libraries actually use, and pinned threads."""
+        report = {
+            'requested': {'tf_intra_op': self.tf_intra_op, 'tf_inter_op': self.tf_inter_op,
+                          'blas_threads': self.blas_threads,
+                          'affinity': {role: sorted(cpus) for role, cpus in self.affinity.items()}},
+            'available_cpus': sorted(self.available_cpus() or []) or os.cpu_count(),
+            'pinned_threads': dict(self.pinned_threads),
+            'warnings': list(self.warnings),
+        }
+        if 'tensorflow' in sys.modules:
+            tf = sys.modules['tensorflow']
+            report['tensorflow'] = {'intra_op': tf.config.threading.get_intra_op_parallelism_threads(),
+                                    'inter_op': tf.config.threading.get_inter_op_parallelism_threads()}
+        try:
+            from threadpoolctl import threadpool_info
+            report['blas'] = [{'library': pool['internal_api'], 'num_threads': pool['num_threads']}
+                              for pool in threadpool_info()]
+        except ImportError:
+            report['blas'] = {name: os.environ.get(name) for name in BLAS_ENV_VARS}
+        return report
+
+
+# --- Module-level helpers used by the pipeline threads ---
+
+def configure(budget):
+    """Installs the budget and applies the BLAS environment (call before NumPy is imported)."""
+    global active_budget
+    active_budget = budget
+    budget.apply_blas_env()
+    return budget
+
+
+def configure_from_env():
+    return configure(ThreadBudget.from_env())
+
+
+def pin_current_thread(role):
+    if active_budget is not None:
+        active_budget.pin_current_thread(role)
+
+
+def pinned(role):
+    return active_budget.pinned(role) if active_budget is not None else contextlib.nullcontext()
+
+
+def get_report():
+    return active_budget.report() if active_budget is not None else None
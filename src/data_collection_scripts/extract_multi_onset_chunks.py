@@ -4,6 +4,7 @@ import librosa
 import argparse
 from pathlib import Path
 import math
+import time
 
 # --- Configuration ---
 # Default target duration for chunks
@@ -13,12 +14,17 @@ MIN_CHUNK_LENGTH_SAMPLES = 100 # Adjust if needed, e.g., 10ms worth of samples
 # Librosa onset detection parameters (tune if needed)
 ONSET_HOP_LENGTH = 512 # Standard hop length for STFT-based methods
 ONSET_BACKTRACK = True # Tries to align onset to preceding energy minimum
+# Streaming mode (--stream): samples read per block, and how much recent audio is
+# kept for chunks whose onset lies before the current block (detector latency + backtracking)
+DEFAULT_BLOCK_SIZE = 65536
+HISTORY_SEC = 10.0
 # ---
 
 def extract_chunks_from_onsets(input_wav_file: Path,
                                output_base_dir: Path,
                                label_name: str,
-                               target_duration_ms: int):
+                               target_duration_ms: int,
+                               index=None):
     """
     Detects multiple onsets in a single WAV file and extracts a chunk of
     target_duration_ms starting from each onset. Saves chunks to a labeled
@@ -31,6 +37,8 @@ def extract_chunks_from_onsets(input_wav_file: Path,
         label_name (str): The label name to use for the output subdirectory
                           (e.g., "string_E4", "negative").
         target_duration_ms (int): Desired duration of each extracted chunk in milliseconds.
+        index (RecordingIndex): Optional recording index; every saved chunk is registered
+                                with its source file and exact onset sample.
     """
     print(f"Processing file: {input_wav_file}")
     print(f"Target chunk duration: {target_duration_ms} ms")
@@ -111,6 +119,9 @@ def extract_chunks_from_onsets(input_wav_file: Path,
             try:
                 sf.write(output_chunk_path, chunk_data, samplerate)
                 chunks_saved += 1
+                if index is not None:
+                    index.add_chunk(output_chunk_path, label_name, source_file=input_stem,
+                                    onset_sample=int(onset_sample))
             except Exception as e:
                 print(f"  Error writing chunk file {chunk_filename}: {e}")
         # else:
@@ -123,6 +134,122 @@ def extract_chunks_from_onsets(input_wav_file: Path,
     print(f"--------------------------------------------------")
 
 
+def extract_chunks_streaming(input_wav_file: Path,
+                             output_base_dir: Path,
+                             label_name: str,
+                             target_duration_ms: int,
+                             index=None,
+                             block_size: int = DEFAULT_BLOCK_SIZE):
+    """
+    Block-streaming variant of extract_chunks_from_onsets for long session recordings.
+    The file is read in blocks, onsets are detected incrementally (StreamingOnsetDetector
+    carries the detector state across blocks) and every chunk is written as soon as its
+    audio is complete, so memory stays bounded by the block size and HISTORY_SEC
+    regardless of the file length. Multi-channel files are mixed down for detection;
+    chunks keep all channels.
+
+    Args:
+        input_wav_file (Path): Path to the input WAV file (any length).
+        output_base_dir (Path): The base directory where the output label subdirectory
+                                will be created.
+        label_name (str): The label name to use for the output subdirectory.
+        target_duration_ms (int): Desired duration of each extracted chunk in milliseconds.
+        index (RecordingIndex): Optional recording index to register the chunks in.
+        block_size (int): Samples read per block.
+    """
+    print(f"Processing file (streaming): {input_wav_file}")
+    if not input_wav_file.is_file():
+        print(f"Error: Input file not found at '{input_wav_file}'")
+        return
+
+    output_label_dir = output_base_dir / label_name
+    try:
+        output_label_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        print(f"Error creating output directory '{output_label_dir}': {e}")
+        return
+
+    info = sf.info(input_wav_file)
+    samplerate, channels = info.samplerate, info.channels
+    print(f"  Duration={info.frames / samplerate:.2f}s, Sample Rate={samplerate}Hz, Channels={channels}")
+    target_samples = int(samplerate * target_duration_ms / 1000.0)
+    if target_samples <= MIN_CHUNK_LENGTH_SAMPLES:
+        print(f"Error: Target duration {target_duration_ms}ms is too short (<= {MIN_CHUNK_LENGTH_SAMPLES} samples) at {samplerate}Hz.")
+        return
+
+    from src.data_utils.streaming_onsets import StreamingOnsetDetector # Lazy: plain runs work without src on the path
+    detector = StreamingOnsetDetector(samplerate, hop_length=ONSET_HOP_LENGTH, backtrack=ONSET_BACKTRACK)
+    input_stem = input_wav_file.stem
+    # The onset count isn't known up front; pad for the most onsets the detector's `wait` allows
+    pad_width = len(str(info.frames // ((detector.wait + 1) * ONSET_HOP_LENGTH) + 1))
+    history_length = int(HISTORY_SEC * samplerate) + block_size
+    history = np.zeros((0, channels), dtype=np.float32)
+    history_start = 0 # Sample index of history[0]
+    pending = []      # Chunks still waiting for audio: [onset_number, onset_sample, data, filled]
+    stats = {"onsets": 0, "saved": 0, "clamped": 0}
+
+    def save_chunk(onset_number, onset_sample, chunk_data):
+        if len(chunk_data) < MIN_CHUNK_LENGTH_SAMPLES:
+            return
+        chunk_filename = f"{input_stem}_onset_{str(onset_number).zfill(pad_width)}_chunk.wav"
+        output_chunk_path = output_label_dir / chunk_filename
+        try:
+            sf.write(output_chunk_path, chunk_data, samplerate)
+            stats["saved"] += 1
+            if index is not None:
+                index.add_chunk(output_chunk_path, label_name, source_file=input_stem, onset_sample=onset_sample)
+        except Exception as e:
+            print(f"  Error writing chunk file {chunk_filename}: {e}")
+
+    def start_chunks(onset_samples):
+        history_end = history_start + len(history)
+        for onset_sample in onset_samples:
+            stats["onsets"] += 1
+            if onset_sample < history_start:
+                # Backtracked further than the kept history
+                onset_sample = history_start
+                stats["clamped"] += 1
+            data = np.empty((target_samples, channels), dtype=np.float32)
+            available = max(0, min(target_samples, history_end - onset_sample))
+            data[:available] = history[onset_sample - history_start:onset_sample - history_start + available]
+            pending.append([stats["onsets"], onset_sample, data, available])
+
+    start = time.perf_counter()
+    position = 0
+    for block in sf.blocks(str(input_wav_file), blocksize=block_size, dtype='float32', always_2d=True):
+        # Complete chunks started in earlier blocks
+        for chunk in pending:
+            _, onset_sample, data, filled = chunk
+            offset = onset_sample + filled - position
+            count = min(target_samples - filled, len(block) - offset)
+            if count > 0:
+                data[filled:filled + count] = block[offset:offset + count]
+                chunk[3] += count
+
+        history = np.concatenate([history, block])[-history_length:]
+        position += len(block)
+        history_start = position - len(history)
+        start_chunks(detector.process(block.mean(axis=1)))
+
+        for chunk in [chunk for chunk in pending if chunk[3] == target_samples]:
+            save_chunk(chunk[0], chunk[1], chunk[2])
+            pending.remove(chunk)
+
+    start_chunks(detector.flush())
+    # Chunks running past the end of the file are saved truncated, as in the offline mode
+    for onset_number, onset_sample, data, filled in pending:
+        save_chunk(onset_number, onset_sample, data[:filled])
+
+    elapsed = time.perf_counter() - start
+    print(f"\nFinished processing {input_wav_file.name} in {elapsed:.1f}s "
+          f"({position / samplerate / max(elapsed, 1e-9):.0f}x realtime).")
+    print(f"Detected {stats['onsets']} onsets.")
+    if stats["clamped"]:
+        print(f"  {stats['clamped']} onsets backtracked beyond the {HISTORY_SEC}s history and were clamped.")
+    print(f"Successfully saved {stats['saved']} chunks to '{output_label_dir}'.")
+    print(f"--------------------------------------------------")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Detect multiple onsets in a WAV file and extract fixed-duration chunks."
@@ -135,10 +262,25 @@ if __name__ == "__main__":
                         help="Label name for the output subdirectory (e.g., 'string_E4').")
     parser.add_argument("--duration_ms", type=int, default=DEFAULT_TARGET_DURATION_MS,
                         help=f"Target duration of each chunk in milliseconds (default: {DEFAULT_TARGET_DURATION_MS}).")
+    parser.add_argument("--index", action="store_true",
+                        help="Register the chunks (with their onset samples) in the recording index.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Process the file block by block with bounded memory (for long session recordings).")
+    parser.add_argument("--block_size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f"Samples per block in --stream mode (default: {DEFAULT_BLOCK_SIZE}).")
 
     args = parser.parse_args()
 
     input_path = Path(args.input_wav)
     output_path = Path(args.output_dir)
 
-    extract_chunks_from_onsets(input_path, output_path, args.label_name, args.duration_ms)
\ No newline at end of file
+    index = None
+    if args.index:
+        from src.data_utils.recording_index import RecordingIndex
+        index = RecordingIndex()
+    if args.stream:
+        extract_chunks_streaming(input_path, output_path, args.label_name, args.duration_ms, index, args.block_size)
+    else:
+        extract_chunks_from_onsets(input_path, output_path, args.label_name, args.duration_ms, index)
+    if index is not None:
+        index.close()
\ No newline at end of file
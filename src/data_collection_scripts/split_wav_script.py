@@ -1,45 +1,203 @@
-from pydub import AudioSegment
+import argparse
 import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from src.visualization import ROOT_DIR
+import numpy as np
+import soundfile as sf
 
 
-def split_wav(file_path, output_dir, segment_length_ms=2000):
+# --- Configuration ---
+DEFAULT_SEGMENT_LENGTH_MS = 2000
+# (WAVE format tag, bits per sample) -> sample dtype, for memory-mapping the data chunk
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+MEMMAP_DTYPES = {
+    (WAVE_FORMAT_PCM, 16): '<i2',
+    (WAVE_FORMAT_PCM, 32): '<i4',
+    (WAVE_FORMAT_IEEE_FLOAT, 32): '<f4',
+    (WAVE_FORMAT_IEEE_FLOAT, 64): '<f8',
+}
+# Read dtype per subtype for the seek-based fallback (lossless for these subtypes)
+READ_DTYPES = {'PCM_16': 'int16', 'PCM_24': 'int32', 'PCM_32': 'int32', 'FLOAT': 'float32', 'DOUBLE': 'float64'}
+# ---
+
+
+def wav_data_view(file_path):
+    """
+    Memory-maps the sample data of a plain PCM / float WAV file.
+
+    Returns:
+        np.memmap | None: Read-only array of shape (frames, channels), or None if the
+                          file's layout or sample format isn't supported (e.g. 24-bit, RF64).
+    """
+    with open(file_path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            return None
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                body = f.read(chunk_size)
+                format_tag, channels, _, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    format_tag = struct.unpack('<H', body[24:26])[0] # First bytes of the sub-format GUID
+                fmt = (format_tag, channels, block_align, bits)
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    return None
+                format_tag, channels, block_align, bits = fmt
+                dtype = MEMMAP_DTYPES.get((format_tag, bits))
+                if dtype is None or block_align != channels * bits // 8:
+                    return None
+                # Truncated or still-being-written files hold less data than the header claims
+                frames = min(chunk_size, os.path.getsize(file_path) - f.tell()) // block_align
+                if frames <= 0:
+                    return None
+                return np.memmap(file_path, dtype=dtype, mode='r', offset=f.tell(), shape=(frames, channels))
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def split_wav(file_path, output_dir, segment_length_ms=DEFAULT_SEGMENT_LENGTH_MS):
     """
     Splits a WAV file into consecutive segments.
 
+    The sample data is memory-mapped and every segment is written by soundfile
+    straight from a zero-copy slice, in the input's sample format (no decode /
+    re-encode). Formats that can't be mapped are read segment by segment with
+    seek-based I/O instead of loading the whole file.
+
     Parameters:
     - file_path: Path to the input WAV file.
     - output_dir: Directory where the segments will be saved.
     - segment_length_ms: Length of each segment in milliseconds (default is 2000ms or 2 seconds).
+
+    Returns:
+    - dict with the number of segments and bytes read / written.
     """
-    # Load the audio file
-    audio = AudioSegment.from_wav(file_path)
+    info = sf.info(file_path)
     file_name = os.path.splitext(os.path.basename(file_path))[0]
+    segment_samples = max(1, int(round(info.samplerate * segment_length_ms / 1000.0)))
+
+    data = wav_data_view(file_path)
+    frames = len(data) if data is not None else info.frames
 
-    # Calculate the number of segments
-    total_length_ms = len(audio)
-    num_segments = total_length_ms // segment_length_ms
+    # Calculate the number of segments (the remainder becomes a shorter last segment)
+    num_segments = -(-frames // segment_samples)
 
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
 
-    # Split and export segments
-    for i in range(num_segments):
-        start_time = i * segment_length_ms
-        end_time = start_time + segment_length_ms
-        segment = audio[start_time:end_time]
-        segment.export(os.path.join(output_dir, f"{file_name}_part{i+1}.wav"), format="wav")
+    bytes_written = 0
+    if data is not None:
+        for i in range(num_segments):
+            output_path = os.path.join(output_dir, f"{file_name}_part{i+1}.wav")
+            start = i * segment_samples
+            sf.write(output_path, data[start:start + segment_samples], info.samplerate, subtype=info.subtype)
+            bytes_written += os.path.getsize(output_path)
+        del data
+    else:
+        read_dtype = READ_DTYPES.get(info.subtype, 'float32')
+        with sf.SoundFile(file_path) as f:
+            for i in range(num_segments):
+                output_path = os.path.join(output_dir, f"{file_name}_part{i+1}.wav")
+                f.seek(i * segment_samples)
+                segment = f.read(segment_samples, dtype=read_dtype, always_2d=True)
+                sf.write(output_path, segment, info.samplerate, subtype=info.subtype)
+                bytes_written += os.path.getsize(output_path)
+
+    return {'segments': num_segments, 'bytes_read': os.path.getsize(file_path), 'bytes_written': bytes_written}
+
+
+def find_wav_files(paths):
+    """
+    Expands files and directories (searched recursively) into sorted WAV jobs.
+
+    Returns:
+    - list of (file path, output subdirectory) pairs. Files found in a directory keep their
+      path relative to it, so same-named files in different subdirectories don't collide.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                relative_dir = os.path.relpath(dirpath, path)
+                relative_dir = '' if relative_dir == os.curdir else relative_dir
+                files.extend((os.path.join(dirpath, name), relative_dir)
+                             for name in filenames if name.lower().endswith('.wav'))
+        else:
+            files.append((path, ''))
+    return sorted(files)
+
+
+def check_collisions(jobs, output_dir):
+    """Raises ValueError if two input files would write their segments to the same paths."""
+    targets = {}
+    for file_path, relative_dir in jobs:
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        target = os.path.normcase(os.path.normpath(os.path.join(output_dir, relative_dir, stem)))
+        if target in targets:
+            raise ValueError(f"'{targets[target]}' and '{file_path}' would both be split into "
+                             f"'{target}_part*.wav'; rename one or split them separately")
+        targets[target] = file_path
+
+
+def split_many(jobs, output_dir, segment_length_ms=DEFAULT_SEGMENT_LENGTH_MS, workers=None):
+    """
+    Splits many WAV files in parallel. Threads are enough: libsndfile calls release
+    the GIL, so the work is bound by disk throughput rather than Python.
+
+    Parameters:
+    - jobs: Input WAV paths, or (path, output subdirectory) pairs as returned by find_wav_files.
+    - output_dir: Directory the segments (and subdirectories) are saved in.
+
+    Returns:
+    - dict with totals, elapsed time and throughput in MB/s.
+    """
+    jobs = [job if isinstance(job, tuple) else (job, '') for job in jobs]
+    check_collisions(jobs, output_dir) # Before any file is written
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda job: split_wav(job[0], os.path.join(output_dir, job[1]), segment_length_ms), jobs))
+    elapsed = time.perf_counter() - start
 
-    # Handle any remaining audio that doesn't fit into a full segment
-    if total_length_ms % segment_length_ms != 0:
-        start_time = num_segments * segment_length_ms
-        segment = audio[start_time:]
-        segment.export(os.path.join(output_dir, f"{file_name}_part{num_segments+1}.wav"), format="wav")
+    bytes_read = sum(r['bytes_read'] for r in results)
+    bytes_written = sum(r['bytes_written'] for r in results)
+    return {
+        'files': len(results),
+        'segments': sum(r['segments'] for r in results),
+        'bytes_read': bytes_read,
+        'bytes_written': bytes_written,
+        'elapsed_sec': elapsed,
+        'read_mb_per_sec': bytes_read / 1e6 / max(elapsed, 1e-9),
+        'write_mb_per_sec': bytes_written / 1e6 / max(elapsed, 1e-9),
+    }
 
-    print(f"Splitting complete. Segments saved in '{output_dir}'.")
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split WAV files into fixed-length segments.")
+    parser.add_argument("inputs", nargs="+",
+                        help="Input WAV files and/or directories (searched recursively).")
+    parser.add_argument("output_dir", type=str, help="Directory where the segments will be saved.")
+    parser.add_argument("--segment_ms", type=int, default=DEFAULT_SEGMENT_LENGTH_MS,
+                        help=f"Segment length in milliseconds (default: {DEFAULT_SEGMENT_LENGTH_MS}).")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel workers (default: 4 x CPU count).")
+    args = parser.parse_args()
 
-# input_wav = ROOT_DIR + "" # Relative path to input
-# output_directory = "" # Path to output
-# split_wav(input_wav, output_directory)
+    try:
+        stats = split_many(find_wav_files(args.inputs), args.output_dir, args.segment_ms, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Split {stats['files']} files into {stats['segments']} segments in {stats['elapsed_sec']:.2f}s: "
+          f"read {stats['read_mb_per_sec']:.1f} MB/s, wrote {stats['write_mb_per_sec']:.1f} MB/s.")
+    print(f"Splitting complete. Segments saved in '{args.output_dir}'.")
@@ -0,0 +1,176 @@
+"""
+    Cheap data augmentation directly on stored (84, 87, 1) CQT arrays.
+
+    Every transform works on a whole batch (B, 84, 87, 1) at once with NumPy
+    broadcasting, so no HPSS/CQT has to be recomputed per variant:
+        - frequency bin shifts (small pitch deviations)
+        - time shifts and random crops
+        - gain offsets in dB combined with noise mixing from the negatives class
+        - SpecAugment-style frequency/time masking
+    AugmentedSequence feeds augmented batches to model.fit() from worker
+    threads, so augmentation runs in parallel with training.
+"""
+
+import numpy as np
+from keras.utils import PyDataset
+
+# --- Configuration ---
+# Stored arrays are standardized dB spectrograms; one unit is roughly this many dB
+# (typical std of the HPSS + CQT dB spectrograms in data/raw)
+DB_PER_UNIT = 17.0
+DEFAULT_CONFIG = {
+    "max_bin_shift": 1,          # CQT bins (1 bin = 1 semitone)
+    "max_time_shift": 8,         # frames (~23ms each)
+    "crop_prob": 0.2,            # probability of keeping only a random time crop
+    "min_crop_frames": 43,       # shortest crop kept (~1s)
+    "noise_prob": 0.5,           # probability of mixing in a negatives sample
+    "snr_db": (5.0, 30.0),       # signal-to-noise ratio range for mixing
+    "gain_db": (-6.0, 6.0),      # signal gain offset applied before mixing
+    "freq_masks": 1,
+    "max_freq_mask": 8,          # bins
+    "time_masks": 1,
+    "max_time_mask": 10,         # frames
+}
+# ---
+
+
+def _floor_values(x):
+    """Per-sample minimum (the 'silence' level of each standardized spectrogram), shape (B, 1, 1, 1)."""
+    return x.min(axis=(1, 2, 3), keepdims=True)
+
+
+def _shift_axis(x, shifts, axis, fill):
+    """Shifts each sample along `axis` by its own integer offset, filling vacated cells with `fill`."""
+    length = x.shape[axis]
+    positions = np.arange(length)
+    shape = [1] * x.ndim
+    shape[0], shape[axis] = len(x), length
+    source = positions[np.newaxis, :] - shifts[:, np.newaxis] # (B, length)
+    valid = ((source >= 0) & (source < length)).reshape(shape)
+    gathered = np.take_along_axis(x, np.clip(source, 0, length - 1).reshape(shape), axis=axis)
+    return np.where(valid, gathered, fill)
+
+
+def bin_shift(x, rng, max_shift=1):
+    """Shifts each spectrogram up/down by up to max_shift CQT bins (semitones)."""
+    shifts = rng.integers(-max_shift, max_shift + 1, size=len(x))
+    return _shift_axis(x, shifts, axis=1, fill=_floor_values(x))
+
+
+def time_shift(x, rng, max_shift=8):
+    """Shifts each spectrogram left/right by up to max_shift frames."""
+    shifts = rng.integers(-max_shift, max_shift + 1, size=len(x))
+    return _shift_axis(x, shifts, axis=2, fill=_floor_values(x))
+
+
+def random_crop(x, rng, prob=0.2, min_frames=43):
+    """For a random subset of samples, keeps only a random contiguous time crop (rest set to the floor)."""
+    num_frames = x.shape[2]
+    lengths = rng.integers(min_frames, num_frames + 1, size=len(x))
+    starts = rng.integers(0, num_frames - lengths + 1)
+    frames = np.arange(num_frames)[np.newaxis, :]
+    keep = (frames >= starts[:, np.newaxis]) & (frames < (starts + lengths)[:, np.newaxis])
+    keep |= (rng.random(len(x)) >= prob)[:, np.newaxis] # Samples not selected keep everything
+    return np.where(keep[:, np.newaxis, :, np.newaxis], x, _floor_values(x))
+
+
+def mix_noise(x, noise_bank, rng, prob=0.5, snr_db=(5.0, 30.0), gain_db=(-6.0, 6.0)):
+    """
+    Mixes randomly chosen negatives-class spectrograms into a random subset of samples.
+
+    Mixing happens in the power domain after mapping the standardized arrays back to
+    approximate dB (DB_PER_UNIT). A per-sample gain offset is applied to the signal
+    before mixing; on its own a gain would be cancelled by the per-sample
+    standardization, so it acts through the resulting signal-to-noise ratio.
+    """
+    if noise_bank is None or len(noise_bank) == 0:
+        return x
+    batch = len(x)
+    noise = noise_bank[rng.integers(0, len(noise_bank), size=batch)]
+    # Raising the signal by `gain` is the same as lowering the noise by it
+    offsets = -(rng.uniform(*gain_db, size=batch) + rng.uniform(*snr_db, size=batch)).reshape(-1, 1, 1, 1)
+    signal_db = x * DB_PER_UNIT
+    # Align the noise so that its peak sits `snr` dB below the signal's peak, shifted by the gain
+    noise_db = noise * DB_PER_UNIT
+    noise_db += (signal_db.max(axis=(1, 2, 3), keepdims=True) - noise_db.max(axis=(1, 2, 3), keepdims=True)) + offsets
+    mixed_db = 10.0 * np.logaddexp(signal_db * (np.log(10) / 10), noise_db * (np.log(10) / 10)) / np.log(10)
+    apply = (rng.random(batch) < prob).reshape(-1, 1, 1, 1)
+    return np.where(apply, mixed_db / DB_PER_UNIT, x)
+
+
+def spec_mask(x, rng, num_masks, max_width, axis):
+    """SpecAugment-style masking: sets random bands along `axis` to 0 (the per-sample mean)."""
+    length = x.shape[axis]
+    positions = np.arange(length)[np.newaxis, :]
+    masked = np.zeros((len(x), length), dtype=bool)
+    for _ in range(num_masks):
+        widths = rng.integers(0, max_width + 1, size=len(x))
+        starts = rng.integers(0, length - widths + 1)
+        masked |= (positions >= starts[:, np.newaxis]) & (positions < (starts + widths)[:, np.newaxis])
+    shape = [1] * x.ndim
+    shape[0], shape[axis] = len(x), length
+    return np.where(masked.reshape(shape), 0.0, x)
+
+
+def standardize(x):
+    """Re-standardizes each sample to zero mean / unit std, like preprocessing.normalize_cqt."""
+    mean = x.mean(axis=(1, 2, 3), keepdims=True)
+    std = x.std(axis=(1, 2, 3), keepdims=True)
+    return (x - mean) / np.maximum(std, 1e-8)
+
+
+def augment_batch(x, rng, noise_bank=None, config=DEFAULT_CONFIG):
+    """
+    Applies the full augmentation chain to a batch of shape (B, 84, 87, 1).
+
+    Args:
+        x (np.ndarray): Batch of standardized CQT arrays.
+        rng (np.random.Generator): Random generator (seed it for reproducible batches).
+        noise_bank (np.ndarray | None): Negatives-class arrays to mix in, shape (N, 84, 87, 1).
+        config (dict): Parameters, see DEFAULT_CONFIG.
+
+    Returns:
+        np.ndarray: Augmented float32 batch of the same shape.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    x = bin_shift(x, rng, config["max_bin_shift"])
+    x = time_shift(x, rng, config["max_time_shift"])
+    x = random_crop(x, rng, config["crop_prob"], config["min_crop_frames"])
+    x = mix_noise(x, noise_bank, rng, config["noise_prob"], config["snr_db"], config["gain_db"])
+    x = standardize(x)
+    x = spec_mask(x, rng, config["freq_masks"], config["max_freq_mask"], axis=1)
+    x = spec_mask(x, rng, config["time_masks"], config["max_time_mask"], axis=2)
+    return x.astype(np.float32, copy=False)
+
+
+class AugmentedSequence(PyDataset):
+    """
+    Keras dataset yielding freshly augmented batches every epoch. With workers > 1,
+    batches are prepared in background threads while the model trains (NumPy
+    releases the GIL in the heavy array operations).
+    """
+
+    def __init__(self, x, y, batch_size=16, noise_bank=None, config=DEFAULT_CONFIG, seed=0,
+                 workers=4, use_multiprocessing=False, max_queue_size=10):
+        super().__init__(workers=workers, use_multiprocessing=use_multiprocessing, max_queue_size=max_queue_size)
+        self.x = x
+        self.y = y
+        self.batch_size = batch_size
+        self.noise_bank = noise_bank
+        self.config = config
+        self.seed = seed
+        self.epoch = 0
+        self.order = np.random.default_rng(seed).permutation(len(x))
+
+    def __len__(self):
+        return int(np.ceil(len(self.x) / self.batch_size))
+
+    def __getitem__(self, index):
+        batch_idx = self.order[index * self.batch_size:(index + 1) * self.batch_size]
+        # Seed per (epoch, batch) so results don't depend on worker scheduling
+        rng = np.random.default_rng((self.seed, self.epoch, index))
+        return augment_batch(self.x[batch_idx], rng, self.noise_bank, self.config), self.y[batch_idx]
+
+    def on_epoch_end(self):
+        self.epoch += 1
+        self.order = np.random.default_rng((self.seed, self.epoch)).permutation(len(self.x))
@@ -4,7 +4,7 @@ For each file, it computes the normalized CQT spectrogram, expands its dimension
 and saves it as a NumPy array in the corresponding output directory, 
 preserving the directory structure.
 """
-from src.data_utils.preprocessing import preprocess_file
+from src.data_utils.preprocessing import preprocess_file, DEFAULT_FEATURE
 import os
 import numpy as np
 from sklearn.preprocessing import LabelEncoder
@@ -16,9 +16,14 @@ PROJECT_ROOT = ROOT_DIR
 _data_path = PROJECT_ROOT + "/data/raw/"
 _output_path = PROJECT_ROOT + "/data/preprocessed/"
 NEGATIVE_CLASS = "negatives"
+# Where each feature backend's preprocessed arrays live
+FEATURE_OUTPUT_PATHS = {
+    "cqt": _output_path,
+    "mel": PROJECT_ROOT + "/data/preprocessed_mel/",
+}
 
 
-def preprocess_and_save_wav_files(data_path, output_path):
+def preprocess_and_save_wav_files(data_path, output_path, feature=DEFAULT_FEATURE):
     """
     Processes all WAV files in the provided input directory to extract the normalized
     Constant-Q Transform (CQT) spectrogram, expands dimensions to ensure the
@@ -28,6 +33,8 @@ def preprocess_and_save_wav_files(data_path, output_path):
     Args:
         data_path (str): Path to the input directory containing WAV files.
         output_path (str): Path to the directory where processed NumPy files will be saved.
+        feature (str): Feature backend, 'cqt' (default) or 'mel' (log-mel with 84 bands,
+                       same (84, 87, 1) shape).
 
     Returns:
         None
@@ -37,7 +44,7 @@ def preprocess_and_save_wav_files(data_path, output_path):
         for filename in filenames:
             if filename.endswith(".wav"):
                 input_file_path = os.path.join(dirpath, filename)
-                cqt_normalized, _ = preprocess_file(input_file_path)
+                cqt_normalized, _ = preprocess_file(input_file_path, feature=feature)
 
                 # Handle correct path for the output
                 relative_path = os.path.relpath(dirpath, data_path)
@@ -3,13 +3,47 @@
     saves preprocessed WAV files in data/preprocessed
 """
 
+from functools import lru_cache
+
 import librosa
 import numpy as np
+import soundfile as sf
+from scipy.signal import get_window
+
+from src.data_utils.resampling import StreamingResampler, resample
+
+# --- Mel Feature Configuration ---
+MEL_N_FFT = 2048
+MEL_HOP_LENGTH = 512 # Same hop as librosa.cqt, so a 2s window gives 87 frames for both features
+MEL_N_MELS = 84 # Same number of bins as the CQT, so the model input shape (84, 87, 1) is unchanged
+MEL_TOP_DB = 80.0
+AMIN = 1e-10
+FEATURES = ('cqt', 'mel')
+DEFAULT_FEATURE = 'cqt'
+LOAD_BLOCK_FRAMES = 1 << 16 # Files are decoded and resampled in blocks of this many frames
+# ---
 
-def load_audio(file_path, sr=22050):
-    """Loads audio file and returns waveform"""
-    audio, sr = librosa.load(file_path, sr=sr)
-    return audio, sr
+def load_audio(file_path, sr=22050, mono=True):
+    """
+    Loads audio file and returns waveform (float32; (n, channels) if mono=False) and sample rate.
+    The file is decoded block by block and resampled with the same streaming polyphase
+    resampler as live capture (src/data_utils/resampling.py); sr=None keeps the file's rate.
+    """
+    try:
+        with sf.SoundFile(file_path) as f:
+            file_sr, channels = f.samplerate, f.channels
+            resampler = StreamingResampler(file_sr, sr or file_sr, channels=1 if mono else channels)
+            parts = [resampler.process(block.mean(axis=1) if mono or channels == 1 else block)
+                     for block in f.blocks(blocksize=LOAD_BLOCK_FRAMES, dtype='float32', always_2d=True)]
+            parts.append(resampler.flush())
+        audio = np.concatenate(parts)
+    except sf.LibsndfileError:
+        # Formats libsndfile can't decode: let librosa decode, then resample the same way
+        audio, file_sr = librosa.load(file_path, sr=None, mono=mono)
+        audio = resample(audio if audio.ndim == 1 else audio.T, file_sr, sr or file_sr)
+    if not mono and audio.ndim == 1:
+        audio = audio[:, np.newaxis]
+    return audio, sr or file_sr
 
 def audio_to_cqt(audio, sr):
     """Converts audio into CQT spectrogram"""
@@ -19,14 +53,64 @@ def audio_to_cqt(audio, sr):
     cqt = librosa.amplitude_to_db(librosa.cqt(harmonic, sr=sr), ref=np.max)
     return cqt
 
+@lru_cache(maxsize=8)
+def stft_window(n_fft=MEL_N_FFT):
+    """Hann analysis window, computed once per FFT size"""
+    return get_window('hann', n_fft, fftbins=True).astype(np.float32)
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sr, n_fft=MEL_N_FFT, n_mels=MEL_N_MELS):
+    """Mel filterbank matrix of shape (n_mels, 1 + n_fft // 2), computed once per configuration"""
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+
+def frame_audio(audio, n_fft=MEL_N_FFT, hop_length=MEL_HOP_LENGTH):
+    """
+    Splits audio of shape (..., n) into centered, overlapping frames of shape (..., n_frames, n_fft).
+    Frames are strided views of the padded signal, so no per-frame copies are made.
+    """
+    pad = [(0, 0)] * (audio.ndim - 1) + [(n_fft // 2, n_fft // 2)]
+    padded = np.pad(audio, pad, mode='constant')
+    return np.lib.stride_tricks.sliding_window_view(padded, n_fft, axis=-1)[..., ::hop_length, :]
+
+def power_to_db(power, top_db=MEL_TOP_DB):
+    """
+    Converts a power spectrogram (..., bins, frames) to dB relative to its maximum,
+    like librosa.power_to_db(ref=np.max), but with one reference per spectrogram
+    so a batch of channels can be converted at once.
+    """
+    ref = np.max(power, axis=(-2, -1), keepdims=True)
+    db = 10.0 * np.log10(np.maximum(power, AMIN))
+    db -= 10.0 * np.log10(np.maximum(ref, AMIN))
+    return np.maximum(db, -top_db)
+
+def audio_to_mel(audio, sr, n_fft=MEL_N_FFT, hop_length=MEL_HOP_LENGTH, n_mels=MEL_N_MELS):
+    """
+    Converts audio into a log-mel spectrogram of shape (n_mels, n_frames).
+    Uses a cached STFT window and a precomputed mel filterbank, so the mel
+    projection is a single matrix multiplication per window.
+    """
+    frames = frame_audio(np.asarray(audio, dtype=np.float32), n_fft, hop_length) * stft_window(n_fft)
+    spectrum = np.fft.rfft(frames, axis=-1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    mel = np.matmul(power, mel_filterbank(sr, n_fft, n_mels).T) # (..., n_frames, n_mels)
+    return power_to_db(np.swapaxes(mel, -1, -2))
+
+def audio_to_features(audio, sr, feature=DEFAULT_FEATURE):
+    """Computes the selected feature ('cqt' or 'mel') for an audio signal"""
+    if feature == 'cqt':
+        return audio_to_cqt(audio, sr)
+    if feature == 'mel':
+        return audio_to_mel(audio, sr)
+    raise ValueError(f"Unknown feature '{feature}', expected one of {FEATURES}")
+
 def normalize_cqt(cqt):
     """Applies standardization and returns normalized CQT spectrogram"""
     mean = np.mean(cqt)
     std = np.std(cqt)
     return (cqt - mean) / std
 
-def preprocess_file(file_path, sr=22050):
+def preprocess_file(file_path, sr=22050, feature=DEFAULT_FEATURE):
     loaded_audio, sr = load_audio(file_path, sr=sr)
-    cqt = audio_to_cqt(loaded_audio, sr)
-    cqt_normalized = normalize_cqt(cqt)
-    return cqt_normalized, sr
+    features = audio_to_features(loaded_audio, sr, feature)
+    features_normalized = normalize_cqt(features)
+    return features_normalized, sr
@@ -0,0 +1,348 @@
+"""
+SQLite index of every raw recording / chunk and the feature arrays derived from it.
+
+Instead of walking the data tree and inferring labels from directory names on
+every load, recordings are indexed once and then updated incrementally: only
+files whose size or modification time changed are re-read (header + hash), and
+rows of deleted files are removed. Training and EDA select subsets with a query
+that takes milliseconds.
+
+Layout conventions are the same as in data_loader.get_data_dir:
+    <label>/<label>-<pick>/<file>.wav   e.g. A0/A0-fpick/A0_fingerpick-01.wav
+    negatives/<file>.wav                (no pick style)
+Feature arrays mirror the raw tree under FEATURE_OUTPUT_PATHS with .npy names.
+
+Usage (from the project root):
+    python -m src.data_utils.recording_index                 # update + class counts
+    python -m src.data_utils.recording_index --label A0 --pick fpick --feature cqt
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+import soundfile as sf
+from sklearn.preprocessing import LabelEncoder
+
+from src.data_utils.data_loader import FEATURE_OUTPUT_PATHS, NEGATIVE_CLASS, _data_path
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+INDEX_ROOT = ROOT_DIR + "/data/"        # Stored paths are relative to this directory
+INDEX_PATH = INDEX_ROOT + "recordings.sqlite"
+# Chunk names written by the data collection scripts
+CHUNK_NAME_PATTERNS = (
+    re.compile(r"^(?P<source>.+)_onset_\d+_chunk\.wav$"), # extract_multi_onset_chunks.py
+    re.compile(r"^(?P<source>.+)_part\d+\.wav$"),         # split_wav_script.py
+)
+# ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    label TEXT NOT NULL,
+    pick TEXT,
+    source_file TEXT,
+    onset_sample INTEGER,
+    samplerate INTEGER,
+    num_samples INTEGER,
+    duration_sec REAL,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recordings_label ON recordings(label, pick);
+CREATE INDEX IF NOT EXISTS idx_recordings_sha1 ON recordings(sha1);
+CREATE TABLE IF NOT EXISTS features (
+    recording_id INTEGER NOT NULL REFERENCES recordings(id) ON DELETE CASCADE,
+    feature TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (recording_id, feature)
+);
+"""
+
+UPSERT_RECORDING = """
+INSERT INTO recordings (path, label, pick, source_file, onset_sample, samplerate, num_samples,
+                        duration_sec, size_bytes, mtime_ns, sha1)
+VALUES (:path, :label, :pick, :source_file, :onset_sample, :samplerate, :num_samples,
+        :duration_sec, :size_bytes, :mtime_ns, :sha1)
+ON CONFLICT(path) DO UPDATE SET
+    label = excluded.label,
+    pick = excluded.pick,
+    source_file = COALESCE(excluded.source_file, recordings.source_file),
+    onset_sample = COALESCE(excluded.onset_sample, recordings.onset_sample),
+    samplerate = excluded.samplerate,
+    num_samples = excluded.num_samples,
+    duration_sec = excluded.duration_sec,
+    size_bytes = excluded.size_bytes,
+    mtime_ns = excluded.mtime_ns,
+    sha1 = excluded.sha1
+"""
+
+
+def parse_recording_path(relative_path):
+    """
+    Derives label, pick style and source file from a path relative to the raw data directory.
+
+    Returns:
+        tuple: (label, pick, source_file); pick and source_file may be None.
+    """
+    parts = relative_path.replace(os.sep, "/").split("/")
+    label = parts[0] if len(parts) > 1 else NEGATIVE_CLASS
+    pick = None
+    if label != NEGATIVE_CLASS and len(parts) > 2:
+        pick_dir = parts[-2]
+        pick = pick_dir[len(label) + 1:] if pick_dir.startswith(label + "-") else pick_dir
+    source_file = None
+    for pattern in CHUNK_NAME_PATTERNS:
+        match = pattern.match(parts[-1])
+        if match:
+            source_file = match.group("source")
+            break
+    return label, pick, source_file
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha1").hexdigest()
+
+
+class RecordingIndex:
+    def __init__(self, index_path=INDEX_PATH, root=INDEX_ROOT):
+        self.root = os.path.abspath(root)
+        self.conn = sqlite3.connect(index_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL") # Readers don't block an update
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # --- Paths ---
+    def key(self, path):
+        """Path as stored in the index: relative to the index root (posix), or absolute if outside it."""
+        path = os.path.abspath(path)
+        relative = os.path.relpath(path, self.root)
+        if relative.startswith(".."):
+            return path.replace(os.sep, "/")
+        return relative.replace(os.sep, "/")
+
+    def resolve(self, key):
+        return key if os.path.isabs(key) else os.path.join(self.root, key)
+
+    # --- Updating ---
+    def _recording_row(self, path, stat, label, pick, source_file, onset_sample=None):
+        info = sf.info(path)
+        return {
+            "path": self.key(path),
+            "label": label,
+            "pick": pick,
+            "source_file": source_file,
+            "onset_sample": onset_sample,
+            "samplerate": info.samplerate,
+            "num_samples": info.frames,
+            "duration_sec": info.frames / info.samplerate,
+            "size_bytes": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha1": file_sha1(path),
+        }
+
+    def update(self, data_path=_data_path, features=FEATURE_OUTPUT_PATHS):
+        """
+        Incrementally syncs the index with the WAV files under data_path and their
+        feature arrays. Unchanged files (same size and mtime) are not opened.
+
+        Returns:
+            dict: Counts of added / updated / unchanged / removed recordings and feature rows.
+        """
+        start = time.perf_counter()
+        prefix = self.key(data_path).rstrip("/") + "/"
+        prefix = "" if prefix == "./" else prefix
+        known = {row["path"]: (row["size_bytes"], row["mtime_ns"]) for row in self.conn.execute(
+            "SELECT path, size_bytes, mtime_ns FROM recordings WHERE path LIKE ? || '%'", (prefix,))}
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "features": 0, "features_removed": 0}
+
+        seen = set()
+        rows = []
+        for dirpath, _, files in os.walk(data_path):
+            for filename in files:
+                if not filename.endswith(".wav"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                key = self.key(path)
+                seen.add(key)
+                stat = os.stat(path)
+                if known.get(key) == (stat.st_size, stat.st_mtime_ns):
+                    stats["unchanged"] += 1
+                    continue
+                stats["updated" if key in known else "added"] += 1
+                label, pick, source_file = parse_recording_path(os.path.relpath(path, data_path))
+                rows.append(self._recording_row(path, stat, label, pick, source_file))
+
+        removed = [(key,) for key in known if key not in seen]
+        stats["removed"] = len(removed)
+        with self.conn:
+            self.conn.executemany(UPSERT_RECORDING, rows)
+            self.conn.executemany("DELETE FROM recordings WHERE path = ?", removed)
+            for feature, output_path in features.items():
+                feature_stats = self._update_features(feature, data_path, output_path)
+                stats["features"] += feature_stats[0]
+                stats["features_removed"] += feature_stats[1]
+        stats["elapsed_sec"] = time.perf_counter() - start
+        return stats
+
+    def _update_features(self, feature, data_path, output_path):
+        """Links <output_path>/<relpath>.npy to the recording <data_path>/<relpath>.wav."""
+        if not os.path.isdir(output_path):
+            return 0, 0
+        ids = {row["path"]: row["id"] for row in self.conn.execute("SELECT id, path FROM recordings")}
+        known = {row["recording_id"]: row["mtime_ns"] for row in self.conn.execute(
+            "SELECT recording_id, mtime_ns FROM features WHERE feature = ?", (feature,))}
+        seen = set()
+        rows = []
+        for dirpath, _, files in os.walk(output_path):
+            for filename in files:
+                if not filename.endswith(".npy"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                relative = os.path.relpath(path, output_path)[:-len(".npy")] + ".wav"
+                recording_id = ids.get(self.key(os.path.join(data_path, relative)))
+                if recording_id is None:
+                    continue # Array without a (known) source recording
+                seen.add(recording_id)
+                mtime_ns = os.stat(path).st_mtime_ns
+                if known.get(recording_id) != mtime_ns:
+                    rows.append((recording_id, feature, self.key(path), mtime_ns))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO features (recording_id, feature, path, mtime_ns) VALUES (?, ?, ?, ?)", rows)
+        removed = [(recording_id, feature) for recording_id in known if recording_id not in seen]
+        self.conn.executemany("DELETE FROM features WHERE recording_id = ? AND feature = ?", removed)
+        return len(rows), len(removed)
+
+    def add_chunk(self, path, label, pick=None, source_file=None, onset_sample=None):
+        """Registers a freshly written chunk with metadata only its writer knows (e.g. the exact onset)."""
+        row = self._recording_row(path, os.stat(path), label, pick, source_file, onset_sample)
+        with self.conn:
+            self.conn.execute(UPSERT_RECORDING, row)
+
+    # --- Queries ---
+    def select(self, labels=None, pick=None, feature=None, source_file=None,
+               min_duration=None, max_duration=None):
+        """
+        Returns matching recordings as dicts, ordered by label and path.
+
+        Args:
+            labels (list[str] | None): Keep only these labels.
+            pick (str | None): Keep only this pick style ('fpick'/'npick'); recordings
+                               without a pick style (negatives) always match.
+            feature (str | None): Keep only recordings with this feature computed and
+                                  add its absolute 'feature_path'.
+            source_file (str | None): Keep only chunks cut from this source recording.
+            min_duration, max_duration (float | None): Duration bounds in seconds.
+        """
+        query = "SELECT r.*" + (", f.path AS feature_path" if feature else "") + " FROM recordings r"
+        conditions, params = [], []
+        if feature:
+            query += " JOIN features f ON f.recording_id = r.id AND f.feature = ?"
+            params.append(feature)
+        if labels:
+            conditions.append(f"r.label IN ({', '.join('?' * len(labels))})")
+            params.extend(labels)
+        if pick:
+            conditions.append("(r.pick = ? OR r.pick IS NULL)")
+            params.append(pick)
+        if source_file:
+            conditions.append("r.source_file = ?")
+            params.append(source_file)
+        if min_duration is not None:
+            conditions.append("r.duration_sec >= ?")
+            params.append(min_duration)
+        if max_duration is not None:
+            conditions.append("r.duration_sec <= ?")
+            params.append(max_duration)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY r.label, r.path"
+
+        results = []
+        for row in self.conn.execute(query, params):
+            result = dict(row)
+            if feature:
+                result["feature_path"] = self.resolve(result["feature_path"])
+            results.append(result)
+        return results
+
+    def load_xy(self, feature="cqt", **filters):
+        """
+        Loads the feature arrays of the selected recordings, like data_loader.get_xy.
+
+        Returns:
+            tuple: (X, y) with y encoded by LabelEncoder (class names sorted).
+        """
+        rows = self.select(feature=feature, **filters)
+        if not rows:
+            raise ValueError(f"No indexed '{feature}' arrays match {filters}")
+        X = np.stack([np.load(row["feature_path"]) for row in rows])
+        y = LabelEncoder().fit_transform([row["label"] for row in rows])
+        return X, y
+
+    def class_counts(self, feature=None, by_pick=False):
+        """Number of recordings (or of computed feature arrays) per label, or per (label, pick)."""
+        columns = "r.label, r.pick" if by_pick else "r.label"
+        query = f"SELECT {columns}, COUNT(*) AS n FROM recordings r"
+        params = []
+        if feature:
+            query += " JOIN features f ON f.recording_id = r.id AND f.feature = ?"
+            params.append(feature)
+        query += f" GROUP BY {columns} ORDER BY {columns}"
+        rows = self.conn.execute(query, params).fetchall()
+        if by_pick:
+            return {(row["label"], row["pick"]): row["n"] for row in rows}
+        return {row["label"]: row["n"] for row in rows}
+
+    def duplicates(self):
+        """Groups of recordings with identical content (same SHA-1)."""
+        rows = self.conn.execute(
+            "SELECT sha1, GROUP_CONCAT(path, '|') AS paths FROM recordings "
+            "GROUP BY sha1 HAVING COUNT(*) > 1").fetchall()
+        return [row["paths"].split("|") for row in rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Update and query the recording index.")
+    parser.add_argument("--data_path", type=str, default=_data_path, help="Raw WAV directory to index.")
+    parser.add_argument("--label", nargs="+", default=None, help="Only list these labels.")
+    parser.add_argument("--pick", type=str, default=None, help="Only list this pick style (fpick/npick).")
+    parser.add_argument("--feature", choices=sorted(FEATURE_OUTPUT_PATHS), default=None,
+                        help="Only list recordings with this feature computed.")
+    args = parser.parse_args()
+
+    with RecordingIndex() as index:
+        stats = index.update(args.data_path)
+        print(f"Index updated in {stats['elapsed_sec'] * 1000:.1f} ms: {stats['added']} added, "
+              f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['removed']} removed, "
+              f"{stats['features']} feature arrays linked")
+        if args.label or args.pick or args.feature:
+            start = time.perf_counter()
+            rows = index.select(labels=args.label, pick=args.pick, feature=args.feature)
+            print(f"{len(rows)} recordings match ({(time.perf_counter() - start) * 1000:.2f} ms):")
+            for row in rows:
+                print(f"  {row['path']}  {row['duration_sec']:.2f}s")
+        else:
+            for (label, pick), count in index.class_counts(by_pick=True).items():
+                print(f"{label:<10}{pick or '':<8}{count:>6}")
+        for group in index.duplicates():
+            print(f"Duplicate recordings: {', '.join(group)}")
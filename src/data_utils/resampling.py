@@ -0,0 +1,128 @@
+"""
+Stateful streaming polyphase resampling between arbitrary integer rates.
+
+StreamingResampler converts audio fed in arbitrary chunks (e.g. 44.1 or 48 kHz
+device blocks) to the model's 22,050 Hz. It uses the same Kaiser-windowed sinc
+low-pass and delay compensation as scipy.signal.resample_poly, so the
+concatenated output of any chunking equals resample_poly() of the whole signal
+to float32 rounding. State that crosses chunk boundaries is carried explicitly:
+    - the last taps - 1 input frames (the filter history)
+    - the absolute input and output positions, which select each output's
+      polyphase branch (the phase pattern repeats every `up` outputs)
+Every output frame costs one dot product of `taps` input frames, so the cost of
+a chunk only depends on its length, never on how much audio came before.
+The first delay_frames outputs of a stream are the filter's warm-up and are
+dropped, which makes the live output start that many input frames late
+(< 1 ms for 44.1/48 kHz -> 22,050 Hz); flush() returns the tail at the end.
+
+Multi-channel audio is (frames, channels), like the capture ring buffer.
+"""
+
+from math import gcd
+
+import numpy as np
+from scipy.signal import firwin
+
+# --- Configuration (scipy.signal.resample_poly defaults) ---
+HALF_WIDTH_ZEROS = 10           # Filter half-length in zero crossings of the lower of the two rates
+DEFAULT_WINDOW = ('kaiser', 5.0)
+MAX_BLOCK_FRAMES = 1 << 16      # Longer inputs are processed in blocks, bounding the gathered windows' memory
+# ---
+
+
+def polyphase_filter(up, down, window=DEFAULT_WINDOW):
+    """
+    Anti-aliasing low-pass for resampling by up/down, as designed by resample_poly().
+
+    Returns:
+        tuple: (filter taps as float64, filter delay in output frames). The filter is
+               front-padded so the delay is a whole number of output frames.
+    """
+    max_rate = max(up, down)
+    half_len = HALF_WIDTH_ZEROS * max_rate
+    taps = firwin(2 * half_len + 1, 1.0 / max_rate, window=window) * up
+    pre_pad = down - half_len % down
+    return np.concatenate([np.zeros(pre_pad), taps]), (half_len + pre_pad) // down
+
+
+class StreamingResampler:
+    def __init__(self, orig_sr: int, target_sr: int, channels: int = 1, window=DEFAULT_WINDOW):
+        divisor = gcd(int(orig_sr), int(target_sr))
+        self.orig_sr = int(orig_sr)
+        self.target_sr = int(target_sr)
+        self.up = self.target_sr // divisor
+        self.down = self.orig_sr // divisor
+        self.channels = channels
+        self._frame_shape = (channels,) if channels > 1 else ()
+        if self.up == self.down: # Same rate: process() passes chunks through
+            taps, self.delay_frames = np.ones(1), 0
+        else:
+            taps, self.delay_frames = polyphase_filter(self.up, self.down, window)
+        taps = np.pad(taps, (0, -len(taps) % self.up))
+        self.taps = len(taps) // self.up
+        # Branch p holds taps p, p + up, ...; reversed, so it weighs a window of inputs oldest first
+        self._branches = np.ascontiguousarray(taps.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        """Forgets the stream: the next chunk starts a new signal."""
+        self._history = np.zeros((self.taps - 1,) + self._frame_shape, dtype=np.float32)
+        self._in_pos = 0  # Input frames consumed so far
+        self._out_pos = 0 # Output frames computed so far, including the dropped warm-up
+
+    def output_length(self, input_frames):
+        """Frames resample_poly() produces for input_frames input frames."""
+        return -(-input_frames * self.up // self.down)
+
+    def process(self, chunk):
+        """
+        Resamples the next chunk of the stream.
+
+        Args:
+            chunk (np.ndarray): float audio, (frames,) or (frames, channels).
+
+        Returns:
+            np.ndarray: float32 output frames that are complete so far (may be empty).
+        """
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self.up == self.down:
+            return chunk
+        if len(chunk) == 0:
+            return np.zeros((0,) + self._frame_shape, dtype=np.float32)
+        if len(chunk) > MAX_BLOCK_FRAMES:
+            return np.concatenate([self.process(chunk[start:start + MAX_BLOCK_FRAMES])
+                                   for start in range(0, len(chunk), MAX_BLOCK_FRAMES)])
+        buffered = np.concatenate([self._history, chunk])
+        end = -(-(self._in_pos + len(chunk)) * self.up // self.down) # Outputs whose newest input has arrived
+        positions = np.arange(self._out_pos, end, dtype=np.int64) * self.down
+        newest_input, branch = np.divmod(positions, self.up)
+        # Window i of `buffered` ends at input frame _in_pos + i
+        windows = np.lib.stride_tricks.sliding_window_view(buffered, self.taps, axis=0)[newest_input - self._in_pos]
+        if self.channels > 1:
+            out = np.einsum('nck,nk->nc', windows, self._branches[branch])
+        else:
+            out = np.einsum('nk,nk->n', windows, self._branches[branch])
+        skip = max(0, self.delay_frames - self._out_pos)
+        self._history = buffered[len(buffered) - (self.taps - 1):]
+        self._in_pos += len(chunk)
+        self._out_pos = end
+        return out[skip:]
+
+    def flush(self):
+        """Returns the outputs still held back by the filter delay and resets the stream."""
+        # _out_pos counts the dropped warm-up frames too, so only those past delay_frames were returned
+        remaining = self.output_length(self._in_pos) - max(0, self._out_pos - self.delay_frames)
+        if self.up == self.down or self._in_pos == 0 or remaining <= 0:
+            self.reset()
+            return np.zeros((0,) + self._frame_shape, dtype=np.float32)
+        padding = -(-remaining * self.down // self.up) + self.taps
+        out = self.process(np.zeros((padding,) + self._frame_shape, dtype=np.float32))
+        self.reset()
+        return out[:remaining]
+
+
+def resample(audio, orig_sr, target_sr):
+    """Resamples a whole signal ((frames,) or (frames, channels)) with one StreamingResampler pass."""
+    audio = np.asarray(audio, dtype=np.float32)
+    resampler = StreamingResampler(orig_sr, target_sr, channels=audio.shape[1] if audio.ndim == 2 else 1)
+    return np.concatenate([resampler.process(audio), resampler.flush()])
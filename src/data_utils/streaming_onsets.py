@@ -0,0 +1,178 @@
+"""
+Block-streaming onset detection with bounded memory.
+
+StreamingOnsetDetector reproduces librosa.onset.onset_detect(backtrack=True)
+(mel spectral-flux onset strength + peak picking + backtracking to the
+preceding envelope minimum) on audio fed in arbitrary blocks. All state that
+crosses block boundaries is carried explicitly:
+    - the unframed tail of the signal (n_fft - hop samples), so STFT frames
+      are identical to framing the whole file at once
+    - the previous dB frame for the spectral flux
+    - a short onset-envelope history for the peak picker's pre/post windows
+    - the last envelope minimum for backtracking and the last onset for `wait`
+Differences to the offline detector: librosa clips the dB spectrogram relative
+to its global maximum and normalizes the envelope by its global maximum. Here
+the dB floor follows the running maximum up to each frame, and the envelope of
+frame n is normalized by its maximum up to n + NORMALIZATION_LOOKAHEAD_SEC. Both
+are defined per frame, so the onsets do not depend on the block size, and they
+only differ from the offline ones before the loudest event of a recording.
+Onsets are reported NORMALIZATION_LOOKAHEAD_SEC after they occur.
+"""
+
+import numpy as np
+
+from src.data_utils.preprocessing import mel_filterbank, stft_window
+
+# --- Configuration (librosa.onset defaults) ---
+ONSET_N_FFT = 2048
+ONSET_HOP_LENGTH = 512
+ONSET_N_MELS = 128
+ONSET_TOP_DB = 80.0
+ONSET_DELTA = 0.07
+AMIN = 1e-10
+NORMALIZATION_LOOKAHEAD_SEC = 3.0
+# ---
+
+
+class StreamingOnsetDetector:
+    def __init__(self, sr, hop_length=ONSET_HOP_LENGTH, n_fft=ONSET_N_FFT, n_mels=ONSET_N_MELS,
+                 delta=ONSET_DELTA, backtrack=True):
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.delta = delta
+        self.backtrack = backtrack
+        # Peak picking windows in frames, as in librosa.onset.onset_detect
+        self.pre_max = int(np.ceil(0.03 * sr // hop_length))
+        self.post_max = int(np.ceil(0.00 * sr // hop_length + 1))
+        self.pre_avg = int(np.ceil(0.10 * sr // hop_length))
+        self.post_avg = int(np.ceil(0.10 * sr // hop_length + 1))
+        self.wait = int(np.ceil(0.03 * sr // hop_length))
+        self.lookahead = max(self.post_max, self.post_avg,
+                             int(round(NORMALIZATION_LOOKAHEAD_SEC * sr / hop_length)))
+        # Envelope frames are delayed by lag + n_fft // (2 * hop) relative to the spectrogram
+        self.env_delay = 1 + n_fft // (2 * hop_length)
+
+        self._window = stft_window(n_fft)
+        self._mel_basis = mel_filterbank(sr, n_fft, n_mels)
+
+        # Framing state: padded signal starting at sample frames_done * hop of the padded stream
+        self._signal = np.zeros(n_fft // 2, dtype=np.float32) # Center padding at the stream start
+        self.frames_done = 0
+        self._prev_db = None
+        self._db_max = -np.inf
+        # Onset envelope state
+        self._env = np.zeros(self.env_delay, dtype=np.float64) # Leading zeros (lag + centering)
+        self._env_offset = 0      # Frame index of self._env[0]
+        self._env_max = 0.0       # Envelope maximum over frames [0, _env_max_end)
+        self._env_max_end = 0
+        self._next_frame = 0      # First frame not yet decided by the peak picker
+        self._last_onset = None   # Last picked peak (frame), for `wait`
+        self._last_minimum = 0    # Last envelope minimum (frame), for backtracking
+        self.onsets_found = 0
+
+    # --- Onset strength ---
+    def _onset_strength(self, frames):
+        """Spectral flux of new STFT frames, appended to the (not yet released) envelope."""
+        spectrum = np.fft.rfft(frames * self._window, axis=-1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        db = 10.0 * np.log10(np.maximum(AMIN, power @ self._mel_basis.T))
+        # Clip top_db below the running maximum up to each frame
+        running_max = np.maximum.accumulate(np.maximum(db.max(axis=-1), self._db_max))
+        self._db_max = float(running_max[-1])
+        np.maximum(db, running_max[:, np.newaxis] - ONSET_TOP_DB, out=db)
+
+        previous = db if self._prev_db is None else np.vstack([self._prev_db[np.newaxis], db])
+        flux = np.maximum(0.0, previous[1:] - previous[:-1]).mean(axis=-1)
+        self._prev_db = db[-1]
+        self._env = np.concatenate([self._env, flux])
+
+    def _consume(self, final=False):
+        """Frames the buffered signal into as many complete STFT frames as possible."""
+        if final:
+            self._signal = np.concatenate([self._signal, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        if len(self._signal) < self.n_fft:
+            return
+        count = (len(self._signal) - self.n_fft) // self.hop_length + 1
+        frames = np.lib.stride_tricks.sliding_window_view(self._signal, self.n_fft)[::self.hop_length][:count]
+        self._onset_strength(frames)
+        self.frames_done += count
+        self._signal = self._signal[count * self.hop_length:].copy()
+
+    # --- Peak picking ---
+    def _pick(self, final=False):
+        """Decides every frame with enough look-ahead; returns backtracked onset frames."""
+        end = self.frames_done # Envelope values past the spectrogram length are trimmed, as offline
+        stop = end if final else end - self.lookahead
+        start = self._next_frame
+        if stop <= start:
+            return []
+
+        env = self._env
+        offset = self._env_offset
+        frames = np.arange(start, stop)
+        values = env[frames - offset]
+        # Normalization scale of frame n: envelope maximum over [0, n + lookahead)
+        last = min(stop + self.lookahead - 1, end)
+        running_max = np.maximum.accumulate(
+            np.concatenate([[self._env_max], env[self._env_max_end - offset:last - offset]]))
+        scale_at = np.minimum(frames + self.lookahead - 1, end) - self._env_max_end
+        scale = running_max[scale_at] + np.finfo(np.float64).tiny
+        self._env_max, self._env_max_end = float(running_max[-1]), last
+
+        # 1. Local maximum over [n - pre_max, n + post_max)
+        local_max = np.full(len(frames), -np.inf)
+        for k in range(-self.pre_max, self.post_max):
+            neighbours = frames + k
+            valid = (neighbours >= 0) & (neighbours < end)
+            local_max = np.maximum(local_max, np.where(valid, env[np.clip(neighbours - offset, 0, len(env) - 1)],
+                                                       -np.inf))
+        # 2. Above the mean over [n - pre_avg, n + post_avg) by delta (on the normalized envelope)
+        cumulative = np.concatenate([[0.0], np.cumsum(env[:end - offset])])
+        low = np.maximum(frames - self.pre_avg, 0)
+        high = np.minimum(frames + self.post_avg, end)
+        mean = (cumulative[high - offset] - cumulative[low - offset]) / (high - low)
+        candidates = frames[(values == local_max) & (values / scale >= mean / scale + self.delta)]
+
+        # 3. At least `wait` frames after the previous onset (greedy, across blocks)
+        peaks = []
+        for frame in candidates:
+            if self._last_onset is None or frame > self._last_onset + self.wait:
+                peaks.append(int(frame))
+                self._last_onset = int(frame)
+
+        if self.backtrack:
+            # Envelope minima: e[i] <= e[i-1] and e[i] < e[i+1]; the last frame is never one
+            inner = frames[(frames >= 1) & (frames < end - 1)]
+            at = inner - offset
+            minima = inner[(env[at] <= env[at - 1]) & (env[at] < env[at + 1])]
+            if peaks:
+                positions = np.searchsorted(minima, peaks, side='right') - 1
+                peaks = [int(minima[p]) if p >= 0 else self._last_minimum for p in positions]
+            if len(minima):
+                self._last_minimum = int(minima[-1])
+
+        self._next_frame = stop
+        # Keep just enough history for the pre-windows of the next frames
+        keep_from = max(0, stop - max(self.pre_max, self.pre_avg) - 1)
+        self._env = self._env[keep_from - offset:]
+        self._env_offset = keep_from
+        self.onsets_found += len(peaks)
+        return peaks
+
+    # --- Public API ---
+    def process(self, samples):
+        """
+        Feeds a block of mono samples.
+
+        Returns:
+            list[int]: Onset positions (in samples from the stream start) decided by this block.
+        """
+        self._signal = np.concatenate([self._signal, np.asarray(samples, dtype=np.float32)])
+        self._consume()
+        return [frame * self.hop_length for frame in self._pick()]
+
+    def flush(self):
+        """Ends the stream and returns the remaining onsets."""
+        self._consume(final=True)
+        return [frame * self.hop_length for frame in self._pick(final=True)]
@@ -0,0 +1,121 @@
+"""
+    Synthetic plucked-string audio (Karplus-Strong) for driving the pipeline
+    without a microphone, e.g. in benchmarks and headless test runs.
+"""
+
+import numpy as np
+from scipy.signal import lfilter
+
+# --- Configuration ---
+SAMPLE_RATE = 22050
+# Fundamental frequencies (Hz) of the 6 open strings in standard tuning
+OPEN_STRING_FREQUENCIES = {
+    "E2": 82.41,
+    "A2": 110.00,
+    "D3": 146.83,
+    "G3": 196.00,
+    "B3": 246.94,
+    "E4": 329.63,
+}
+DEFAULT_DECAY = 0.996 # Loop gain of the string model, closer to 1.0 = longer sustain
+# ---
+
+
+def pluck(frequency, duration_sec, sr=SAMPLE_RATE, decay=DEFAULT_DECAY, amplitude=0.5, seed=None):
+    """
+    Synthesizes a single plucked string note using the Karplus-Strong algorithm.
+
+    Args:
+        frequency (float): Fundamental frequency of the note in Hz.
+        duration_sec (float): Length of the generated signal in seconds.
+        sr (int): Sample rate in Hz.
+        decay (float): Feedback gain of the delay line (0 < decay < 1).
+        amplitude (float): Peak amplitude of the initial noise burst.
+        seed (int | None): Seed for the excitation noise, for reproducible output.
+
+    Returns:
+        np.ndarray: float32 waveform of length int(duration_sec * sr).
+    """
+    num_samples = int(duration_sec * sr)
+    delay = max(2, int(round(sr / frequency)))
+    rng = np.random.default_rng(seed)
+
+    # White noise burst one period long excites the string
+    excitation = np.zeros(num_samples, dtype=np.float64)
+    burst_len = min(delay, num_samples)
+    excitation[:burst_len] = rng.uniform(-amplitude, amplitude, burst_len)
+
+    # y[n] = x[n] + decay/2 * (y[n - delay] + y[n - delay - 1])
+    feedback = np.zeros(delay + 2)
+    feedback[0] = 1.0
+    feedback[delay] = -0.5 * decay
+    feedback[delay + 1] = -0.5 * decay
+    return lfilter([1.0], feedback, excitation).astype(np.float32)
+
+
+def pluck_sequence(notes, note_duration_sec=0.5, sr=SAMPLE_RATE, noise_level=0.005, seed=None):
+    """
+    Concatenates plucked notes into one continuous signal with a little background noise.
+
+    Args:
+        notes (list[str | None]): String names from OPEN_STRING_FREQUENCIES, or None for silence.
+        note_duration_sec (float): Duration of each note/silence slot in seconds.
+        sr (int): Sample rate in Hz.
+        noise_level (float): Standard deviation of the added background noise.
+        seed (int | None): Seed for reproducible output.
+
+    Returns:
+        np.ndarray: float32 waveform.
+    """
+    rng = np.random.default_rng(seed)
+    slot_samples = int(note_duration_sec * sr)
+    out = np.zeros(slot_samples * len(notes), dtype=np.float32)
+    for i, note in enumerate(notes):
+        if note is None:
+            continue
+        note_seed = int(rng.integers(0, 2**31 - 1))
+        out[i * slot_samples:(i + 1) * slot_samples] = pluck(OPEN_STRING_FREQUENCIES[note], note_duration_sec,
+                                                             sr=sr, seed=note_seed)
+    if noise_level > 0:
+        out += rng.normal(0.0, noise_level, out.size).astype(np.float32)
+    return out
+
+
+def random_pluck_sequence(duration_sec, sr=SAMPLE_RATE, note_duration_sec=0.5, silence_prob=0.2, seed=None):
+    """
+    Generates duration_sec of randomly chosen open string plucks (with some silent slots).
+
+    Returns:
+        np.ndarray: float32 waveform of length int(duration_sec * sr).
+    """
+    rng = np.random.default_rng(seed)
+    num_slots = int(np.ceil(duration_sec / note_duration_sec))
+    names = list(OPEN_STRING_FREQUENCIES)
+    notes = [None if rng.random() < silence_prob else names[rng.integers(len(names))]
+             for _ in range(num_slots)]
+    audio = pluck_sequence(notes, note_duration_sec=note_duration_sec, sr=sr,
+                           seed=int(rng.integers(0, 2**31 - 1)))
+    return audio[:int(duration_sec * sr)]
+
+
+def random_hexaphonic_sequence(duration_sec, strings, sr=SAMPLE_RATE, note_duration_sec=0.5, silence_prob=0.2,
+                               seed=None):
+    """
+    Multi-channel counterpart of random_pluck_sequence(), like a hexaphonic pickup:
+    channel c only carries the plucks of strings[c] (plus its own background noise),
+    and each slot plucks one random string or stays silent.
+
+    Args:
+        strings (list[str]): String name per channel, from OPEN_STRING_FREQUENCIES.
+
+    Returns:
+        np.ndarray: float32 array of shape (int(duration_sec * sr), len(strings)).
+    """
+    rng = np.random.default_rng(seed)
+    num_slots = int(np.ceil(duration_sec / note_duration_sec))
+    chosen = [None if rng.random() < silence_prob else strings[rng.integers(len(strings))]
+              for _ in range(num_slots)]
+    channels = [pluck_sequence([note if note == string else None for note in chosen],
+                               note_duration_sec=note_duration_sec, sr=sr, seed=int(rng.integers(0, 2**31 - 1)))
+                for string in strings]
+    return np.stack(channels, axis=1)[:int(duration_sec * sr)]
@@ -0,0 +1,218 @@
+"""
+    Two-stage cascade inference: a linear gate on pooled CQT in front of the CNN.
+
+    Most live ticks are silence, noise or the sustain of a note that was already
+    classified. The gate pools each (bins, frames) feature window over time (mean
+    and max per bin), which costs well under a millisecond, and decides per tick:
+        'negative'  - a logistic-regression classifier is confident the window is
+                      the negative class; the CNN is skipped and the negative
+                      class is reported
+        'unchanged' - the pooled spectrum is still close (cosine distance) to the
+                      window the CNN last classified; its output is reused, at
+                      most max_reuse_ticks times in a row
+        'full'      - anything else goes to the CNN (stage two)
+    The negative threshold is calibrated on held-out data so that at most
+    1 - target_recall of the note windows are gated away.
+
+    Training (from the project root):
+        python -m src.model.train --cascade_gate            # CNN, then the gate
+        python -m src.model.train --gate_only               # gate for the existing models/updated_model.h5
+    Report on the labeled corpus:
+        python -m src.model.cascade --model models/updated_model.h5 --gate models/cascade_gate.npz
+    benchmarks/bench_cascade.py replays a WAV through the live preprocessing to
+    measure the 'unchanged' path, which needs consecutive ticks.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+GATE_PATH = ROOT_DIR + "/models/cascade_gate.npz"
+DEFAULT_TARGET_RECALL = 0.99   # Note windows that must still reach the CNN (validation set)
+DEFAULT_CHANGE_THRESHOLD = 0.005 # Cosine distance between pooled spectra below which a window counts as unchanged
+DEFAULT_MAX_REUSE_TICKS = 10   # Re-run the CNN at least every N+1 ticks during a sustain
+DECISIONS = ('negative', 'unchanged', 'full')
+# ---
+
+
+def pool_features(features):
+    """
+    Time-pooled gate input: mean and max over frames for every bin.
+
+    Accepts one window (bins, frames) / (bins, frames, 1) or a batch
+    (n, bins, frames[, 1]); returns (2 * bins,) or (n, 2 * bins).
+    """
+    features = np.asarray(features, dtype=np.float32)
+    if features.shape[-1] == 1:
+        features = features[..., 0]
+    return np.concatenate([features.mean(axis=-1), features.max(axis=-1)], axis=-1)
+
+
+class CascadeGate:
+    def __init__(self, mean, scale, coef, intercept, negative_threshold, negative_label, num_classes,
+                 change_threshold=DEFAULT_CHANGE_THRESHOLD, max_reuse_ticks=DEFAULT_MAX_REUSE_TICKS):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = float(intercept)
+        self.negative_threshold = float(negative_threshold)
+        self.negative_label = int(negative_label)
+        self.num_classes = int(num_classes)
+        self.change_threshold = float(change_threshold)
+        self.max_reuse_ticks = int(max_reuse_ticks)
+        self._negative_output = np.zeros((1, self.num_classes), dtype=np.float32)
+        self._negative_output[0, self.negative_label] = 1.0
+        self.reset()
+
+    def reset(self):
+        """Forgets the last classified window (e.g. after a model swap)."""
+        self._reference = None
+        self._reuse_count = 0
+        self.counts = dict.fromkeys(DECISIONS, 0)
+
+    # --- Stage one ---
+    def negative_probability(self, pooled):
+        z = ((pooled - self.mean) / self.scale) @ self.coef + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def decide(self, features):
+        """
+        Decision for one feature window. 'full' makes this window the reference
+        for the following 'unchanged' checks, so the caller is expected to run
+        the CNN whenever 'full' is returned.
+        """
+        pooled = pool_features(features)
+        if self.negative_probability(pooled) >= self.negative_threshold:
+            decision = 'negative'
+            self._reference = None
+        elif self._reference is not None and self._reuse_count < self.max_reuse_ticks and \
+                self._distance(pooled) < self.change_threshold:
+            decision = 'unchanged'
+            self._reuse_count += 1
+        else:
+            decision = 'full'
+            self._reference = pooled
+            self._reuse_count = 0
+        self.counts[decision] += 1
+        return decision
+
+    def _distance(self, pooled):
+        reference = self._reference
+        denominator = float(np.linalg.norm(pooled) * np.linalg.norm(reference))
+        if denominator < 1e-12:
+            return 0.0 if np.array_equal(pooled, reference) else 1.0
+        return 1.0 - float(pooled @ reference) / denominator
+
+    def negative_output(self):
+        """Softmax-shaped (1, num_classes) output reported for gated negatives."""
+        return self._negative_output
+
+    def get_stats(self):
+        total = sum(self.counts.values())
+        stats = dict(self.counts)
+        stats['stage2_fraction'] = self.counts['full'] / total if total else None
+        return stats
+
+    # --- Persistence ---
+    def save(self, path=GATE_PATH):
+        np.savez(path, mean=self.mean, scale=self.scale, coef=self.coef, intercept=self.intercept,
+                 negative_threshold=self.negative_threshold, negative_label=self.negative_label,
+                 num_classes=self.num_classes, change_threshold=self.change_threshold,
+                 max_reuse_ticks=self.max_reuse_ticks)
+
+    @classmethod
+    def load(cls, path=GATE_PATH, **overrides):
+        with np.load(path) as data:
+            params = {key: data[key] for key in data.files}
+        params.update(overrides)
+        return cls(**params)
+
+
+def train_gate(x_train, y_train, x_val, y_val, negative_label, num_classes, target_recall=DEFAULT_TARGET_RECALL,
+               **gate_kwargs):
+    """
+    Fits the negative-vs-note logistic regression on pooled features and
+    calibrates its threshold on the validation set.
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    pooled_train = pool_features(x_train)
+    mean = pooled_train.mean(axis=0)
+    scale = pooled_train.std(axis=0) + 1e-6
+    classifier = LogisticRegression(max_iter=1000, class_weight='balanced')
+    classifier.fit((pooled_train - mean) / scale, np.asarray(y_train) == negative_label)
+
+    gate = CascadeGate(mean, scale, classifier.coef_[0], classifier.intercept_[0], 1.0, negative_label, num_classes,
+                       **gate_kwargs)
+    # Lowest threshold that still sends target_recall of the validation notes to the CNN
+    notes = pool_features(np.asarray(x_val)[np.asarray(y_val) != negative_label])
+    note_probabilities = gate.negative_probability(notes) if len(notes) else np.zeros(1)
+    gate.negative_threshold = max(0.5, float(np.quantile(note_probabilities, target_recall)) + 1e-6)
+    return gate
+
+
+def evaluate_cascade(model, gate, X, y, batch_size=256):
+    """
+    Stage-one accuracy impact on independent labeled windows: every window is
+    gated on its own (no 'unchanged' reuse, which needs consecutive ticks) and
+    compared with running the CNN on all of them.
+    """
+    from src.model.evaluate import predict_batched
+
+    softmax, _ = predict_batched(model, X, batch_size)
+    full_pred = softmax.argmax(axis=1)
+    pooled = pool_features(X)
+    start = time.perf_counter()
+    gated = gate.negative_probability(pooled) >= gate.negative_threshold
+    gate_ms = (time.perf_counter() - start) * 1000.0 / max(len(X), 1)
+    cascade_pred = np.where(gated, gate.negative_label, full_pred)
+    y = np.asarray(y)
+    notes = y != gate.negative_label
+    return {
+        'samples': int(len(y)),
+        'stage2_fraction': float(1.0 - gated.mean()) if len(y) else None,
+        'full_accuracy': float((full_pred == y).mean()),
+        'cascade_accuracy': float((cascade_pred == y).mean()),
+        'notes_gated': int((gated & notes).sum()),
+        'negatives_gated': int((gated & ~notes).sum()),
+        'negatives': int((~notes).sum()),
+        'gate_ms_per_window': gate_ms,
+        'negative_threshold': gate.negative_threshold,
+    }
+
+
+def print_cascade_report(report):
+    print(f"Windows reaching the CNN: {100 * report['stage2_fraction']:.1f}% of {report['samples']}")
+    print(f"Negatives gated: {report['negatives_gated']}/{report['negatives']}, "
+          f"notes wrongly gated: {report['notes_gated']}")
+    print(f"Accuracy: full model {report['full_accuracy']:.3f}, cascade {report['cascade_accuracy']:.3f} "
+          f"({report['cascade_accuracy'] - report['full_accuracy']:+.3f})")
+    print(f"Gate cost: {1000 * report['gate_ms_per_window']:.1f} us per window "
+          f"(threshold {report['negative_threshold']:.3f})")
+
+
+if __name__ == '__main__':
+    from src.data_utils.data_loader import FEATURE_OUTPUT_PATHS
+    from src.model.evaluate import DEFAULT_MODEL_PATH, load_eval_set
+    from src.model.model_loader import load_trained_model
+
+    parser = argparse.ArgumentParser(description="Report the cascade gate's effect on the labeled corpus.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Stage-two model file.")
+    parser.add_argument("--gate", default=GATE_PATH, help="Gate file written by train.py.")
+    parser.add_argument("--feature", choices=sorted(FEATURE_OUTPUT_PATHS), default="cqt")
+    parser.add_argument("--pick", choices=["fpick", "npick"], default=None)
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON report path.")
+    args = parser.parse_args()
+
+    X, y, class_names, _ = load_eval_set(args.feature, pick=args.pick)
+    report = evaluate_cascade(load_trained_model(args.model), CascadeGate.load(args.gate), X, y)
+    print_cascade_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
@@ -0,0 +1,141 @@
+"""
+    Knowledge distillation of the trained CNN into a compact student.
+
+    The teacher (models/updated_model.h5 by default) is run on every training
+    batch, including augmented ones, and its temperature-softened class
+    distribution is the soft target. The student is a build_model() network with
+    far fewer filters and dense units; it is trained on
+        alpha * T^2 * KL(teacher_T || student_T) + (1 - alpha) * CE(labels, student)
+    where x_T = softmax(log(x) / T). Both models end in a softmax, and log
+    probabilities are the logits up to a constant, so no architecture change is
+    needed and the saved student is a drop-in replacement (same input shape, same
+    7 softmax outputs) for the server and evaluate.py.
+
+    Usage (from the project root):
+        python -m src.model.train --distill --epochs 30 --batch_size 16
+        python -m src.model.train --distill --student_filters 4 8 --student_dense 16 --temperature 4
+"""
+
+import time
+
+import numpy as np
+
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+STUDENT_PATH = ROOT_DIR + "/models/student_model.h5"
+DEFAULT_STUDENT_FILTERS = (8, 16)
+DEFAULT_STUDENT_DENSE = 16
+DEFAULT_TEMPERATURE = 4.0
+DEFAULT_ALPHA = 0.7             # Weight of the soft-target loss
+EPSILON = 1e-7
+# ---
+
+
+def soften(probabilities, temperature):
+    """Temperature-scaled distribution from softmax outputs: softmax(log(p) / T)."""
+    import tensorflow as tf
+    return tf.nn.softmax(tf.math.log(tf.clip_by_value(probabilities, EPSILON, 1.0)) / temperature, axis=-1)
+
+
+def distillation_loss(y_true, teacher_probs, student_probs, temperature=DEFAULT_TEMPERATURE, alpha=DEFAULT_ALPHA):
+    import tensorflow as tf
+    from keras import losses
+
+    teacher_soft = soften(teacher_probs, temperature)
+    student_soft = soften(student_probs, temperature)
+    soft = tf.reduce_mean(tf.reduce_sum(
+        teacher_soft * (tf.math.log(teacher_soft + EPSILON) - tf.math.log(student_soft + EPSILON)), axis=-1))
+    hard = tf.reduce_mean(losses.sparse_categorical_crossentropy(y_true, student_probs))
+    # T^2 keeps the soft-target gradients on the same scale as the hard-label ones
+    return alpha * temperature ** 2 * soft + (1.0 - alpha) * hard
+
+
+def _batches(x, y, batch_size, rng):
+    order = rng.permutation(len(x))
+    for start in range(0, len(x), batch_size):
+        index = np.sort(order[start:start + batch_size])
+        yield x[index], y[index]
+
+
+def distill(teacher, x_train, y_train, x_val, y_val, filters=DEFAULT_STUDENT_FILTERS,
+            dense_units=DEFAULT_STUDENT_DENSE, temperature=DEFAULT_TEMPERATURE, alpha=DEFAULT_ALPHA,
+            batch_size=16, epochs=30, augment_sequence=None, learning_rate=1e-3, seed=0):
+    """
+    Trains a build_model() student against the teacher's soft targets.
+
+    Args:
+        augment_sequence: Optional AugmentedSequence; when given, its batches
+                          (fresh augmentations every epoch) replace x_train / y_train.
+
+    Returns:
+        tuple: (student, history) where history has per-epoch 'loss' and 'val_accuracy'.
+    """
+    import tensorflow as tf
+    from keras import optimizers
+    from src.model.model import build_model
+
+    num_classes = teacher.output_shape[-1]
+    student = build_model(x_train[0].shape, num_classes, filters=filters, dense_units=dense_units)
+    optimizer = optimizers.Adam(learning_rate=learning_rate)
+
+    @tf.function
+    def train_step(x, y):
+        teacher_probs = teacher(x, training=False)
+        with tf.GradientTape() as tape:
+            student_probs = student(x, training=True)
+            loss = distillation_loss(y, teacher_probs, student_probs, temperature, alpha)
+        gradients = tape.gradient(loss, student.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, student.trainable_variables))
+        return loss
+
+    rng = np.random.default_rng(seed)
+    history = {'loss': [], 'val_accuracy': []}
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        if augment_sequence is not None:
+            batches = (augment_sequence[i] for i in range(len(augment_sequence)))
+        else:
+            batches = _batches(x_train, y_train, batch_size, rng)
+        losses = [float(train_step(tf.convert_to_tensor(x, tf.float32), tf.convert_to_tensor(y)))
+                  for x, y in batches]
+        if augment_sequence is not None:
+            augment_sequence.on_epoch_end()
+        val_accuracy = float((student.predict(x_val, verbose=0).argmax(axis=1) == y_val).mean())
+        history['loss'].append(float(np.mean(losses)))
+        history['val_accuracy'].append(val_accuracy)
+        print(f"Epoch {epoch + 1}/{epochs} - loss: {history['loss'][-1]:.4f} - val_accuracy: {val_accuracy:.4f} "
+              f"({time.perf_counter() - start:.1f}s)")
+    student.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return student, history
+
+
+def compare_models(teacher, student, x_test, y_test, latency_runs=100):
+    """Test accuracy, parameter count and single-sample latency of both models."""
+    from src.model.evaluate import measure_latency
+
+    report = {}
+    for name, model in (('teacher', teacher), ('student', student)):
+        predictions = model.predict(x_test, verbose=0).argmax(axis=1)
+        report[name] = {
+            'accuracy': float((predictions == y_test).mean()),
+            'params': int(model.count_params()),
+            'latency': measure_latency(model, x_test, latency_runs),
+        }
+    teacher_predictions = teacher.predict(x_test, verbose=0).argmax(axis=1)
+    student_predictions = student.predict(x_test, verbose=0).argmax(axis=1)
+    report['agreement'] = float((teacher_predictions == student_predictions).mean())
+    return report
+
+
+def print_comparison(report):
+    print(f"{'model':<10}{'params':>10}{'accuracy':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for name in ('teacher', 'student'):
+        stats = report[name]
+        print(f"{name:<10}{stats['params']:>10}{stats['accuracy']:>10.3f}{stats['latency']['p50_ms']:>9.2f}"
+              f"{stats['latency']['p99_ms']:>9.2f}")
+    teacher, student = report['teacher'], report['student']
+    print(f"Student: {teacher['params'] / student['params']:.1f}x fewer parameters, "
+          f"{teacher['latency']['p50_ms'] / student['latency']['p50_ms']:.1f}x faster per window (p50), "
+          f"accuracy {student['accuracy'] - teacher['accuracy']:+.3f}, agrees with the teacher on "
+          f"{100 * report['agreement']:.1f}% of the test set")
@@ -0,0 +1,250 @@
+"""
+    Batched evaluation of one or more trained models on a labeled feature set.
+
+    The labeled set is selected through the recording index and consolidated into
+    a single cache file (data/cache/), so repeated evaluations load one memory-mapped
+    array instead of thousands of small .npy files. Every model runs over the same
+    arrays in large batches; per-class precision/recall/F1 and the confusion matrix
+    are computed with vectorized NumPy, and inference throughput and single-sample
+    latency percentiles are recorded.
+
+    Usage (from the project root):
+        python -m src.model.evaluate                                 # models/updated_model.h5
+        python -m src.model.evaluate models/a.h5 models/b.h5 --output eval.json
+        python -m src.model.evaluate --feature mel --pick fpick
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from src.data_utils.data_loader import FEATURE_OUTPUT_PATHS
+from src.data_utils.recording_index import RecordingIndex
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+CACHE_DIR = ROOT_DIR + "/data/cache/"
+DEFAULT_MODEL_PATH = ROOT_DIR + "/models/updated_model.h5"
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_LATENCY_RUNS = 100
+LATENCY_PERCENTILES = (50, 90, 99)
+# ---
+
+
+# --- Labeled set with feature cache ---
+
+def load_eval_set(feature="cqt", cache_dir=CACHE_DIR, **filters):
+    """
+    Loads the feature arrays selected by RecordingIndex.select(feature=..., **filters).
+
+    The cache key is a hash of the selected feature paths and their modification
+    times, so the cache is rebuilt automatically when the arrays change. Labels are
+    encoded against every indexed class (as in training), not just the selected
+    ones, so a subset keeps the class indices of the production models.
+
+    Returns:
+        tuple: (X, y, class_names, paths); X is memory-mapped from the cache.
+    """
+    with RecordingIndex() as index:
+        index.update()
+        rows = index.select(feature=feature, **filters)
+        indexed_labels = index.class_counts(feature)
+        mtimes = dict(index.conn.execute("SELECT path, mtime_ns FROM features WHERE feature = ?", (feature,)))
+    if not rows:
+        raise ValueError(f"No indexed '{feature}' arrays match {filters}")
+
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(f"{row['feature_path']}:{mtimes.get(index.key(row['feature_path']))}\n".encode())
+    base = os.path.join(cache_dir, f"eval_{feature}_{digest.hexdigest()[:16]}")
+
+    class_names = sorted(set(indexed_labels) | {row["label"] for row in rows})
+    if not os.path.exists(base + ".npy"):
+        print(f"Building feature cache for {len(rows)} '{feature}' arrays...")
+        os.makedirs(cache_dir, exist_ok=True)
+        first = np.load(rows[0]["feature_path"])
+        X = np.lib.format.open_memmap(base + ".npy.tmp", mode="w+", dtype=np.float32,
+                                      shape=(len(rows),) + first.shape)
+        for i, row in enumerate(rows):
+            X[i] = np.load(row["feature_path"])
+        X.flush()
+        del X
+        os.replace(base + ".npy.tmp", base + ".npy")
+
+    X = np.load(base + ".npy", mmap_mode="r")
+    lookup = {name: i for i, name in enumerate(class_names)}
+    y = np.array([lookup[row["label"]] for row in rows], dtype=np.int64) # Same encoding as LabelEncoder
+    return X, y, class_names, [row["path"] for row in rows]
+
+
+# --- Metrics ---
+
+def confusion_matrix(y_true, y_pred, num_classes):
+    """Rows are true classes, columns predicted classes."""
+    return np.bincount(y_true * num_classes + y_pred, minlength=num_classes * num_classes).reshape(
+        num_classes, num_classes)
+
+
+def classification_metrics(y_true, y_pred, class_names, labels=None):
+    """
+    Per-class precision / recall / F1 / support plus accuracy and macro / weighted averages.
+    With labels (a subset of class_names), only those classes get rows and enter the averages;
+    the confusion matrix keeps a column for every class.
+
+    Returns:
+        dict: JSON-serializable metrics, including the confusion matrix.
+    """
+    num_classes = len(class_names)
+    confusion = confusion_matrix(np.asarray(y_true), np.asarray(y_pred), num_classes)
+    true_positives = np.diag(confusion).astype(np.float64)
+    support = confusion.sum(axis=1)
+    predicted = confusion.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    labels = list(class_names) if labels is None else list(labels)
+    rows = [list(class_names).index(name) for name in labels]
+    accuracy = float(true_positives.sum() / max(support.sum(), 1))
+    confusion, true_positives, support = confusion[rows], true_positives[rows], support[rows]
+    precision, recall, f1 = precision[rows], recall[rows], f1[rows]
+    weights = support / max(support.sum(), 1)
+    return {
+        "accuracy": accuracy,
+        "per_class": {
+            name: {"precision": float(precision[i]), "recall": float(recall[i]), "f1": float(f1[i]),
+                   "support": int(support[i])}
+            for i, name in enumerate(labels)
+        },
+        "macro": {"precision": float(precision.mean()), "recall": float(recall.mean()), "f1": float(f1.mean())},
+        "weighted": {"precision": float(precision @ weights), "recall": float(recall @ weights),
+                     "f1": float(f1 @ weights)},
+        "confusion_matrix": confusion.tolist(),
+        "class_names": list(class_names),
+        "labels": labels,
+    }
+
+
+def print_report(metrics):
+    names = metrics["class_names"]
+    labels = metrics.get("labels", names)
+    width = max(10, max(len(name) for name in names) + 2)
+    print(f"{'class':<{width}}{'precision':>11}{'recall':>9}{'f1':>9}{'support':>9}")
+    for name in labels:
+        stats = metrics["per_class"][name]
+        print(f"{name:<{width}}{stats['precision']:>11.3f}{stats['recall']:>9.3f}{stats['f1']:>9.3f}"
+              f"{stats['support']:>9}")
+    for average in ("macro", "weighted"):
+        stats = metrics[average]
+        print(f"{average:<{width}}{stats['precision']:>11.3f}{stats['recall']:>9.3f}{stats['f1']:>9.3f}")
+    print(f"accuracy: {metrics['accuracy']:.3f}")
+    print("\nConfusion matrix (rows = true, columns = predicted):")
+    print(" " * width + "".join(f"{name:>{width}}" for name in names))
+    for name, row in zip(labels, metrics["confusion_matrix"]):
+        print(f"{name:<{width}}" + "".join(f"{count:>{width}}" for count in row))
+
+
+# --- Inference ---
+
+def predict_batched(model, X, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Runs the model over X in large batches with predict_on_batch (no per-call
+    Keras predict() setup). Returns the softmax outputs and throughput stats.
+    """
+    outputs = []
+    model.predict_on_batch(np.asarray(X[:batch_size], dtype=np.float32)) # Warm-up (graph tracing)
+    start = time.perf_counter()
+    for i in range(0, len(X), batch_size):
+        batch = np.asarray(X[i:i + batch_size], dtype=np.float32)
+        outputs.append(np.asarray(model.predict_on_batch(batch)))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(outputs), {
+        "batch_size": batch_size,
+        "total_sec": elapsed,
+        "samples_per_sec": len(X) / max(elapsed, 1e-9),
+    }
+
+
+def measure_latency(model, X, runs=DEFAULT_LATENCY_RUNS):
+    """Single-sample latency percentiles in milliseconds (the real-time loop's batch size)."""
+    if runs <= 0:
+        return {}
+    samples = np.asarray(X[:min(runs, len(X))], dtype=np.float32)
+    model.predict_on_batch(samples[:1]) # Warm-up
+    timings = np.empty(runs)
+    for i in range(runs):
+        sample = samples[i % len(samples)][np.newaxis]
+        start = time.perf_counter()
+        model.predict_on_batch(sample)
+        timings[i] = (time.perf_counter() - start) * 1000.0
+    latency = {f"p{p}_ms": float(np.percentile(timings, p)) for p in LATENCY_PERCENTILES}
+    latency["mean_ms"] = float(timings.mean())
+    return latency
+
+
+def evaluate_model(model, X, y, class_names, batch_size=DEFAULT_BATCH_SIZE, latency_runs=DEFAULT_LATENCY_RUNS):
+    softmax, throughput = predict_batched(model, X, batch_size)
+    labels = [class_names[i] for i in np.unique(y)] # The selected classes
+    metrics = classification_metrics(y, softmax.argmax(axis=1), class_names, labels)
+    metrics["throughput"] = throughput
+    metrics["latency"] = measure_latency(model, X, latency_runs)
+    return metrics
+
+
+def evaluate_models(model_paths, feature="cqt", batch_size=DEFAULT_BATCH_SIZE,
+                    latency_runs=DEFAULT_LATENCY_RUNS, **filters):
+    """Evaluates several model files on the same cached set (features are loaded once)."""
+    from src.model.model_loader import load_trained_model
+
+    start = time.perf_counter()
+    X, y, class_names, _ = load_eval_set(feature, **filters)
+    print(f"Loaded {len(X)} '{feature}' samples in {time.perf_counter() - start:.2f}s")
+    results = {}
+    for path in model_paths:
+        model = load_trained_model(path)
+        num_outputs = model.output_shape[-1]
+        if num_outputs != len(class_names):
+            print(f"Skipping {path}: {num_outputs} outputs but the set has {len(class_names)} classes")
+            continue
+        results[path] = evaluate_model(model, X, y, class_names, batch_size, latency_runs)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate one or more models on the labeled corpus.")
+    parser.add_argument("models", nargs="*", default=[DEFAULT_MODEL_PATH],
+                        help="Model files to evaluate (default: models/updated_model.h5).")
+    parser.add_argument("--feature", choices=sorted(FEATURE_OUTPUT_PATHS), default="cqt",
+                        help="Feature backend the models were trained on (default: cqt).")
+    parser.add_argument("--labels", nargs="+", default=None, help="Only evaluate on these labels.")
+    parser.add_argument("--pick", choices=["fpick", "npick"], default=None,
+                        help="Only evaluate on this pick style (negatives are always included).")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Inference batch size (default: {DEFAULT_BATCH_SIZE}).")
+    parser.add_argument("--latency_runs", type=int, default=DEFAULT_LATENCY_RUNS,
+                        help="Single-sample predictions timed per model (0 to skip).")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON report path.")
+    args = parser.parse_args()
+
+    results = evaluate_models(args.models, args.feature, args.batch_size, args.latency_runs,
+                              labels=args.labels, pick=args.pick)
+    for path, metrics in results.items():
+        print(f"\n=== {path} ===")
+        print_report(metrics)
+
+    if len(results) > 1:
+        print(f"\n{'model':<40}{'accuracy':>10}{'macro f1':>10}{'samples/s':>11}{'p50 ms':>9}{'p99 ms':>9}")
+        for path, metrics in sorted(results.items(), key=lambda item: -item[1]["accuracy"]):
+            latency = metrics["latency"]
+            print(f"{os.path.basename(path):<40}{metrics['accuracy']:>10.3f}{metrics['macro']['f1']:>10.3f}"
+                  f"{metrics['throughput']['samples_per_sec']:>11.0f}"
+                  f"{latency.get('p50_ms', float('nan')):>9.2f}{latency.get('p99_ms', float('nan')):>9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"feature": args.feature, "models": results}, f, indent=2)
+        print(f"\nReport written to {args.output}")
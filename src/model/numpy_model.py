@@ -0,0 +1,145 @@
+"""
+    NumPy-only inference for the Sequential CNNs built by build_model().
+
+    Reads the layer configuration and weights straight from a Keras .h5 file with
+    h5py and runs the forward pass in NumPy (Conv2D via strided windows and one
+    matrix product, MaxPooling2D, BatchNormalization folded into a scale/shift,
+    Flatten, Dense; Dropout and InputLayer are no-ops at inference). Neither
+    TensorFlow nor Keras is imported, which keeps the headless CLI's startup time
+    and resident memory small. Outputs match Keras to float32 rounding.
+
+    The object mimics the parts of the Keras model API the pipeline uses
+    (predict, predict_on_batch, input_shape, output_shape, count_params), so it
+    can be passed wherever a loaded model is expected.
+"""
+
+import json
+
+import numpy as np
+
+SUPPORTED_LAYERS = ('InputLayer', 'Conv2D', 'MaxPooling2D', 'BatchNormalization', 'Flatten', 'Dense', 'Dropout')
+
+
+def _activation(name, x):
+    if name in (None, 'linear'):
+        return x
+    if name == 'relu':
+        return np.maximum(x, 0.0, out=x)
+    if name == 'sigmoid':
+        return 1.0 / (1.0 + np.exp(-x))
+    if name == 'softmax':
+        x = np.exp(x - x.max(axis=-1, keepdims=True))
+        return x / x.sum(axis=-1, keepdims=True)
+    raise ValueError(f"Unsupported activation '{name}'")
+
+
+def _conv2d(x, kernel, bias, padding):
+    kh, kw = kernel.shape[:2]
+    if padding == 'same':
+        top, left = (kh - 1) // 2, (kw - 1) // 2
+        x = np.pad(x, ((0, 0), (top, kh - 1 - top), (left, kw - 1 - left), (0, 0)))
+    windows = np.lib.stride_tricks.sliding_window_view(x, (kh, kw), axis=(1, 2)) # (n, h, w, c, kh, kw)
+    return np.tensordot(windows, kernel.transpose(2, 0, 1, 3), axes=([3, 4, 5], [0, 1, 2])) + bias
+
+
+def _max_pool(x, pool):
+    ph, pw = pool
+    n, h, w, c = x.shape
+    x = x[:, :h - h % ph, :w - w % pw]
+    return x.reshape(n, h // ph, ph, w // pw, pw, c).max(axis=(2, 4))
+
+
+def _layer_weights(group):
+    """Datasets of one layer group by base name ('kernel', 'gamma', ...), for Keras 2 and 3 .h5 layouts."""
+    weights = {}
+
+    def visit(name, obj):
+        if hasattr(obj, 'shape'):
+            weights[name.split('/')[-1].split(':')[0]] = np.asarray(obj, dtype=np.float32)
+
+    group.visititems(visit)
+    return weights
+
+
+class NumpyModel:
+    def __init__(self, layers, input_shape):
+        self.layers = layers # (kind, params) tuples
+        self.input_shape = (None,) + tuple(input_shape)
+        out = self.predict_on_batch(np.zeros((1,) + tuple(input_shape), dtype=np.float32))
+        self.output_shape = (None,) + out.shape[1:]
+
+    @classmethod
+    def from_h5(cls, path):
+        """Builds the model from a Keras .h5 file. Raises ValueError for unsupported layers or settings."""
+        import h5py
+
+        with h5py.File(path, 'r') as f:
+            config = json.loads(f.attrs['model_config'])
+            if config['class_name'] != 'Sequential':
+                raise ValueError(f"Only Sequential models are supported, got {config['class_name']}")
+            weights_group = f['model_weights'] if 'model_weights' in f else f
+            layers = []
+            input_shape = None
+            for layer in config['config']['layers']:
+                kind, settings = layer['class_name'], layer['config']
+                if kind not in SUPPORTED_LAYERS:
+                    raise ValueError(f"Unsupported layer {kind} ('{settings['name']}')")
+                shape = settings.get('batch_shape') or settings.get('batch_input_shape')
+                if input_shape is None and shape:
+                    input_shape = shape[1:]
+                if settings.get('data_format', 'channels_last') not in (None, 'channels_last'):
+                    raise ValueError(f"Only channels_last is supported ('{settings['name']}')")
+                weights = _layer_weights(weights_group[settings['name']]) if settings['name'] in weights_group \
+                    else {}
+                if kind == 'Conv2D':
+                    if tuple(settings.get('strides', (1, 1))) != (1, 1) or \
+                            tuple(settings.get('dilation_rate', (1, 1))) != (1, 1):
+                        raise ValueError(f"Only stride/dilation 1 convolutions are supported ('{settings['name']}')")
+                    layers.append(('conv', (weights['kernel'], weights.get('bias', 0.0), settings['padding'],
+                                            settings.get('activation'))))
+                elif kind == 'MaxPooling2D':
+                    if tuple(settings['strides'] or settings['pool_size']) != tuple(settings['pool_size']) or \
+                            settings.get('padding', 'valid') != 'valid':
+                        raise ValueError(f"Only non-overlapping valid pooling is supported ('{settings['name']}')")
+                    layers.append(('pool', tuple(settings['pool_size'])))
+                elif kind == 'BatchNormalization':
+                    scale = weights.get('gamma', 1.0) / np.sqrt(weights['moving_variance'] + settings['epsilon'])
+                    shift = weights.get('beta', 0.0) - weights['moving_mean'] * scale
+                    layers.append(('affine', (scale.astype(np.float32), shift.astype(np.float32))))
+                elif kind == 'Flatten':
+                    layers.append(('flatten', None))
+                elif kind == 'Dense':
+                    layers.append(('dense', (weights['kernel'], weights.get('bias', 0.0), settings.get('activation'))))
+        if input_shape is None:
+            raise ValueError("Model has no input shape")
+        return cls(layers, input_shape)
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for kind, params in self.layers:
+            if kind == 'conv':
+                kernel, bias, padding, activation = params
+                x = _activation(activation, _conv2d(x, kernel, bias, padding))
+            elif kind == 'pool':
+                x = _max_pool(x, params)
+            elif kind == 'affine':
+                x = x * params[0] + params[1]
+            elif kind == 'flatten':
+                x = x.reshape(len(x), -1)
+            else:
+                kernel, bias, activation = params
+                x = _activation(activation, x @ kernel + bias)
+        return x
+
+    def predict(self, x, verbose=0, batch_size=32):
+        x = np.asarray(x, dtype=np.float32)
+        return np.concatenate([self.predict_on_batch(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+    def count_params(self):
+        total = 0
+        for kind, params in self.layers:
+            if kind in ('conv', 'dense'):
+                total += params[0].size + np.size(params[1])
+            elif kind == 'affine':
+                total += 4 * params[0].size # gamma, beta, moving mean and variance
+        return int(total)
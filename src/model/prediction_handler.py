@@ -89,6 +89,32 @@ def get_tab_output(softmax_output: np.ndarray) -> list[int]:
 
     return output_tab
 
+def get_hexaphonic_tab_output(softmax_outputs: np.ndarray) -> list[int]:
+    """
+    Converts per-channel softmax outputs of a hexaphonic (one channel per string)
+    input into a tab. Channel c carries string OUTPUT_TAB_ORDER[c], so any
+    non-negative prediction on it marks that string as played; unlike
+    get_tab_output() several strings can be active at once.
+
+    Args:
+        softmax_outputs (np.ndarray): (channels, NUM_STRINGS + 1) array, channels <= NUM_STRINGS.
+
+    Returns:
+        list[int]: A list of length NUM_STRINGS (6) in the desired tab order.
+    """
+    softmax_outputs = np.asarray(softmax_outputs, dtype=np.float32)
+    if softmax_outputs.ndim != 2 or softmax_outputs.shape[0] > NUM_STRINGS \
+            or softmax_outputs.shape[1] != NUM_STRINGS + 1:
+        logging.error(f"Prediction Handler: Expected (channels <= {NUM_STRINGS}, {NUM_STRINGS + 1}) softmax "
+                      f"outputs, but got {softmax_outputs.shape}")
+        return [0] * NUM_STRINGS
+
+    output_tab = [0] * NUM_STRINGS
+    for channel, predicted_model_index in enumerate(np.argmax(softmax_outputs, axis=1)):
+        if predicted_model_index in MODEL_INDEX_TO_STRING_NAME:
+            output_tab[channel] = 1
+    return output_tab
+
 # --- Example Usage (for testing this file directly) ---
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
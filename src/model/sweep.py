@@ -0,0 +1,279 @@
+"""
+    Parallel hyperparameter sweep with stratified k-fold cross-validation.
+
+    Every (trial, fold) pair is one task on a process pool. The dataset is loaded
+    once in the parent and placed in shared memory; workers attach to it instead
+    of receiving a pickled copy per task. Each fold holds out a small stratified
+    validation split from its training part for early stopping, and the fold
+    itself is only used for the reported metrics.
+
+    Results are written to models/sweeps/ as a leaderboard (JSON + CSV) with the
+    mean/std accuracy across folds and the wall-clock time of every trial.
+
+    Usage (from the project root):
+        python -m src.model.sweep --folds 5 --search random --trials 12 --workers 4
+        python -m src.model.sweep --grid my_grid.json --search grid
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from src.data_utils.data_loader import get_data_dir, get_xy, FEATURE_OUTPUT_PATHS
+from src.visualization import ROOT_DIR
+
+# --- Configuration ---
+SWEEP_OUTPUT_DIR = ROOT_DIR + "/models/sweeps/"
+DEFAULT_FOLDS = 5
+DEFAULT_EPOCHS = 30
+DEFAULT_PATIENCE = 5           # Epochs without val_loss improvement before stopping
+INNER_VAL_FRACTION = 0.1       # Part of each fold's training data used for early stopping
+# build_model() keyword arguments plus training parameters
+DEFAULT_GRID = {
+    "filters": [[16, 32], [32, 64], [16, 32, 64]],
+    "dense_units": [32, 64, 128],
+    "dropout": [0.3, 0.5],
+    "learning_rate": [1e-3, 3e-4],
+    "batch_size": [8, 16, 32],
+}
+# Values for parameters a --grid file leaves out: build_model() defaults, Adam's default rate
+DEFAULT_PARAMS = {
+    "filters": [16, 32],
+    "dense_units": 64,
+    "dropout": 0.4,
+    "learning_rate": 1e-3,
+    "batch_size": 16,
+}
+# ---
+
+# Worker process state, set once by _init_worker
+_shm = None
+_X = None
+_y = None
+_num_classes = None
+
+
+def build_trials(grid, search="grid", n_trials=None, seed=0):
+    """
+    Expands a parameter grid into a list of trial parameter dicts.
+    Parameters the grid leaves out take their DEFAULT_PARAMS value, so a grid may
+    vary only part of the space. Raises ValueError for unknown parameters.
+    With search='random', n_trials combinations are drawn without replacement.
+    """
+    unknown = set(grid) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}, expected a subset of {sorted(DEFAULT_PARAMS)}")
+    keys = sorted(grid)
+    trials = [dict(DEFAULT_PARAMS, **dict(zip(keys, values)))
+              for values in itertools.product(*(grid[key] for key in keys))]
+    if search == "random" and n_trials is not None and n_trials < len(trials):
+        rng = np.random.default_rng(seed)
+        trials = [trials[i] for i in sorted(rng.choice(len(trials), size=n_trials, replace=False))]
+    return trials
+
+
+def _init_worker(shm_name, shape, dtype, y, tf_threads):
+    """Attaches the worker to the shared dataset and limits TensorFlow's thread pools."""
+    global _shm, _X, _y, _num_classes
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    # Several workers share the CPU; must be set before TensorFlow starts its thread pools
+    tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _X = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+    _y = y
+    _num_classes = int(y.max()) + 1
+
+
+def _run_fold(trial_id, params, fold, train_idx, test_idx, epochs, patience, seed):
+    """Trains one trial on one fold inside a worker and returns its metrics."""
+    import keras
+    from src.model.model import build_model
+
+    start = time.perf_counter()
+    keras.utils.set_random_seed(seed + fold)
+    fit_idx, val_idx = train_test_split(train_idx, test_size=INNER_VAL_FRACTION,
+                                        stratify=_y[train_idx], random_state=seed)
+
+    model = build_model(_X.shape[1:], _num_classes, filters=tuple(params["filters"]),
+                        dense_units=params["dense_units"], dropout=params["dropout"])
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=params["learning_rate"]),
+                  loss='sparse_categorical_crossentropy',
+                  metrics=['accuracy'])
+    early_stopping = keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience,
+                                                   restore_best_weights=True)
+    history = model.fit(
+        _X[fit_idx], _y[fit_idx],
+        validation_data=(_X[val_idx], _y[val_idx]),
+        batch_size=params["batch_size"],
+        epochs=epochs,
+        callbacks=[early_stopping],
+        verbose=0,
+    )
+    test_loss, test_accuracy = model.evaluate(_X[test_idx], _y[test_idx], verbose=0)
+    keras.backend.clear_session() # Free the graph before the worker picks up the next task
+
+    return {
+        "trial_id": trial_id,
+        "fold": fold,
+        "test_accuracy": float(test_accuracy),
+        "test_loss": float(test_loss),
+        "epochs_run": len(history.history["loss"]),
+        "best_epoch": int(np.argmin(history.history["val_loss"])) + 1,
+        "wall_sec": time.perf_counter() - start,
+    }
+
+
+def build_leaderboard(trials, fold_results):
+    """Aggregates fold results per trial, sorted by mean accuracy (best first)."""
+    leaderboard = []
+    for trial_id, params in enumerate(trials):
+        results = [r for r in fold_results if r["trial_id"] == trial_id and "error" not in r]
+        errors = [r["error"] for r in fold_results if r["trial_id"] == trial_id and "error" in r]
+        accuracies = np.array([r["test_accuracy"] for r in results])
+        leaderboard.append({
+            "trial_id": trial_id,
+            "params": params,
+            "folds_completed": len(results),
+            "mean_accuracy": float(accuracies.mean()) if results else None,
+            "std_accuracy": float(accuracies.std()) if results else None,
+            "mean_loss": float(np.mean([r["test_loss"] for r in results])) if results else None,
+            "mean_epochs": float(np.mean([r["epochs_run"] for r in results])) if results else None,
+            "wall_sec": float(sum(r["wall_sec"] for r in results)),
+            "errors": errors,
+        })
+    leaderboard.sort(key=lambda entry: -1.0 if entry["mean_accuracy"] is None else entry["mean_accuracy"],
+                     reverse=True)
+    return leaderboard
+
+
+def run_sweep(data_path, grid=DEFAULT_GRID, search="grid", n_trials=None, folds=DEFAULT_FOLDS,
+              epochs=DEFAULT_EPOCHS, patience=DEFAULT_PATIENCE, workers=None, seed=42):
+    """
+    Runs every trial on every fold across a process pool.
+
+    Returns:
+        tuple: (trials, fold_results, wall_sec)
+    """
+    trials = build_trials(grid, search, n_trials, seed) # Validates the grid before the dataset is loaded
+    X, y = get_xy(get_data_dir(data_path))
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(np.zeros(len(y)), y))
+    tasks = [(trial_id, fold) for trial_id in range(len(trials)) for fold in range(folds)]
+
+    cpu_count = os.cpu_count() or 1
+    workers = workers or min(cpu_count, len(tasks))
+    tf_threads = max(1, cpu_count // workers)
+    print(f"{len(trials)} trials x {folds} folds = {len(tasks)} tasks on {workers} workers "
+          f"({tf_threads} TF threads each), dataset {X.shape} ({X.nbytes / 1e6:.1f} MB, shared)")
+
+    shm = shared_memory.SharedMemory(create=True, size=X.nbytes)
+    fold_results = []
+    start = time.perf_counter()
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+        shape, dtype = X.shape, X.dtype.str
+        del X
+        # 'spawn' because TensorFlow is not fork-safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(shm.name, shape, dtype, y, tf_threads)) as pool:
+            futures = {
+                pool.submit(_run_fold, trial_id, trials[trial_id], fold, splits[fold][0], splits[fold][1],
+                            epochs, patience, seed): (trial_id, fold)
+                for trial_id, fold in tasks
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                trial_id, fold = futures[future]
+                try:
+                    result = future.result()
+                    print(f"[{done}/{len(tasks)}] trial {trial_id} fold {fold}: "
+                          f"acc {result['test_accuracy']:.3f}, {result['epochs_run']} epochs, {result['wall_sec']:.1f}s")
+                except Exception as e:
+                    result = {"trial_id": trial_id, "fold": fold, "error": str(e)}
+                    print(f"[{done}/{len(tasks)}] trial {trial_id} fold {fold} failed: {e}")
+                fold_results.append(result)
+    finally:
+        shm.close()
+        shm.unlink()
+    return trials, fold_results, time.perf_counter() - start
+
+
+def write_leaderboard(leaderboard, fold_results, meta, output_dir=SWEEP_OUTPUT_DIR):
+    """Writes <timestamp>.json (full detail) and <timestamp>.csv (one row per trial)."""
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, datetime.now().strftime("sweep_%Y%m%d_%H%M%S"))
+    with open(base + ".json", "w") as f:
+        json.dump({"meta": meta, "leaderboard": leaderboard, "folds": fold_results}, f, indent=2)
+    param_keys = sorted(meta["grid"])
+    with open(base + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", "trial_id", *param_keys, "mean_accuracy", "std_accuracy", "mean_loss",
+                         "mean_epochs", "folds_completed", "wall_sec"])
+        for rank, entry in enumerate(leaderboard, start=1):
+            writer.writerow([rank, entry["trial_id"], *(entry["params"][key] for key in param_keys),
+                             entry["mean_accuracy"], entry["std_accuracy"], entry["mean_loss"],
+                             entry["mean_epochs"], entry["folds_completed"], round(entry["wall_sec"], 2)])
+    return base
+
+
+def print_leaderboard(leaderboard, top=10):
+    print(f"\n{'rank':<6}{'mean acc':>10}{'std':>8}{'epochs':>8}{'wall s':>9}  params")
+    for rank, entry in enumerate(leaderboard[:top], start=1):
+        if entry["mean_accuracy"] is None:
+            print(f"{rank:<6}{'failed':>10}{'':>8}{'':>8}{entry['wall_sec']:>9.1f}  {entry['params']}")
+            continue
+        print(f"{rank:<6}{entry['mean_accuracy']:>10.3f}{entry['std_accuracy']:>8.3f}{entry['mean_epochs']:>8.1f}"
+              f"{entry['wall_sec']:>9.1f}  {entry['params']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep with k-fold cross-validation.")
+    parser.add_argument("--feature", choices=sorted(FEATURE_OUTPUT_PATHS), default="cqt",
+                        help="Feature backend the data was preprocessed with (default: cqt).")
+    parser.add_argument("--grid", type=str, default=None,
+                        help="JSON file mapping parameter names to lists of values (default: built-in grid).")
+    parser.add_argument("--search", choices=["grid", "random"], default="random",
+                        help="Try every combination or a random subset (default: random).")
+    parser.add_argument("--trials", type=int, default=12, help="Number of combinations for --search random.")
+    parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS, help=f"Folds (default: {DEFAULT_FOLDS}).")
+    parser.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS, help="Maximum epochs per fold.")
+    parser.add_argument("--patience", type=int, default=DEFAULT_PATIENCE, help="Early stopping patience.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output_dir", type=str, default=SWEEP_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    trials, fold_results, wall_sec = run_sweep(FEATURE_OUTPUT_PATHS[args.feature], grid, args.search, args.trials,
+                                               args.folds, args.epochs, args.patience, args.workers, args.seed)
+    leaderboard = build_leaderboard(trials, fold_results)
+    print_leaderboard(leaderboard)
+    meta = {
+        "feature": args.feature,
+        "grid": grid,
+        "search": args.search,
+        "folds": args.folds,
+        "max_epochs": args.epochs,
+        "patience": args.patience,
+        "workers": args.workers,
+        "seed": args.seed,
+        "wall_sec": wall_sec,
+    }
+    path = write_leaderboard(leaderboard, fold_results, meta, args.output_dir)
+    print(f"\nSweep finished in {wall_sec:.1f}s, leaderboard written to {path}.json / .csv")
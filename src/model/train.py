@@ -1,15 +1,40 @@
+import argparse
+import os
 import numpy as np
 from sklearn.model_selection import train_test_split
-from src.data_utils.data_loader import get_data_dir, get_xy
+from src.data_utils.augmentation import AugmentedSequence
+from src.data_utils.data_loader import get_data_dir, get_xy, FEATURE_OUTPUT_PATHS
+from src.data_utils.recording_index import RecordingIndex
+from src.model.cascade import GATE_PATH, evaluate_cascade, print_cascade_report, train_gate
+from src.model import distill
+from src.model.evaluate import classification_metrics, print_report
 from src.model.model import build_model
 from src.visualization import ROOT_DIR
 DATA_PATH = ROOT_DIR + "/data/preprocessed/"
+MODEL_PATH = ROOT_DIR + '/models/updated_model.h5'
+NEGATIVE_CLASS = 'negatives'
 
-def load_and_split(data_path = DATA_PATH):
+def negative_label(class_names):
+    # Encoded index of the negatives among the trained class names (None if they aren't trained on)
+    return class_names.index(NEGATIVE_CLASS) if class_names and NEGATIVE_CLASS in class_names else None
+
+def negatives_noise_bank(x_train, y_train, class_names):
+    # The augmentation noise bank: the training negatives (empty when none are trained on)
+    label = negative_label(class_names)
+    return x_train[y_train == label] if label is not None else x_train[:0]
+
+def load_and_split(data_path = DATA_PATH, index_query=None):
     # Step 1: Load preprocessed data
-    print("Loading preprocessed data...")
-    data_dir = get_data_dir(data_path)
-    X, y = get_xy(data_dir)
+    if index_query is not None:
+        # Subset selected through the recording index, e.g. {'feature': 'cqt', 'pick': 'fpick'}
+        print(f"Loading preprocessed data from the recording index ({index_query})...")
+        with RecordingIndex() as index:
+            index.update()
+            X, y = index.load_xy(**index_query)
+    else:
+        print("Loading preprocessed data...")
+        data_dir = get_data_dir(data_path)
+        X, y = get_xy(data_dir)
     print(f'X shape: {X.shape}, y shape: {y.shape}')
     # Step 2: Split the data into training, validation, and test sets
     print("Splitting data into training, validation, and test sets...")
@@ -20,7 +45,8 @@ def load_and_split(data_path = DATA_PATH):
     print(f"Training samples: {len(x_train)}, Validation samples: {len(x_val)}, Test samples: {len(x_test)}")
     return x_train, y_train, x_val, y_val, x_test, y_test
 
-def train_and_save(x_train, y_train, x_val, y_val, x_test, y_test):
+def train_and_save(x_train, y_train, x_val, y_val, x_test, y_test, model_path=MODEL_PATH,
+                   batch_size=1, epochs=5, augment=False, class_names=None):
     # Step 3: Build the model
     input_shape = x_train[0].shape
     num_classes = len(np.unique(y_train))  # Number of unique labels/classes in your dataset
@@ -34,28 +60,128 @@ def train_and_save(x_train, y_train, x_val, y_val, x_test, y_test):
 
     # Step 6: Train the model
     print("Starting training...")
-    batch_size = 1
-    epochs = 5  # Adjust based on your dataset size and performance
-
-    history = model.fit(
-        x_train, y_train,
-        validation_data=(x_val, y_val),
-        batch_size=batch_size,
-        epochs=epochs,
-    )
+    if augment:
+        # Fresh CQT-domain variants every epoch, prepared in worker threads; negatives double as the noise bank
+        noise_bank = negatives_noise_bank(x_train, y_train, class_names)
+        print(f"Augmenting training batches (noise bank: {len(noise_bank)} negatives)...")
+        history = model.fit(
+            AugmentedSequence(x_train, y_train, batch_size=batch_size, noise_bank=noise_bank),
+            validation_data=(x_val, y_val),
+            epochs=epochs,
+        )
+    else:
+        history = model.fit(
+            x_train, y_train,
+            validation_data=(x_val, y_val),
+            batch_size=batch_size,
+            epochs=epochs,
+        )
 
     # Step 7: Evaluate the model on the test set
     print("Evaluating the model on the test set...")
     test_loss, test_accuracy = model.evaluate(x_test, y_test)
     print(f"Test Loss: {test_loss}")
     print(f"Test Accuracy: {test_accuracy}")
+    y_pred = model.predict(x_test, verbose=0).argmax(axis=1)
+    if class_names is None or len(class_names) != num_classes:
+        class_names = [str(i) for i in range(num_classes)]
+    print_report(classification_metrics(y_test, y_pred, class_names))
 
     # Save the final model
-    final_model_path = ROOT_DIR + '/models/updated_model.h5'
+    final_model_path = model_path
     model.save(final_model_path)
     print(f"Model saved to {final_model_path}")
+    return model
+
+
+def train_cascade_gate(model, x_train, y_train, x_val, y_val, x_test, y_test, gate_path=GATE_PATH,
+                       class_names=None):
+    # Stage one of the cascade (src/model/cascade.py): skips the CNN for confident negatives
+    negative = negative_label(class_names)
+    if negative is None:
+        raise ValueError(f"The cascade gate needs the '{NEGATIVE_CLASS}' class among the trained classes {class_names}")
+    print("Training the cascade gate...")
+    num_classes = model.output_shape[-1]
+    gate = train_gate(x_train, y_train, x_val, y_val, negative, num_classes)
+    print("Evaluating the cascade on the test set...")
+    print_cascade_report(evaluate_cascade(model, gate, x_test, y_test))
+    gate.save(gate_path)
+    print(f"Cascade gate saved to {gate_path}")
+    return gate
+
+
+def distill_and_save(teacher, x_train, y_train, x_val, y_val, x_test, y_test, student_path=distill.STUDENT_PATH,
+                     batch_size=16, epochs=30, augment=False, class_names=None, **distill_kwargs):
+    # Compact student trained on the teacher's soft targets (src/model/distill.py)
+    print(f"Distilling a student model ({teacher.count_params()} teacher parameters)...")
+    augment_sequence = None
+    if augment:
+        noise_bank = negatives_noise_bank(x_train, y_train, class_names)
+        augment_sequence = AugmentedSequence(x_train, y_train, batch_size=batch_size, noise_bank=noise_bank)
+    student, _ = distill.distill(teacher, x_train, y_train, x_val, y_val, batch_size=batch_size, epochs=epochs,
+                                 augment_sequence=augment_sequence, **distill_kwargs)
+    print("Comparing student and teacher on the test set...")
+    distill.print_comparison(distill.compare_models(teacher, student, x_test, y_test))
+    student.save(student_path)
+    print(f"Student model saved to {student_path}")
+    return student
 
 
 if __name__ == '__main__':
-    x_train, y_train, x_val, y_val, x_test, y_test = load_and_split()
-    train_and_save(x_train, y_train, x_val, y_val, x_test, y_test)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the string classifier on preprocessed features.")
+    parser.add_argument("--feature", choices=sorted(FEATURE_OUTPUT_PATHS), default="cqt",
+                        help="Feature backend the data was preprocessed with (default: cqt).")
+    parser.add_argument("--epochs", type=int, default=5, help="Training epochs (default: 5).")
+    parser.add_argument("--batch_size", type=int, default=1, help="Training batch size (default: 1).")
+    parser.add_argument("--augment", action="store_true",
+                        help="Train on augmented CQT batches (bin/time shifts, crops, noise mixing, masking).")
+    parser.add_argument("--labels", nargs="+", default=None,
+                        help="Train only on these labels (selected through the recording index).")
+    parser.add_argument("--pick", choices=["fpick", "npick"], default=None,
+                        help="Train only on this pick style; negatives are always included.")
+    parser.add_argument("--cascade_gate", action="store_true",
+                        help="Also train the cascade gate (models/cascade_gate.npz) for the trained model.")
+    parser.add_argument("--gate_only", action="store_true",
+                        help="Only train the cascade gate, for the existing model file.")
+    parser.add_argument("--distill", action="store_true",
+                        help="Train a compact student (models/student_model.h5) from the existing model.")
+    parser.add_argument("--student_filters", type=int, nargs="+", default=list(distill.DEFAULT_STUDENT_FILTERS),
+                        help="Conv filters per block of the student (default: %(default)s).")
+    parser.add_argument("--student_dense", type=int, default=distill.DEFAULT_STUDENT_DENSE,
+                        help="Dense units of the student (default: %(default)s).")
+    parser.add_argument("--temperature", type=float, default=distill.DEFAULT_TEMPERATURE,
+                        help="Distillation temperature (default: %(default)s).")
+    parser.add_argument("--alpha", type=float, default=distill.DEFAULT_ALPHA,
+                        help="Weight of the soft-target loss (default: %(default)s).")
+    args = parser.parse_args()
+
+    model_path = MODEL_PATH if args.feature == "cqt" else ROOT_DIR + f'/models/updated_model_{args.feature}.h5'
+    data_path = FEATURE_OUTPUT_PATHS[args.feature]
+    class_names = sorted(args.labels) if args.labels else sorted(
+        d for d in os.listdir(data_path) if os.path.isdir(os.path.join(data_path, d))) # LabelEncoder order
+    if (args.cascade_gate or args.gate_only) and negative_label(class_names) is None:
+        parser.error(f"--cascade_gate/--gate_only need the '{NEGATIVE_CLASS}' class among the trained labels")
+    index_query = None
+    if args.labels or args.pick:
+        index_query = {'feature': args.feature, 'labels': args.labels, 'pick': args.pick}
+    x_train, y_train, x_val, y_val, x_test, y_test = load_and_split(data_path, index_query)
+    if args.distill:
+        from src.model.model_loader import load_trained_model
+        student_path = distill.STUDENT_PATH if args.feature == "cqt" else \
+            ROOT_DIR + f'/models/student_model_{args.feature}.h5'
+        distill_and_save(load_trained_model(model_path), x_train, y_train, x_val, y_val, x_test, y_test,
+                         student_path=student_path, batch_size=args.batch_size, epochs=args.epochs,
+                         augment=args.augment, class_names=class_names, filters=tuple(args.student_filters),
+                         dense_units=args.student_dense, temperature=args.temperature, alpha=args.alpha)
+        model = None
+    elif args.gate_only:
+        from src.model.model_loader import load_trained_model
+        model = load_trained_model(model_path)
+    else:
+        model = train_and_save(x_train, y_train, x_val, y_val, x_test, y_test, model_path=model_path,
+                               batch_size=args.batch_size, epochs=args.epochs, augment=args.augment,
+                               class_names=class_names)
+    if model is not None and (args.cascade_gate or args.gate_only):
+        gate_path = GATE_PATH if args.feature == "cqt" else ROOT_DIR + f'/models/cascade_gate_{args.feature}.npz'
+        train_cascade_gate(model, x_train, y_train, x_val, y_val, x_test, y_test, gate_path=gate_path,
+                           class_names=class_names)
\ No newline at end of file
@@ -29,26 +29,18 @@ def plot_class_distribution(data_dir):
     plt.show()
 
 def count_data():
-    counter = 0
-    data_dir = ROOT_DIR + "\data\\preprocessed\\"
-    print("For \\data\\preprocessed\\:")
-    for base_dir, _, files in os.walk(data_dir):
-        for file in files:
-            if os.path.isfile(base_dir + '\\' + file):
-                counter+=1
-        if counter > 0:
-            dir_name = os.path.basename(base_dir)
-            print(f'{dir_name} contains {counter} files')
-        counter = 0
-
-
-    data_dir = ROOT_DIR + "\data\\raw\\"
-    print('\nFor \\data\\raw\\')
-    for base_dir, _, files in os.walk(data_dir):
-        for file in files:
-            if os.path.isfile(base_dir + '\\' + file):
-                counter+=1
-        if counter > 0:
-            dir_name = os.path.basename(base_dir)
-            print(f'{dir_name} contains {counter} files')
-        counter = 0
+    """Prints the number of raw recordings per label / pick style and of computed feature arrays."""
+    from src.data_utils.recording_index import RecordingIndex
+
+    with RecordingIndex() as index:
+        index.update()
+        print("For data/raw/:")
+        for (label, pick), count in index.class_counts(by_pick=True).items():
+            dir_name = f"{label}-{pick}" if pick else label
+            print(f'{dir_name} contains {count} files')
+        for feature in ("cqt", "mel"):
+            counts = index.class_counts(feature=feature)
+            if counts:
+                print(f"\nFor the '{feature}' feature arrays:")
+                for label, count in counts.items():
+                    print(f'{label} contains {count} files')